@@ -3,8 +3,11 @@ from operator import sub
 import sys
 from icecream import ic
 from learn_agent.agent.claude_code_agent import ClaudeCodeAgent
+from learn_agent.compaction import Compactor
 from learn_agent.llm import DeepSeek
 from learn_agent.memory import Memory
+from learn_agent.session_store import SessionStore
+from learn_agent.tool.result_tool import ResultStore
 from learn_agent.tool.file_tool import FileTool
 from learn_agent.tool.todo_tool import TodoTool
 from learn_agent.tool.subagent_tool import SubAgentTool
@@ -81,6 +84,24 @@ When to use subagent:
 - You want to avoid polluting current conversation with intermediate details
 
 The subagent runs in isolation and returns only its final summary."""
+    # 会话持久化到 .sessions/，重启后从上次的位置继续
+    store = SessionStore(Path.cwd() / ".sessions")
+    agent = ClaudeCodeAgent(
+        session_id="axxxx",
+        name="test",
+        system_prompt=SYSTEM,
+        llm=DeepSeek(model="deepseek-chat"),
+        tools=[
+            file_tool,
+            todo_tool,
+            subagent_tool,
+            skill_tool,
+        ],
+        memory=Memory.resume(store, "axxxx"),
+        compactor=Compactor(llm=DeepSeek(model="deepseek-chat")),
+        # 大的工具输出存到 .tool_results/，上下文里只留预览
+        result_store=ResultStore(Path.cwd() / ".tool_results"),
+    )
     while True:
         try:
             user_input = input("User: ")
@@ -91,20 +112,8 @@ The subagent runs in isolation and returns only its final summary."""
             break
 
         try:
-            agent = ClaudeCodeAgent(
-                session_id="axxxx",
-                name="test",
-                system_prompt=SYSTEM,
-                llm=DeepSeek(model="deepseek-chat"),
-                tools=[
-                    file_tool,
-                    todo_tool,
-                    subagent_tool,
-                    skill_tool,
-                ],
-                memory=Memory(),
-            )
             response = agent.run(user_input)
             print(f"Agent: {response}")
         except Exception as e:
             print(f"Error: {e}")
+    store.close()
@@ -72,7 +72,8 @@ async def stream_generator(user_input: str) -> AsyncGenerator[str, None]:
         yield format_sse_event({"type": "error", "message": "Agent 未初始化"})
         return
 
-    for event in agent_instance.run_stream(user_input):
+    # 异步版本：等待模型和工具时不阻塞事件循环，其他客户端的请求可以同时处理
+    async for event in agent_instance.arun_stream(user_input):
         yield format_sse_event(event)
 
 
@@ -1,51 +1,358 @@
+import asyncio
+import inspect
 import json
-from typing import Any, Generator
-from learn_agent.llm import LLM
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Callable, Generator
+from learn_agent.llm import ChatModel, achat_model, achat_stream_model
 from learn_agent.memory import Memory
-from learn_agent.tool.toolkit import Toolkit
+from learn_agent.message import SchemaList
+from learn_agent.tool.result_tool import ResultStore, ResultTool
+from learn_agent.tool.tool_retriever import ToolRetriever
+from learn_agent.tool.toolkit import Toolkit, ToolArgumentError, tool_progress
 
 
 class Agent:
     def __init__(
         self,
-        llm: LLM,
+        llm: ChatModel,
         session_id: str,
         name: str,
         tools: list[Toolkit],
         memory: Memory,
         system_prompt: str = "",
+        result_store: ResultStore | None = None,
+        aged_result_chars: int = 2000,
+        max_parallel_tools: int = 4,
+        tool_top_k: int | None = None,
+        core_tools: list[str] | None = None,
     ):
         self.session_id = session_id
         self.name = name
         self.system_prompt = system_prompt
         self.llm = llm
+        # 可选：每一轮只发送和用户输入最相关的 tool_top_k 个工具的 schema，
+        # core_tools 里的工具总是发送；None 表示发送全部工具
+        self.tool_top_k = tool_top_k
+        self.core_tools = set(core_tools or ())
+        # 上一次检索到的工具；追问（例如“继续”）检索不到任何工具时沿用它
+        self._last_retrieved: list[str] | None = None
         self.tools = tools
         self.memory = memory
         self.max_tool_rounds = 8
+        # 同一轮里的多个工具调用最多同时执行几个，1 表示逐个执行
+        self.max_parallel_tools = max(1, max_parallel_tools)
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=self.max_parallel_tools, thread_name_prefix="tool"
+        )
+
+        # 可选：大工具结果存到场外，上下文里只留预览和 handle，模型用 read_tool_result 分页读取
+        self.result_store = result_store
+        # 之前轮次里已经被模型看过的工具结果，超过这个长度的也换成预览
+        self.aged_result_chars = aged_result_chars
+        if result_store is not None:
+            if "read_tool_result" not in self._tool_index:
+                self.tools = [*self.tools, ResultTool(result_store)]
+            # 过期的结果预览会让模型调用 read_tool_result，它的 schema 必须一直发送
+            self.core_tools.add("read_tool_result")
+
+        # 持久化的记忆默认用 agent 的 session_id 作为日志名
+        if self.memory.store is not None and self.memory.session_id is None:
+            self.memory.session_id = session_id
+        # 恢复的会话里已经有 system prompt 了
+        if not (self.memory.messages and self.memory.messages[0]["role"] == "system"):
+            self.memory.add_message(role="system", content=system_prompt)
+
+        # 工具 schema 每轮都要发送，从上下文窗口的预算里预留出来
+        if self.memory.context_window is not None:
+            self.memory.context_window.reserved_tokens = sum(
+                toolkit.count_schema_tokens(self.memory.token_counter)
+                for toolkit in self.tools
+            )
+
+    @property
+    def tools(self) -> list[Toolkit]:
+        return self._tools
 
-        self.memory.add_message(role="system", content=system_prompt)
+    @tools.setter
+    def tools(self, tools: list[Toolkit] | Toolkit) -> None:
+        self._tools = [tools] if isinstance(tools, Toolkit) else list(tools)
+        self._build_tool_index()
 
-    def _all_tool_schemas(self) -> list[dict]:
-        # 汇总所有工具的 schema，给模型识别可调用的工具
-        schemas = []
-        for toolkit in self.tools:
+    def _build_tool_index(self) -> None:
+        """
+        预先建立 工具名 -> 工具包 的索引，并汇总所有 schema。
+        工具名冲突时直接报错，而不是运行时随机调用到其中一个。
+        """
+        index: dict[str, Toolkit] = {}
+        schemas = SchemaList()
+        for toolkit in self._tools:
+            for tool_name in toolkit.tool_names():
+                if tool_name in index:
+                    raise ValueError(
+                        f"Tool name collision: {tool_name} is defined in both "
+                        f"{index[tool_name].name} and {toolkit.name}."
+                    )
+                index[tool_name] = toolkit
             schemas.extend(toolkit.list_tools_schemas())
-        return schemas
+        self._tool_index = index
+        self._tool_schemas = schemas
+        self._tool_retriever = ToolRetriever(schemas) if self.tool_top_k is not None else None
+        # 挑选出的工具组合 -> SchemaList，相同组合复用缓存的 JSON
+        self._selected_schemas: dict[frozenset[str], SchemaList] = {}
+        self._tool_versions = tuple(toolkit.version for toolkit in self._tools)
+
+    def _check_tool_index(self) -> None:
+        # 某个工具包 add_tool 之后重建索引，O(工具包数)
+        if self._tool_versions != tuple(toolkit.version for toolkit in self._tools):
+            self._build_tool_index()
+
+    def _all_tool_schemas(self) -> SchemaList:
+        # 汇总所有工具的 schema，给模型识别可调用的工具（缓存的列表，不要修改）
+        self._check_tool_index()
+        return self._tool_schemas
+
+    def _select_tool_schemas(self, query: str, used_tools: set[str]) -> SchemaList:
+        """
+        这一轮要发送的工具 schema：核心工具 + 和 query 最相关的 top-k 个
+        + 本轮已经调用过的工具（模型调用了没发送的工具时，之后的轮次补上它的 schema）。
+        query 一个工具都检索不到时沿用上一次检索的结果，之前也没有的话发送全部工具
+        """
+        schemas = self._all_tool_schemas()
+        if self._tool_retriever is None or len(schemas) <= self.tool_top_k:
+            return schemas
+
+        retrieved = self._tool_retriever.select(query, self.tool_top_k)
+        if retrieved:
+            self._last_retrieved = retrieved
+        elif self._last_retrieved is None:
+            return schemas
+        else:
+            retrieved = self._last_retrieved
+        selected = frozenset(
+            name
+            for name in self.core_tools | used_tools | set(retrieved)
+            if name in self._tool_index
+        )
+        cached = self._selected_schemas.get(selected)
+        if cached is None:
+            if len(self._selected_schemas) >= 64:
+                self._selected_schemas.clear()
+            cached = self._selected_schemas[selected] = SchemaList(
+                s for s in schemas if s["function"]["name"] in selected
+            )
+        return cached
+
+    def context_tokens(self) -> int:
+        """当前上下文（历史消息 + 工具 schema）的 token 数，来自缓存，O(工具包数)"""
+        counter = self.memory.token_counter
+        return self.memory.total_tokens + sum(
+            toolkit.count_schema_tokens(counter) for toolkit in self.tools
+        )
+
+    def tool_cache_stats(self) -> dict[str, dict]:
+        """各工具包结果缓存的命中统计，key 是工具包名"""
+        return {toolkit.name: toolkit.tool_cache.stats() for toolkit in self.tools}
+
+    def _find_toolkit(self, tool_name: str) -> Toolkit:
+        toolkit = self._tool_index.get(tool_name)
+        if toolkit is None:
+            raise ValueError(f"Tool {tool_name} not found in any toolkit.")
+        return toolkit
 
     def _dispatch_tool(self, tool_name: str, args: dict) -> Any:
-        # 找到具体工具并执行
-        for toolkit in self.tools:
-            if toolkit.has(tool_name):
-                return toolkit.call(tool_name, **args)
-        raise ValueError(f"Tool {tool_name} not found in any toolkit.")
+        # 按索引找到具体工具并执行
+        return self._find_toolkit(tool_name).call(tool_name, **args)
+
+    def _is_concurrency_safe(self, tool_name: str) -> bool:
+        toolkit = self._tool_index.get(tool_name)
+        return toolkit is None or toolkit.is_concurrency_safe(tool_name)
+
+    def _schedule_tool(
+        self,
+        fn_name: str,
+        args: dict,
+        scheduled: list[tuple[bool, Future]],
+        on_progress: Callable[[dict], None] | None = None,
+    ) -> Future:
+        """
+        把一个工具调用提交到线程池，scheduled 是本轮已经提交的 (是否并发安全, future)。
+
+        并发安全的工具之间并行执行；不安全的工具要等前面提交的都执行完，
+        它后面的工具也要等它执行完。结果仍然由调用方按 tool_calls 的顺序取回。
+        工具执行中 report_progress 的事件交给 on_progress。
+        """
+        safe = self._is_concurrency_safe(fn_name)
+        if safe:
+            # 只需要等最近的一个不安全工具（它自己已经等过更早的所有工具）
+            deps = [f for s, f in scheduled if not s][-1:]
+        else:
+            deps = [f for _, f in scheduled]
+
+        def task():
+            if deps:
+                wait(deps)
+            with tool_progress(on_progress):
+                return self._execute_tool(fn_name, args)
+
+        future = self._tool_executor.submit(task)
+        scheduled.append((safe, future))
+        return future
+
+    @staticmethod
+    def _parse_tool_args(raw_args: Any) -> dict:
+        try:
+            # arguments 可能是 JSON 字符串
+            return json.loads(raw_args or "{}") if isinstance(raw_args, str) else raw_args
+        except Exception:
+            return {}
+
+    def _tool_success(self, result: Any) -> str:
+        inline = result
+        if self.result_store is not None and isinstance(result, str):
+            inline = self.result_store.shrink(result)
+        # 工具结果以更"模型友好"的结构回填
+        return json.dumps({"ok": True, "result": inline}, ensure_ascii=False)
+
+    @staticmethod
+    def _tool_failure(e: Exception) -> str:
+        if isinstance(e, ToolArgumentError):
+            # 参数不合法：把每个字段的错误都告诉模型，它可以直接修正后重试
+            error = {"code": "INVALID_ARGUMENTS", "message": str(e), "details": e.errors}
+        else:
+            error = {"code": "TOOL_EXEC_ERROR", "message": str(e)}
+        return json.dumps({"ok": False, "error": error}, ensure_ascii=False)
+
+    def _execute_tool(self, fn_name: str, args: dict) -> tuple[str, Any, Exception | None]:
+        """
+        执行一个工具，返回 (回填给模型的 tool_content, 原始结果, 异常)
+        """
+        try:
+            # 执行本地工具函数
+            result = self._dispatch_tool(fn_name, args)
+            if inspect.iscoroutine(result):
+                # async def 的工具在工作线程里用独立的事件循环跑完
+                result = asyncio.run(result)
+            return self._tool_success(result), result, None
+        except Exception as e:
+            return self._tool_failure(e), None, e
+
+    async def _aexecute_tool(
+        self, fn_name: str, args: dict
+    ) -> tuple[str, Any, Exception | None]:
+        """_execute_tool 的异步版本：async 工具直接 await，同步工具放到线程池执行"""
+        try:
+            result = await self._find_toolkit(fn_name).acall(fn_name, **args)
+            return self._tool_success(result), result, None
+        except Exception as e:
+            return self._tool_failure(e), None, e
+
+    def _aschedule_tool(
+        self,
+        fn_name: str,
+        args: dict,
+        scheduled: list[tuple[bool, asyncio.Task]],
+        semaphore: asyncio.Semaphore,
+        on_progress: Callable[[dict], None] | None = None,
+    ) -> asyncio.Task:
+        """_schedule_tool 的异步版本，依赖关系相同，并行度由 semaphore 限制"""
+        safe = self._is_concurrency_safe(fn_name)
+        if safe:
+            deps = [t for s, t in scheduled if not s][-1:]
+        else:
+            deps = [t for _, t in scheduled]
+
+        async def task():
+            if deps:
+                await asyncio.wait(deps)
+            async with semaphore:
+                with tool_progress(on_progress):
+                    return await self._aexecute_tool(fn_name, args)
+
+        future = asyncio.create_task(task())
+        scheduled.append((safe, future))
+        return future
+
+    @staticmethod
+    def _progress_sink(progress: queue.SimpleQueue, tool_call_id: str, fn_name: str) -> Callable[[dict], None]:
+        # 工具线程里上报的进度放进队列，由 run_stream 所在的线程转发
+        def sink(event: dict) -> None:
+            progress.put({"type": "tool_output", "name": fn_name, "tool_call_id": tool_call_id, **event})
+
+        return sink
+
+    @staticmethod
+    def _drain_progress(progress: queue.SimpleQueue) -> Generator[dict, None, None]:
+        while True:
+            try:
+                yield progress.get_nowait()
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _wait_tool(future: Future, progress: queue.SimpleQueue) -> Generator[dict, None, tuple]:
+        """等待工具执行完，期间把它（以及同时在跑的工具）上报的进度转发出去"""
+        while True:
+            try:
+                yield progress.get(timeout=0.05)
+            except queue.Empty:
+                if future.done():
+                    return future.result()
+
+    async def _achat(self, messages: list[dict], tools: list[dict]):
+        return await achat_model(self.llm, messages, tools)
+
+    async def _achat_stream(
+        self, messages: list[dict], tools: list[dict]
+    ) -> AsyncGenerator[dict, None]:
+        async with aclosing(achat_stream_model(self.llm, messages, tools)) as stream:
+            async for event in stream:
+                yield event
+
+    def _age_tool_results(self) -> None:
+        """
+        新的一轮用户输入开始时，把之前轮次的大工具结果换成预览 + handle。
+        这些结果模型已经看过了，不必每一轮都原样重新发送。
+        """
+        if self.result_store is None:
+            return
+        messages = self.memory.messages
+        last_user = len(messages) - 1
+        while last_user > 0 and messages[last_user]["role"] != "user":
+            last_user -= 1
+
+        replacements = {}
+        for i in range(last_user):
+            msg = messages[i]
+            content = msg.get("content") or ""
+            if msg["role"] == "tool" and len(content) > self.aged_result_chars:
+                replacements[i] = {**msg, "content": self._aged_content(content)}
+        self.memory.replace_messages(replacements)
+
+    def _aged_content(self, content: str) -> str:
+        # 场外保存工具的原始输出，而不是 {"ok": ..., "result": ...} 包装后转义过的 JSON，
+        # 之后 read_tool_result 读到的就是原文
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            payload = None
+        if not (isinstance(payload, dict) and payload.get("ok") is True and "result" in payload):
+            return self.result_store.shrink(content, self.aged_result_chars)
+        result = payload["result"]
+        text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        shrunk = self.result_store.shrink(text, self.aged_result_chars)
+        return json.dumps({"ok": True, "result": shrunk}, ensure_ascii=False)
 
     def run(self, user_text: str) -> str:
         # 把用户输入加入上下文
         self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
 
-        tool_schema = self._all_tool_schemas()
+        used_tools: set[str] = set()
 
         for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
             # 每一轮都带上当前上下文让模型决定是否要调用工具
             messages = self.memory.get_context()
 
@@ -69,41 +376,66 @@ class Agent:
                 # 没有调用工具，结束
                 return msg.content or ""
 
-            # 如果有工具调用，逐个执行，并把结果作为 role="tool" 回填到上下文
+            # 如果有工具调用，互不影响的工具并行执行，
+            # 结果按 tool_calls 的顺序作为 role="tool" 回填到上下文
+            scheduled: list[tuple[bool, Future]] = []
             for tc in tool_calls:
                 # 解析模型返回的工具调用信息
-                tc_id = tc.id
-                fn_name = tc.function.name
-                raw_args = tc.function.arguments or "{}"
-
-                try:
-                    # arguments 可能是 JSON 字符串
-                    args = (
-                        json.loads(raw_args) if isinstance(raw_args, str) else raw_args
-                    )
-                except Exception:
-                    args = {}
-
-                try:
-                    # 执行本地工具函数
-                    result = self._dispatch_tool(fn_name, args)
-                    # 工具结果以更"模型友好"的结构回填
-                    tool_content = json.dumps(
-                        {"ok": True, "result": result}, ensure_ascii=False
-                    )
-                except Exception as e:
-                    tool_content = json.dumps(
-                        {
-                            "ok": False,
-                            "error": {"code": "TOOL_EXEC_ERROR", "message": str(e)},
-                        },
-                        ensure_ascii=False,
-                    )
+                args = self._parse_tool_args(tc.function.arguments)
+                used_tools.add(tc.function.name)
+                self._schedule_tool(tc.function.name, args, scheduled)
+
+            for tc, (_, future) in zip(tool_calls, scheduled):
+                tool_content, _, _ = future.result()
+                self.memory.add_message(
+                    role="tool",
+                    content=tool_content,
+                    tool_call_id=tc.id,
+                )
+
+        return "ERROR: reached maximum tool rounds without a final answer."
+
+    async def arun(self, user_text: str) -> str:
+        """
+        run 的异步版本：等待模型和工具时不阻塞事件循环，
+        一个进程可以同时处理大量会话
+        """
+        self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
+
+        used_tools: set[str] = set()
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
+            messages = self.memory.get_context()
+            msg = await self._achat(messages, tool_schema)
+
+            assistant_dict = {"role": "assistant"}
+            if getattr(msg, "content", None) is not None:
+                assistant_dict["content"] = msg.content
+
+            tool_calls = getattr(msg, "tool_calls", None)
+            if tool_calls:
+                assistant_dict["tool_calls"] = [tc.model_dump() for tc in tool_calls]
+
+            self.memory.add_message(**assistant_dict)
 
+            if not tool_calls:
+                return msg.content or ""
+
+            scheduled: list[tuple[bool, asyncio.Task]] = []
+            for tc in tool_calls:
+                args = self._parse_tool_args(tc.function.arguments)
+                used_tools.add(tc.function.name)
+                self._aschedule_tool(tc.function.name, args, scheduled, semaphore)
+
+            for tc, (_, task) in zip(tool_calls, scheduled):
+                tool_content, _, _ = await task
                 self.memory.add_message(
                     role="tool",
                     content=tool_content,
-                    tool_call_id=tc_id,
+                    tool_call_id=tc.id,
                 )
 
         return "ERROR: reached maximum tool rounds without a final answer."
@@ -114,51 +446,77 @@ class Agent:
         """
         流式运行方法
 
+        模型流式输出时，某个工具调用的参数一旦完整（tool_call_ready），
+        就立刻提交到线程池执行，与模型继续生成其余内容并行。
+        并发安全的工具之间也并行执行，结果按 tool_calls 的顺序回填上下文。
+
         Yields:
             dict: 事件字典
                 - {"type": "assistant", "content": "xxx"}  # 助手回复片段
                 - {"type": "tool_call", "name": "xxx", "args": {...}}  # 工具调用开始
+                - {"type": "tool_output", "name": "xxx", "tool_call_id": "xxx", "output": "xxx"}  # 工具执行中的输出片段
                 - {"type": "tool_result", "name": "xxx", "result": {...}}  # 工具执行结果
                 - {"type": "done", "final": "xxx"}  # 完成
                 - {"type": "error", "message": "xxx"}  # 错误
         """
         # 把用户输入加入上下文
         self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
         yield {"type": "user_message", "content": user_text}
 
-        tool_schema = self._all_tool_schemas()
+        used_tools: set[str] = set()
 
         for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
             messages = self.memory.get_context()
 
             # 使用流式 LLM 调用
-            assistant_content_buffer = ""
+            content_parts: list[str] = []
             tool_calls_info: list[dict] = []
+            # tool_call_id -> 已提前开始执行的工具
+            started: dict[str, Future] = {}
+            scheduled: list[tuple[bool, Future]] = []
+            # 工具执行过程中上报的进度事件
+            progress: queue.SimpleQueue = queue.SimpleQueue()
 
             for event in self.llm.chat_stream(messages=messages, tools=tool_schema):
+                yield from self._drain_progress(progress)
                 event_type = event.get("type")
 
                 if event_type == "content":
                     content_chunk = event["content"]
-                    assistant_content_buffer += content_chunk
+                    content_parts.append(content_chunk)
                     yield {"type": "assistant", "content": content_chunk}
 
+                elif event_type == "tool_call_ready":
+                    # 参数已经完整，不等流结束就开始执行
+                    tc = event["tool_call"]
+                    fn_name = tc["function"]["name"]
+                    args = self._parse_tool_args(tc["function"]["arguments"])
+                    yield {"type": "tool_call", "name": fn_name, "args": args}
+                    started[tc["id"]] = self._schedule_tool(
+                        fn_name, args, scheduled, self._progress_sink(progress, tc["id"], fn_name)
+                    )
+
                 elif event_type == "tool_calls":
                     tool_calls_info = event["tool_calls"]
+                    used_tools.update(tc["function"]["name"] for tc in tool_calls_info)
 
                 elif event_type == "done":
                     break
 
+            assistant_content = "".join(content_parts)
+
             # 处理工具调用（如果有）
             if tool_calls_info:
                 # 先把 assistant 消息（包含 tool_calls）添加到 memory
                 self.memory.add_message(
                     role="assistant",
-                    content=assistant_content_buffer or None,
+                    content=assistant_content or None,
                     tool_calls=[
                         {
                             "id": tc["id"],
-                            "type": tc.get("type", "function"),
+                            "type": tc.get("type") or "function",
                             "function": {
                                 "name": tc["function"]["name"],
                                 "arguments": tc["function"]["arguments"],
@@ -168,52 +526,146 @@ class Agent:
                     ],
                 )
 
-                # 发送工具调用事件
+                for tc in tool_calls_info:
+                    if tc["id"] not in started:
+                        # 没有收到 tool_call_ready 的调用，现在再提交
+                        fn_name = tc["function"]["name"]
+                        args = self._parse_tool_args(tc["function"]["arguments"])
+                        yield {"type": "tool_call", "name": fn_name, "args": args}
+                        started[tc["id"]] = self._schedule_tool(
+                            fn_name, args, scheduled, self._progress_sink(progress, tc["id"], fn_name)
+                        )
+
                 for tc in tool_calls_info:
                     fn_name = tc["function"]["name"]
-                    raw_args = tc["function"]["arguments"]
+                    tool_content, result, error = yield from self._wait_tool(started[tc["id"]], progress)
+                    if error is None:
+                        yield {"type": "tool_result", "name": fn_name, "result": result}
+                    else:
+                        yield {"type": "tool_error", "name": fn_name, "error": str(error)}
 
-                    try:
-                        args = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
-                    except Exception:
-                        args = {}
+                    # 添加到上下文
+                    self.memory.add_message(
+                        role="tool",
+                        content=tool_content,
+                        tool_call_id=tc["id"],
+                    )
 
-                    # 发送工具调用开始事件
-                    yield {"type": "tool_call", "name": fn_name, "args": args}
+                # 继续下一轮（获取最终回答）
+                continue
+
+            # 没有工具调用，任务完成
+            self.memory.add_message(role="assistant", content=assistant_content)
+            yield {"type": "done", "final": assistant_content}
+            return
 
-                    # 执行工具
-                    try:
-                        result = self._dispatch_tool(fn_name, args)
-                        tool_content = json.dumps(
-                            {"ok": True, "result": result}, ensure_ascii=False
+        # 达到最大轮次
+        yield {"type": "error", "message": "ERROR: reached maximum tool rounds without a final answer."}
+
+    async def arun_stream(self, user_text: str) -> AsyncGenerator[dict, None]:
+        """run_stream 的异步版本，事件格式相同"""
+        self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
+        yield {"type": "user_message", "content": user_text}
+
+        used_tools: set[str] = set()
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
+            messages = self.memory.get_context()
+
+            content_parts: list[str] = []
+            tool_calls_info: list[dict] = []
+            started: dict[str, asyncio.Task] = {}
+            scheduled: list[tuple[bool, asyncio.Task]] = []
+            progress: queue.SimpleQueue = queue.SimpleQueue()
+
+            async with aclosing(self._achat_stream(messages, tool_schema)) as stream:
+                async for event in stream:
+                    for progress_event in self._drain_progress(progress):
+                        yield progress_event
+                    event_type = event.get("type")
+
+                    if event_type == "content":
+                        content_chunk = event["content"]
+                        content_parts.append(content_chunk)
+                        yield {"type": "assistant", "content": content_chunk}
+
+                    elif event_type == "tool_call_ready":
+                        # 参数已经完整，不等流结束就开始执行
+                        tc = event["tool_call"]
+                        fn_name = tc["function"]["name"]
+                        args = self._parse_tool_args(tc["function"]["arguments"])
+                        yield {"type": "tool_call", "name": fn_name, "args": args}
+                        started[tc["id"]] = self._aschedule_tool(
+                            fn_name, args, scheduled, semaphore,
+                            self._progress_sink(progress, tc["id"], fn_name),
                         )
-                        yield {"type": "tool_result", "name": fn_name, "result": result}
-                    except Exception as e:
-                        tool_content = json.dumps(
-                            {
-                                "ok": False,
-                                "error": {"code": "TOOL_EXEC_ERROR", "message": str(e)},
+
+                    elif event_type == "tool_calls":
+                        tool_calls_info = event["tool_calls"]
+                        used_tools.update(tc["function"]["name"] for tc in tool_calls_info)
+
+                    elif event_type == "done":
+                        break
+
+            assistant_content = "".join(content_parts)
+
+            if tool_calls_info:
+                self.memory.add_message(
+                    role="assistant",
+                    content=assistant_content or None,
+                    tool_calls=[
+                        {
+                            "id": tc["id"],
+                            "type": tc.get("type") or "function",
+                            "function": {
+                                "name": tc["function"]["name"],
+                                "arguments": tc["function"]["arguments"],
                             },
-                            ensure_ascii=False,
+                        }
+                        for tc in tool_calls_info
+                    ],
+                )
+
+                for tc in tool_calls_info:
+                    if tc["id"] not in started:
+                        fn_name = tc["function"]["name"]
+                        args = self._parse_tool_args(tc["function"]["arguments"])
+                        yield {"type": "tool_call", "name": fn_name, "args": args}
+                        started[tc["id"]] = self._aschedule_tool(
+                            fn_name, args, scheduled, semaphore,
+                            self._progress_sink(progress, tc["id"], fn_name),
                         )
-                        yield {"type": "tool_error", "name": fn_name, "error": str(e)}
 
-                    # 添加到上下文
+                for tc in tool_calls_info:
+                    fn_name = tc["function"]["name"]
+                    task = started[tc["id"]]
+                    # 等待期间转发工具上报的进度
+                    while True:
+                        try:
+                            yield progress.get_nowait()
+                        except queue.Empty:
+                            if task.done():
+                                break
+                            await asyncio.wait([task], timeout=0.05)
+                    tool_content, result, error = task.result()
+                    if error is None:
+                        yield {"type": "tool_result", "name": fn_name, "result": result}
+                    else:
+                        yield {"type": "tool_error", "name": fn_name, "error": str(error)}
+
                     self.memory.add_message(
                         role="tool",
                         content=tool_content,
                         tool_call_id=tc["id"],
                     )
 
-                # 继续下一轮（获取最终回答）
                 continue
 
-            # 没有工具调用，任务完成
-            self.memory.add_message(
-                role="assistant", content=assistant_content_buffer
-            )
-            yield {"type": "done", "final": assistant_content_buffer}
+            self.memory.add_message(role="assistant", content=assistant_content)
+            yield {"type": "done", "final": assistant_content}
             return
 
-        # 达到最大轮次
         yield {"type": "error", "message": "ERROR: reached maximum tool rounds without a final answer."}
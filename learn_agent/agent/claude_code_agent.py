@@ -1,8 +1,12 @@
+import asyncio
+from concurrent.futures import Future
+
 from .agent import Agent
-from learn_agent.llm import LLM
+from learn_agent.compaction import Compactor
+from learn_agent.llm import ChatModel
 from learn_agent.memory import Memory
+from learn_agent.tool.result_tool import ResultStore
 from learn_agent.tool.toolkit import Toolkit
-import json
 
 # TODO: todo list
 # =============================================================================
@@ -19,12 +23,17 @@ NAG_REMINDER = (
 class ClaudeCodeAgent(Agent):
     def __init__(
         self,
-        llm: LLM,
+        llm: ChatModel,
         session_id: str,
         name: str,
         tools: list[Toolkit],
         memory: Memory,
         system_prompt: str = "",
+        compactor: Compactor | None = None,
+        result_store: ResultStore | None = None,
+        max_parallel_tools: int = 4,
+        tool_top_k: int | None = None,
+        core_tools: list[str] | None = None,
     ):
         self.rounds_without_todo = 0  # 追踪多久没有更新 todo 了
         self.used_todo = False  # 追踪是否使用过 todo 工具
@@ -35,15 +44,25 @@ class ClaudeCodeAgent(Agent):
             tools=tools,
             memory=memory,
             system_prompt=system_prompt,
+            result_store=result_store,
+            max_parallel_tools=max_parallel_tools,
+            tool_top_k=tool_top_k,
+            # todo 提醒依赖 update_todos 一直可用
+            core_tools=[*(core_tools or ()), "update_todos"],
         )
+        # 长时间的编码会话：历史过长时在后台压缩早期消息
+        if compactor is not None:
+            self.memory.compactor = compactor
 
     def run(self, user_text: str) -> str:
         # 把用户输入加入上下文
         self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
 
-        tool_schema = self._all_tool_schemas()
+        used_tools: set[str] = set()
 
         for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
             # 每一轮都带上当前上下文让模型决定是否要调用工具
             messages = self.memory.get_context()
 
@@ -70,20 +89,14 @@ class ClaudeCodeAgent(Agent):
                 # 没有调用工具，结束
                 return msg.content or ""
 
-            # 如果有工具调用，逐个执行，并把结果作为 role="tool" 回填到上下文
+            # 如果有工具调用，互不影响的工具并行执行，
+            # 结果按 tool_calls 的顺序作为 role="tool" 回填到上下文
+            scheduled: list[tuple[bool, Future]] = []
             for tc in tool_calls:
                 # 解析模型返回的工具调用信息
-                tc_id = tc.id
                 fn_name = tc.function.name
-                raw_args = tc.function.arguments or "{}"
-
-                try:
-                    # arguments 可能是 JSON 字符串
-                    args = (
-                        json.loads(raw_args) if isinstance(raw_args, str) else raw_args
-                    )
-                except Exception:
-                    args = {}
+                args = self._parse_tool_args(tc.function.arguments)
+                used_tools.add(fn_name)
 
                 # 追踪 todo 更新情况
                 if fn_name == "update_todos":
@@ -92,26 +105,66 @@ class ClaudeCodeAgent(Agent):
                 else:
                     self.rounds_without_todo += 1
 
-                try:
-                    # 执行本地工具函数
-                    result = self._dispatch_tool(fn_name, args)
-                    # 工具结果以更“模型友好”的结构回填
-                    tool_content = json.dumps(
-                        {"ok": True, "result": result}, ensure_ascii=False
-                    )
-                except Exception as e:
-                    tool_content = json.dumps(
-                        {
-                            "ok": False,
-                            "error": {"code": "TOOL_EXEC_ERROR", "message": str(e)},
-                        },
-                        ensure_ascii=False,
-                    )
+                self._schedule_tool(fn_name, args, scheduled)
+
+            for tc, (_, future) in zip(tool_calls, scheduled):
+                tool_content, _, _ = future.result()
+                self.memory.add_message(
+                    role="tool",
+                    content=tool_content,
+                    tool_call_id=tc.id,
+                )
+
+        return "ERROR: reached maximum tool rounds without a final answer."
+
+    async def arun(self, user_text: str) -> str:
+        """run 的异步版本，等待模型和工具时不阻塞事件循环"""
+        self.memory.add_message(role="user", content=user_text)
+        self._age_tool_results()
+
+        used_tools: set[str] = set()
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        for _round in range(self.max_tool_rounds):
+            tool_schema = self._select_tool_schemas(user_text, used_tools)
+            messages = self.memory.get_context()
+            msg = await self._achat(messages, tool_schema)
+
+            assistant_dict = {"role": "assistant"}
+            if getattr(msg, "content", None) is not None:
+                assistant_dict["content"] = msg.content
+                if self.used_todo and self.rounds_without_todo >= 10:
+                    assistant_dict["content"] += "\n" + NAG_REMINDER
+
+            tool_calls = getattr(msg, "tool_calls", None)
+            if tool_calls:
+                assistant_dict["tool_calls"] = [tc.model_dump() for tc in tool_calls]
+
+            self.memory.add_message(**assistant_dict)
+
+            if not tool_calls:
+                return msg.content or ""
+
+            scheduled: list[tuple[bool, asyncio.Task]] = []
+            for tc in tool_calls:
+                fn_name = tc.function.name
+                args = self._parse_tool_args(tc.function.arguments)
+                used_tools.add(fn_name)
+
+                if fn_name == "update_todos":
+                    self.used_todo = True
+                    self.rounds_without_todo = 0
+                else:
+                    self.rounds_without_todo += 1
+
+                self._aschedule_tool(fn_name, args, scheduled, semaphore)
 
+            for tc, (_, task) in zip(tool_calls, scheduled):
+                tool_content, _, _ = await task
                 self.memory.add_message(
                     role="tool",
                     content=tool_content,
-                    tool_call_id=tc_id,
+                    tool_call_id=tc.id,
                 )
 
         return "ERROR: reached maximum tool rounds without a final answer."
@@ -0,0 +1,155 @@
+"""
+后台压缩长对话
+
+历史超过阈值后，把较早的一段消息交给一个便宜的模型总结成一条摘要消息。
+总结在后台线程里进行，不阻塞当前这一轮；总结好之后，
+下一次 Memory.get_context 时用摘要替换掉那一段消息。
+
+这样长时间的编码会话里，每轮发送的上下文大小基本恒定。
+"""
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from learn_agent.llm import ChatModel
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You compress the earlier part of a conversation between a user and a coding agent.
+Write a concise summary that keeps everything needed to continue the work:
+- the user's goals and constraints
+- files read or changed, commands run, and their important results
+- decisions made and open questions / remaining todos
+Do not add commentary. Reply with the summary only."""
+
+SUMMARY_PREFIX = "<conversation-summary>\n"
+SUMMARY_SUFFIX = "\n</conversation-summary>"
+
+
+def is_summary(msg: dict) -> bool:
+    return str(msg.get("content") or "").startswith(SUMMARY_PREFIX)
+
+
+def render_transcript(messages: list[dict], max_chars_per_message: int = 2000) -> str:
+    # 把消息渲染成纯文本交给摘要模型，单条消息过长时截断
+    lines = []
+    for msg in messages:
+        content = str(msg.get("content") or "")
+        if len(content) > max_chars_per_message:
+            content = content[:max_chars_per_message] + " ...(truncated)"
+        if content:
+            lines.append(f"[{msg['role']}] {content}")
+        for tc in msg.get("tool_calls") or ():
+            function = tc.get("function") or {}
+            lines.append(f"[assistant called] {function.get('name')}({function.get('arguments')})")
+    return "\n".join(lines)
+
+
+class Compactor:
+    """
+    Args:
+        llm (ChatModel): 用来做总结的模型，建议用便宜快速的
+        threshold_tokens (int): 历史超过多少 token 开始压缩
+        keep_recent_tokens (int): 最近多少 token 的消息保持原样不压缩
+        retry_interval (float): 总结失败后多少秒内不再重试
+    """
+
+    def __init__(
+        self,
+        llm: ChatModel,
+        threshold_tokens: int = 32_000,
+        keep_recent_tokens: int = 8_000,
+        retry_interval: float = 60.0,
+    ):
+        self.llm = llm
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self.retry_interval = retry_interval
+        self.compactions = 0
+        # 最近一次总结失败的异常，方便调用方排查
+        self.last_error: Exception | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compactor")
+        # 进行中的总结：(start, end, future)
+        self._pending: tuple[int, int, Future] | None = None
+        self._failed_at = 0.0
+
+    def _span(self, memory) -> tuple[int, int] | None:
+        # 要压缩的区间 [start, end)：跳过开头的 system，保留最近 keep_recent_tokens 的消息
+        messages = memory.messages
+        start = 0
+        while start < len(messages) and messages[start]["role"] == "system":
+            start += 1
+
+        # 至少保留最后一条消息
+        end = len(messages) - 1
+        recent = memory.token_counts[end] if messages else 0
+        while end > start and recent + memory.token_counts[end - 1] <= self.keep_recent_tokens:
+            end -= 1
+            recent += memory.token_counts[end]
+        # 不能把 assistant 的 tool_calls 和它的 tool 结果拆到两边
+        while end > start and messages[end]["role"] == "tool":
+            end -= 1
+
+        if end - start < 2:
+            return None
+        return start, end
+
+    def maybe_start(self, memory) -> None:
+        """超过阈值且没有进行中的总结时，在后台开始总结"""
+        if self._pending is not None or memory.total_tokens <= self.threshold_tokens:
+            return
+        if time.monotonic() - self._failed_at < self.retry_interval:
+            return
+        span = self._span(memory)
+        if span is None:
+            return
+        start, end = span
+        # 只读取一份快照，后台线程不会碰 memory 本身
+        snapshot = list(memory.messages[start:end])
+        self._pending = (start, end, self._executor.submit(self._summarize, snapshot))
+
+    def _summarize(self, messages: list[dict]) -> str:
+        msg = self.llm.chat(
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": render_transcript(messages)},
+            ]
+        )
+        return msg.content or ""
+
+    def apply(self, memory) -> bool:
+        """总结已完成时，用摘要替换对应的消息区间；返回是否发生了替换"""
+        if self._pending is None:
+            return False
+        start, end, future = self._pending
+        if not future.done():
+            return False
+        self._pending = None
+
+        try:
+            summary = future.result()
+        except Exception as e:
+            logger.warning("summarization failed: %s", e)
+            self.last_error = e
+            self._failed_at = time.monotonic()
+            return False
+        if not summary:
+            self._failed_at = time.monotonic()
+            return False
+
+        memory.replace_span(
+            start,
+            end,
+            {"role": "user", "content": SUMMARY_PREFIX + summary + SUMMARY_SUFFIX},
+        )
+        self.compactions += 1
+        return True
+
+    def wait(self, timeout: float | None = None) -> None:
+        """等待进行中的总结完成（主要用于测试和退出前）"""
+        if self._pending is not None:
+            try:
+                self._pending[2].result(timeout=timeout)
+            except Exception:
+                pass
@@ -0,0 +1,92 @@
+"""
+按 token 预算裁剪发送给模型的上下文
+
+规则：
+- system prompt 永远保留
+- 从最早的轮次开始丢弃，直到剩下的消息放得进预算
+- assistant 的 tool_calls 和对应的 tool 结果一起丢，窗口不会从孤立的 tool 消息开始
+- 最新的一组消息总是保留，即使它自己就超过了预算
+
+窗口是增量维护的：Memory 每加一条消息，这里只更新起点和 token 数，
+不需要每一轮都重新遍历整个历史。
+"""
+
+
+class ContextWindow:
+    """
+    Args:
+        max_tokens (int): 历史消息的 token 预算
+        reserved_tokens (int): 预留给工具 schema 等固定内容的 token 数，从预算里扣除
+    """
+
+    def __init__(self, max_tokens: int, reserved_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.reserved_tokens = reserved_tokens
+        # 开头连续的 system 消息数，这部分永远保留
+        self.head = 0
+        # 窗口起点（messages 下标），以及 messages[start:] 的 token 数
+        self.start = 0
+        self.window_tokens = 0
+        self.head_tokens = 0
+        # 缓存的上下文列表：head + messages[start:]
+        self._context: list[dict] = []
+
+    @property
+    def budget(self) -> int:
+        return self.max_tokens - self.reserved_tokens - self.head_tokens
+
+    @property
+    def dropped(self) -> int:
+        """已经被挤出窗口的消息数"""
+        return self.start - self.head
+
+    def reset(self, memory) -> None:
+        """Memory 的历史被整体替换（压缩、恢复会话）后重新计算"""
+        self.head = 0
+        self.head_tokens = 0
+        while self.head < len(memory.messages) and memory.messages[self.head]["role"] == "system":
+            self.head_tokens += memory.token_counts[self.head]
+            self.head += 1
+        self.start = self.head
+        self.window_tokens = sum(memory.token_counts[self.head :])
+        self._context = list(memory.messages)
+        self._shrink(memory)
+
+    def on_message_added(self, memory) -> None:
+        msg = memory.messages[-1]
+        tokens = memory.token_counts[-1]
+        if msg["role"] == "system" and self.start == self.head == len(memory.messages) - 1:
+            # 还没有对话时加入的 system 消息算作开头
+            self.head += 1
+            self.start += 1
+            self.head_tokens += tokens
+        else:
+            self.window_tokens += tokens
+        self._context.append(msg)
+        self._shrink(memory)
+
+    def _shrink(self, memory) -> None:
+        messages = memory.messages
+        last = len(messages) - 1
+        # 最后一组消息的起点：不能把最新的 tool 结果和它的 assistant 拆开
+        last_group = last
+        while last_group > self.head and messages[last_group]["role"] == "tool":
+            last_group -= 1
+
+        drop = 0
+        while self.window_tokens > self.budget and self.start < last_group:
+            # 丢掉最早的一条，连带它后面的 tool 结果
+            self.window_tokens -= memory.token_counts[self.start]
+            self.start += 1
+            drop += 1
+            while self.start < last_group and messages[self.start]["role"] == "tool":
+                self.window_tokens -= memory.token_counts[self.start]
+                self.start += 1
+                drop += 1
+
+        if drop:
+            # 缓存列表里 system 之后紧接着的就是被丢弃的那几条
+            del self._context[self.head : self.head + drop]
+
+    def get_context(self, memory) -> list[dict]:
+        return self._context
@@ -1,12 +1,124 @@
 from icecream import ic
-from openai import OpenAI
+from openai import (
+    DEFAULT_MAX_RETRIES,
+    AsyncOpenAI,
+    AsyncStream,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+    Stream,
+)
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+import asyncio
+import httpx
 import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager, contextmanager
 from dotenv import load_dotenv
-from typing import Generator
+from typing import AsyncGenerator, Generator, Protocol
+from learn_agent.llm_cache import (
+    LLMCache,
+    assembler_to_record,
+    make_cache_key,
+    message_to_record,
+    record_to_events,
+    record_to_message,
+)
+from learn_agent.message import build_request_body
+from learn_agent.rate_limit import RateLimiter, estimate_request_tokens
+from learn_agent.stream_assembler import StreamAssembler
 
 load_dotenv()
 
 
+# =============================================================================
+# 进程级共享的 HTTP 连接池
+# 所有 LLM 实例复用同一批 keep-alive 连接，避免每个会话都重新做 TCP/TLS 握手
+# =============================================================================
+
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=100,
+    keepalive_expiry=120,
+)
+
+_http_client: httpx.Client | None = None
+_http_client_lock = threading.Lock()
+# 异步连接绑定在事件循环上，所以每个事件循环各有一个共享客户端
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_http_client() -> httpx.Client:
+    """返回进程内共享的同步 HTTP 客户端（懒加载，线程安全）"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = DefaultHttpxClient(limits=HTTP_POOL_LIMITS)
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """返回当前事件循环共享的异步 HTTP 客户端，必须在事件循环内调用"""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = DefaultAsyncHttpxClient(limits=HTTP_POOL_LIMITS)
+        _async_http_clients[loop] = client
+    return client
+
+
+class ChatModel(Protocol):
+    """Agent 依赖的最小模型接口，LLM、LLMPool 等都满足"""
+
+    def chat(self, messages: list[dict], tools: list[dict] | None = None): ...
+
+    def chat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> Generator[dict, None, None]: ...
+
+
+class AsyncChatModel(ChatModel, Protocol):
+    """额外提供异步接口的模型，AsyncLLM、LLMPool、ModelRouter 都满足"""
+
+    async def achat(self, messages: list[dict], tools: list[dict] | None = None): ...
+
+    def achat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> AsyncGenerator[dict, None]: ...
+
+
+async def achat_model(model: ChatModel, messages: list[dict], tools: list[dict] | None = None):
+    """异步调用任意模型：有 achat 就直接 await，只有同步接口的放到线程里调用"""
+    if hasattr(model, "achat"):
+        return await model.achat(messages=messages, tools=tools)
+    return await asyncio.to_thread(model.chat, messages=messages, tools=tools)
+
+
+async def achat_stream_model(
+    model: ChatModel, messages: list[dict], tools: list[dict] | None = None
+) -> AsyncGenerator[dict, None]:
+    """异步流式调用任意模型：只有同步 chat_stream 的在线程里逐个取事件"""
+    if hasattr(model, "achat_stream"):
+        async with aclosing(model.achat_stream(messages=messages, tools=tools)) as stream:
+            async for event in stream:
+                yield event
+        return
+    events = iter(model.chat_stream(messages=messages, tools=tools))
+    end = object()
+    try:
+        while (event := await asyncio.to_thread(next, events, end)) is not end:
+            yield event
+    finally:
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+
+
 class LLM:
     def __init__(
         self,
@@ -15,25 +127,40 @@ class LLM:
         base_url: str | None = None,
         temperature: float | None = None,
         max_tokens: int | None = None,
+        http_client: httpx.Client | None = None,
+        cache: LLMCache | None = None,
+        rate_limiter: RateLimiter | None = None,
     ):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
         self.temperature = temperature
         self.max_tokens = max_tokens
+        # 可选的响应缓存，相同请求直接返回上一次的结果
+        self.cache = cache
+        # 可选的限流器，多个实例传同一个即可共享配额
+        self.rate_limiter = rate_limiter
+        # 有限流器时由它负责重试，SDK 自带的重试关掉，避免重复重试
+        self.max_retries = 0 if rate_limiter is not None else DEFAULT_MAX_RETRIES
+        # 默认使用进程级共享的连接池，而不是每个实例各建一个
+        self.http_client = http_client or get_http_client()
 
         # 初始化 OpenAI 客户端，后续所有调用都走这个 client
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
+            http_client=self.http_client,
+            max_retries=self.max_retries,
         )
 
-    def chat(self, messages: list[dict], tools: list[dict] | None = None):
+    def _build_kwargs(
+        self, messages: list[dict], tools: list[dict] | None, stream: bool
+    ) -> dict:
         # 组装请求参数，按需加入可选项
         kwargs = dict(
             model=self.model,
             messages=messages,
-            stream=False,
+            stream=stream,
         )
 
         if self.temperature is not None:
@@ -43,9 +170,84 @@ class LLM:
         if tools:
             kwargs["tools"] = tools
             # kwargs["tool_choice"] = "auto"  # 一般默认就是 auto，可显式打开
+        return kwargs
+
+    def _cache_key(self, messages: list[dict], tools: list[dict] | None) -> str | None:
+        if self.cache is None:
+            return None
+        return make_cache_key(
+            self.model, messages, tools, self.temperature, self.max_tokens
+        )
+
+    @contextmanager
+    def _in_flight(self):
+        # 占用限流器的在途名额；流式请求要等整个流读完才释放
+        if self.rate_limiter is None:
+            yield
+            return
+        with self.rate_limiter.slot():
+            yield
+
+    def _send(self, kwargs: dict):
+        # 请求体由 build_request_body 拼好后直接发送，
+        # 历史消息复用缓存的 JSON 片段，不再由 SDK 每一轮重新序列化整个历史
+        return self.client.post(
+            "/chat/completions",
+            body=build_request_body(kwargs),
+            cast_to=ChatCompletion,
+            stream=bool(kwargs.get("stream")),
+            stream_cls=Stream[ChatCompletionChunk],
+        )
+
+    def _create(self, kwargs: dict):
+        if self.rate_limiter is None:
+            return self._send(kwargs)
+        estimated = estimate_request_tokens(kwargs)
+        response = self.rate_limiter.call(lambda: self._send(kwargs), tokens=estimated)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.rate_limiter.record_usage(estimated, usage.total_tokens)
+        return response
+
+    def warmup(self, connections: int = 1) -> int:
+        """
+        预热连接：并发发起几个轻量请求，让连接池里提前建好 TCP/TLS 连接
+
+        Args:
+            connections (int): 希望预先建立的连接数
+
+        Returns:
+            int: 成功建立的连接数
+        """
+        if connections <= 0:
+            return 0
+        url = str(self.client.base_url)
+
+        def _ping() -> bool:
+            try:
+                self.http_client.head(url)
+                return True
+            except httpx.HTTPError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            return sum(executor.map(lambda _: _ping(), range(connections)))
+
+    def chat(self, messages: list[dict], tools: list[dict] | None = None):
+        cache_key = self._cache_key(messages, tools)
+        if cache_key is not None:
+            record = self.cache.get(cache_key)
+            if record is not None:
+                return record_to_message(record)
+
+        kwargs = self._build_kwargs(messages, tools, stream=False)
         # 发起一次非流式对话请求，非流式更适合学习和调试
-        response = self.client.chat.completions.create(**kwargs)
+        with self._in_flight():
+            response = self._create(kwargs)
         msg = response.choices[0].message
+
+        if cache_key is not None:
+            self.cache.set(cache_key, message_to_record(msg))
         return msg
 
     def chat_stream(
@@ -57,81 +259,172 @@ class LLM:
         Yields:
             dict: 包含不同类型事件的字典
                 - {"type": "content", "content": "xxx"}  # 内容片段
-                - {"type": "tool_calls", "tool_calls": [...]}  # 工具调用
+                - {"type": "tool_call_ready", "index": 0, "tool_call": {...}}  # 单个工具调用参数已完整，可提前执行
+                - {"type": "tool_calls", "tool_calls": [...]}  # 全部工具调用
                 - {"type": "done"}  # 流结束
         """
-        kwargs = dict(
-            model=self.model,
-            messages=messages,
-            stream=True,  # 启用流式
-        )
+        cache_key = self._cache_key(messages, tools)
+        if cache_key is not None:
+            record = self.cache.get(cache_key)
+            if record is not None:
+                # 命中缓存，按相同的事件格式重放
+                yield from record_to_events(record)
+                return
 
-        if self.temperature is not None:
-            kwargs["temperature"] = self.temperature
-        if self.max_tokens is not None:
-            kwargs["max_tokens"] = self.max_tokens
-        if tools:
-            kwargs["tools"] = tools
+        kwargs = self._build_kwargs(messages, tools, stream=True)  # 启用流式
 
-        print("LLM chat_stream with params:\n", kwargs)
-
-        response = self.client.chat.completions.create(**kwargs)
-
-        content_buffer = ""
-        tool_calls_buffer: dict[int, dict] = {}
-
-        for chunk in response:
-            delta = chunk.choices[0].delta
-
-            # 处理内容块
-            if delta.content:
-                content_chunk = delta.content
-                content_buffer += content_chunk
-                yield {"type": "content", "content": content_chunk}
-
-            # 处理工具调用块
-            if delta.tool_calls:
-                for tc in delta.tool_calls:
-                    tc_index = tc.index
-                    if tc_index not in tool_calls_buffer:
-                        tool_calls_buffer[tc_index] = {
-                            "id": "",
-                            "type": "",
-                            "function": {"name": "", "arguments": ""},
-                        }
-
-                    if tc.id:
-                        tool_calls_buffer[tc_index]["id"] = tc.id
-                    if tc.type:
-                        tool_calls_buffer[tc_index]["type"] = tc.type
-
-                    if tc.function and tc.function.name:
-                        tool_calls_buffer[tc_index]["function"]["name"] = (
-                            tc.function.name
-                        )
-                    if tc.function and tc.function.arguments:
-                        tool_calls_buffer[tc_index]["function"]["arguments"] += (
-                            tc.function.arguments
-                        )
+        # 内容块和工具调用块都交给组装器处理
+        assembler = StreamAssembler()
+        with self._in_flight():
+            response = self._create(kwargs)
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                yield from assembler.feed(chunk.choices[0].delta)
 
         # 流结束，输出完整工具调用信息
-        if tool_calls_buffer:
-            tool_calls_list = [
-                tool_calls_buffer[i] for i in sorted(tool_calls_buffer.keys())
-            ]
-            yield {"type": "tool_calls", "tool_calls": tool_calls_list}
+        yield from assembler.finish()
+
+        # 完整收到流之后才写缓存（调用方可能在 done 之后就不再迭代）
+        if cache_key is not None:
+            self.cache.set(cache_key, assembler_to_record(assembler))
+
+        yield {"type": "done"}
+
+
+class AsyncLLM(LLM):
+    """
+    在 LLM 的基础上增加异步接口 achat / achat_stream
+
+    异步请求走当前事件循环共享的连接池，等待网络时不占用工作线程，
+    一个进程可以同时挂起成百上千个会话。
+    """
+
+    def __init__(
+        self, *args, async_http_client: httpx.AsyncClient | None = None, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        # 一般不用传，默认取当前事件循环共享的连接池
+        self.async_http_client = async_http_client
+        self._aclient: AsyncOpenAI | None = None
+        self._aclient_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def aclient(self) -> AsyncOpenAI:
+        # 异步客户端绑定事件循环，换了事件循环就重新创建
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.async_http_client or get_async_http_client(),
+                max_retries=self.max_retries,
+            )
+            self._aclient_loop = loop
+        return self._aclient
+
+    @asynccontextmanager
+    async def _ain_flight(self):
+        if self.rate_limiter is None:
+            yield
+            return
+        async with self.rate_limiter.aslot():
+            yield
+
+    async def _asend(self, kwargs: dict):
+        return await self.aclient.post(
+            "/chat/completions",
+            body=build_request_body(kwargs),
+            cast_to=ChatCompletion,
+            stream=bool(kwargs.get("stream")),
+            stream_cls=AsyncStream[ChatCompletionChunk],
+        )
+
+    async def _acreate(self, kwargs: dict):
+        if self.rate_limiter is None:
+            return await self._asend(kwargs)
+        estimated = estimate_request_tokens(kwargs)
+        response = await self.rate_limiter.acall(lambda: self._asend(kwargs), tokens=estimated)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.rate_limiter.record_usage(estimated, usage.total_tokens)
+        return response
+
+    async def awarmup(self, connections: int = 1) -> int:
+        """异步版本的 warmup，在事件循环里并发预热连接"""
+        if connections <= 0:
+            return 0
+        http_client = self.async_http_client or get_async_http_client()
+        url = str(self.aclient.base_url)
+
+        async def _ping() -> bool:
+            try:
+                await http_client.head(url)
+                return True
+            except httpx.HTTPError:
+                return False
+
+        results = await asyncio.gather(*(_ping() for _ in range(connections)))
+        return sum(results)
+
+    async def achat(self, messages: list[dict], tools: list[dict] | None = None):
+        cache_key = self._cache_key(messages, tools)
+        if cache_key is not None:
+            record = self.cache.get(cache_key)
+            if record is not None:
+                return record_to_message(record)
+
+        kwargs = self._build_kwargs(messages, tools, stream=False)
+        async with self._ain_flight():
+            response = await self._acreate(kwargs)
+        msg = response.choices[0].message
+
+        if cache_key is not None:
+            self.cache.set(cache_key, message_to_record(msg))
+        return msg
+
+    async def achat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> AsyncGenerator[dict, None]:
+        """异步流式对话，事件格式与 chat_stream 相同"""
+        cache_key = self._cache_key(messages, tools)
+        if cache_key is not None:
+            record = self.cache.get(cache_key)
+            if record is not None:
+                for event in record_to_events(record):
+                    yield event
+                return
+
+        kwargs = self._build_kwargs(messages, tools, stream=True)
+
+        assembler = StreamAssembler()
+        async with self._ain_flight():
+            response = await self._acreate(kwargs)
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                for event in assembler.feed(chunk.choices[0].delta):
+                    yield event
+
+        for event in assembler.finish():
+            yield event
+
+        if cache_key is not None:
+            self.cache.set(cache_key, assembler_to_record(assembler))
 
         yield {"type": "done"}
 
 
-class DeepSeek(LLM):
+class DeepSeek(AsyncLLM):
     def __init__(
         self,
         api_key: str | None = os.getenv("DEEPSEEK_API_KEY"),
         model: str | None = "deepseek-chat",
+        **kwargs,
     ):
         super().__init__(
             api_key=api_key,
             model=model,
             base_url="https://api.deepseek.com",
+            **kwargs,
         )
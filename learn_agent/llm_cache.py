@@ -0,0 +1,192 @@
+"""
+LLM 响应缓存：完全相同的请求直接复用上一次的结果
+
+两级缓存：
+- 内存 LRU：有容量上限，命中最快
+- SQLite（可选）：进程重启后依然有效，按 TTL 过期
+
+缓存里保存的是统一的 record 格式 {"content": ..., "tool_calls": [...]}，
+同一条 record 既可以还原成 chat 返回的消息对象，也可以重放成 chat_stream 的事件。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generator
+
+from openai.types.chat import ChatCompletionMessage
+
+from learn_agent.message import SchemaList, dumps, messages_json
+
+
+def make_cache_key(
+    model: str | None,
+    messages: list[dict],
+    tools: list[dict] | None,
+    temperature: float | None,
+    max_tokens: int | None,
+) -> str:
+    """对请求参数做稳定的哈希（dict 按 key 排序后再序列化，消息和工具 schema 复用缓存的 JSON）"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    payload += tools.json if isinstance(tools, SchemaList) else dumps(tools or [])
+    payload += messages_json(messages)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def message_to_record(msg) -> dict:
+    # 把 chat 返回的消息对象转成可以 JSON 序列化的 record
+    tool_calls = getattr(msg, "tool_calls", None)
+    return {
+        "content": getattr(msg, "content", None),
+        "tool_calls": [tc.model_dump() for tc in tool_calls] if tool_calls else None,
+    }
+
+
+def record_to_message(record: dict) -> ChatCompletionMessage:
+    # 还原成与 OpenAI SDK 相同类型的消息对象，调用方无需区分是否命中缓存
+    tool_calls = record.get("tool_calls")
+    if tool_calls:
+        tool_calls = [{**tc, "type": tc.get("type") or "function"} for tc in tool_calls]
+    return ChatCompletionMessage.model_validate(
+        {"role": "assistant", "content": record.get("content"), "tool_calls": tool_calls}
+    )
+
+
+def assembler_to_record(assembler) -> dict:
+    # 流式组装器（StreamAssembler）的结果转成 record
+    return {
+        "content": assembler.content or None,
+        "tool_calls": assembler.tool_calls or None,
+    }
+
+
+def record_to_events(record: dict) -> Generator[dict, None, None]:
+    # 按 chat_stream 的事件格式重放
+    if record.get("content"):
+        yield {"type": "content", "content": record["content"]}
+    if record.get("tool_calls"):
+        for index, tc in enumerate(record["tool_calls"]):
+            yield {"type": "tool_call_ready", "index": index, "tool_call": tc}
+        yield {"type": "tool_calls", "tool_calls": record["tool_calls"]}
+    yield {"type": "done"}
+
+
+class LLMCache:
+    """
+    精确匹配的 LLM 响应缓存
+
+    Args:
+        max_entries (int): 内存 LRU 最多保存的条数
+        path (str | Path | None): SQLite 文件路径，不传则只用内存
+        ttl (float | None): 过期时间（秒），None 表示永不过期
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        path: str | Path | None = None,
+        ttl: float | None = 24 * 3600,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+            self.evict_expired()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                created, record = item
+                if not self._expired(created):
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return record
+                del self._lru[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    record = json.loads(row[0])
+                    # 磁盘命中后提升到内存层
+                    self._put_memory(key, row[1], record)
+                    self.hits += 1
+                    return record
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, record: dict) -> None:
+        created = time.time()
+        with self._lock:
+            self._put_memory(key, created, record)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(record, ensure_ascii=False), created),
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, created: float, record: dict) -> None:
+        self._lru[key] = (created, record)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def evict_expired(self) -> int:
+        """删除磁盘层中已过期的条目，返回删除条数"""
+        if self._db is None or self.ttl is None:
+            return 0
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl,)
+            )
+            self._db.commit()
+            return cur.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._lru),
+        }
@@ -0,0 +1,323 @@
+"""
+多端点 LLM 池：把多个 LLM（不同 base_url / api_key）当成一个用
+
+- 选择：按 EWMA 延迟和错误率打分，优先走最快、最稳定的端点
+- 故障转移：请求失败就换下一个端点（流式请求只在还没产出事件前转移）
+- 对冲请求（可选）：首个响应超过该端点观测到的 p95 首字时间还没回来，
+  就向次优端点再发一份，谁先返回用谁
+
+LLMPool 提供和 LLM 相同的 chat / chat_stream / achat / achat_stream，
+Agent 可以直接把它当成 llm 传入；只有同步接口的端点在异步调用时放到线程里执行。
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncGenerator, Generator
+
+from learn_agent.llm import LLM, achat_model, achat_stream_model
+
+_END = object()
+
+
+class EndpointStats:
+    """单个端点的延迟 / 错误统计"""
+
+    def __init__(self, alpha: float, window: int = 200):
+        self.alpha = alpha
+        self.ewma_latency: float | None = None
+        self.ewma_error = 0.0
+        self.requests = 0
+        self.failures = 0
+        # 首个响应耗时（非流式就是整个请求耗时，流式是首个事件耗时）
+        self.ttft_samples: deque[float] = deque(maxlen=window)
+
+    def record_success(self, ttft: float, latency: float) -> None:
+        self.requests += 1
+        self.ttft_samples.append(ttft)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+        self.ewma_error *= 1 - self.alpha
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.failures += 1
+        self.ewma_error += self.alpha * (1 - self.ewma_error)
+
+    def p95_ttft(self, min_samples: int) -> float | None:
+        if len(self.ttft_samples) < min_samples:
+            return None
+        samples = sorted(self.ttft_samples)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def score(self, error_penalty: float) -> float:
+        # 没有样本的端点得 0 分，会被优先尝试一次
+        latency = self.ewma_latency or 0.0
+        return latency * (1 + error_penalty * self.ewma_error) + self.ewma_error
+
+
+class LLMPool:
+    """
+    Args:
+        llms (list[LLM]): 端点列表
+        alpha (float): EWMA 平滑系数，越大越看重最近的请求
+        error_penalty (float): 错误率在打分中的权重
+        hedge (bool): 是否开启对冲请求
+        hedge_min_samples (int): 端点积累多少个样本后才开始对冲
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-pool")
+
+    def __init__(
+        self,
+        llms: list[LLM],
+        alpha: float = 0.2,
+        error_penalty: float = 5.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+    ):
+        if not llms:
+            raise ValueError("LLMPool needs at least one LLM.")
+        self.llms = llms
+        self.error_penalty = error_penalty
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = [EndpointStats(alpha) for _ in llms]
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str | None:
+        return self.llms[0].model
+
+    def _ranked(self) -> list[int]:
+        with self._lock:
+            return sorted(
+                range(len(self.llms)),
+                key=lambda i: self.stats[i].score(self.error_penalty),
+            )
+
+    def _hedge_delay(self, idx: int) -> float | None:
+        if not self.hedge or len(self.llms) < 2:
+            return None
+        with self._lock:
+            return self.stats[idx].p95_ttft(self.hedge_min_samples)
+
+    def _record_success(self, idx: int, ttft: float, latency: float) -> None:
+        with self._lock:
+            self.stats[idx].record_success(ttft, latency)
+
+    def _record_failure(self, idx: int) -> None:
+        with self._lock:
+            self.stats[idx].record_failure()
+
+    def _timed_chat(self, idx: int, messages: list[dict], tools: list[dict] | None):
+        start = time.monotonic()
+        try:
+            msg = self.llms[idx].chat(messages=messages, tools=tools)
+        except Exception:
+            self._record_failure(idx)
+            raise
+        elapsed = time.monotonic() - start
+        self._record_success(idx, elapsed, elapsed)
+        return msg
+
+    def chat(self, messages: list[dict], tools: list[dict] | None = None):
+        order = self._ranked()
+        last_error: Exception | None = None
+
+        while order:
+            idx = order.pop(0)
+            delay = self._hedge_delay(idx) if order else None
+            if delay is None:
+                try:
+                    return self._timed_chat(idx, messages, tools)
+                except Exception as e:
+                    last_error = e
+                    continue
+
+            # 对冲：主请求超过 p95 还没返回，就向次优端点再发一份
+            primary = self._executor.submit(self._timed_chat, idx, messages, tools)
+            done, _ = wait([primary], timeout=delay)
+            futures = [primary]
+            if not done:
+                backup = order.pop(0)
+                futures.append(self._executor.submit(self._timed_chat, backup, messages, tools))
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    futures.remove(future)
+                    if future.exception() is None:
+                        return future.result()
+                    last_error = future.exception()
+
+        raise last_error or RuntimeError("No LLM endpoint available.")
+
+    def chat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> Generator[dict, None, None]:
+        """流式对话，事件格式与 LLM.chat_stream 相同"""
+        if not self.hedge or len(self.llms) < 2:
+            yield from self._failover_stream(messages, tools)
+            return
+
+        order = self._ranked()
+        # 每个端点的流都在后台线程里读，事件放进同一个队列
+        events: queue.Queue = queue.Queue()
+        cancelled: set[int] = set()
+        running: dict[int, float] = {}
+        winner: int | None = None
+        ttft = 0.0
+        last_error: Exception | None = None
+
+        def _pump(idx: int) -> None:
+            stream = self.llms[idx].chat_stream(messages=messages, tools=tools)
+            try:
+                for event in stream:
+                    if idx in cancelled:
+                        break
+                    events.put((idx, event))
+                events.put((idx, _END))
+            except Exception as e:
+                events.put((idx, e))
+            finally:
+                stream.close()
+
+        def _start(idx: int) -> None:
+            running[idx] = time.monotonic()
+            threading.Thread(target=_pump, args=(idx,), daemon=True).start()
+
+        _start(order.pop(0))
+        try:
+            while running:
+                timeout = None
+                if winner is None and order and len(running) == 1:
+                    timeout = self._hedge_delay(next(iter(running)))
+                try:
+                    idx, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    # 首个事件迟迟不来，发起对冲请求
+                    _start(order.pop(0))
+                    continue
+
+                if winner is not None and idx != winner:
+                    continue
+
+                if isinstance(item, Exception):
+                    self._record_failure(idx)
+                    running.pop(idx, None)
+                    last_error = item
+                    if winner is not None:
+                        # 已经产出过事件，无法无缝转移
+                        raise item
+                    if not running and order:
+                        _start(order.pop(0))
+                    continue
+
+                if winner is None:
+                    # 第一个产出事件的端点胜出，其余的取消
+                    winner = idx
+                    ttft = time.monotonic() - running[idx]
+                    cancelled.update(other for other in running if other != idx)
+
+                # 调用方通常读到 done 就不再迭代，所以在 done 时记录成功
+                if item is _END or item.get("type") == "done":
+                    self._record_success(idx, ttft, time.monotonic() - running.pop(idx))
+                    if item is not _END:
+                        yield item
+                    return
+                yield item
+        finally:
+            cancelled.update(running)
+
+        raise last_error or RuntimeError("No LLM endpoint available.")
+
+    def _failover_stream(
+        self, messages: list[dict], tools: list[dict] | None
+    ) -> Generator[dict, None, None]:
+        # 不对冲时直接在当前线程读流，只在产出第一个事件前做故障转移
+        last_error: Exception | None = None
+        for idx in self._ranked():
+            start = time.monotonic()
+            ttft = None
+            try:
+                for event in self.llms[idx].chat_stream(messages=messages, tools=tools):
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    if event.get("type") == "done":
+                        self._record_success(idx, ttft, time.monotonic() - start)
+                    yield event
+            except Exception as e:
+                self._record_failure(idx)
+                if ttft is not None:
+                    raise
+                last_error = e
+                continue
+            return
+
+        raise last_error or RuntimeError("No LLM endpoint available.")
+
+    async def achat(self, messages: list[dict], tools: list[dict] | None = None):
+        order = self._ranked()
+        last_error: Exception | None = None
+
+        async def _timed(idx: int):
+            start = time.monotonic()
+            try:
+                msg = await achat_model(self.llms[idx], messages, tools)
+            except Exception:
+                self._record_failure(idx)
+                raise
+            elapsed = time.monotonic() - start
+            self._record_success(idx, elapsed, elapsed)
+            return msg
+
+        while order:
+            idx = order.pop(0)
+            delay = self._hedge_delay(idx) if order else None
+            tasks = [asyncio.ensure_future(_timed(idx))]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(_timed(order.pop(0))))
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        for other in tasks:
+                            other.cancel()
+                        return task.result()
+                    last_error = task.exception()
+
+        raise last_error or RuntimeError("No LLM endpoint available.")
+
+    async def achat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> AsyncGenerator[dict, None]:
+        """异步流式对话：只做故障转移，不做对冲"""
+        last_error: Exception | None = None
+        for idx in self._ranked():
+            start = time.monotonic()
+            ttft = None
+            try:
+                async for event in achat_stream_model(self.llms[idx], messages, tools):
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    if event.get("type") == "done":
+                        self._record_success(idx, ttft, time.monotonic() - start)
+                    yield event
+            except Exception as e:
+                self._record_failure(idx)
+                if ttft is not None:
+                    raise
+                last_error = e
+                continue
+            return
+
+        raise last_error or RuntimeError("No LLM endpoint available.")
@@ -1,15 +1,112 @@
+from typing import TYPE_CHECKING
+
+from learn_agent.context_window import ContextWindow
+from learn_agent.message import Message
+from learn_agent.token_counter import TokenCounter, default_counter
+
+if TYPE_CHECKING:
+    from learn_agent.compaction import Compactor
+    from learn_agent.session_store import SessionStore
+
+
 # 简单的内存模块，保存对话上下文
 class Memory:
-    def __init__(self):
-        self.messages: list[dict] = []
+    def __init__(
+        self,
+        token_counter: TokenCounter | None = None,
+        context_window: ContextWindow | None = None,
+        compactor: "Compactor | None" = None,
+        store: "SessionStore | None" = None,
+        session_id: str | None = None,
+    ):
+        self.messages: list[Message] = []
+        # 每条消息加入时就记下它的 token 数，和 messages 一一对应
+        self.token_counter = token_counter or default_counter
+        self.token_counts: list[int] = []
+        self.total_tokens = 0
+        # 可选的上下文窗口，按 token 预算决定发送哪些消息
+        self.context_window = context_window
+        if self.context_window is not None:
+            self.context_window.reset(self)
+        # 可选的后台压缩器，历史过长时把早期消息总结成一条摘要
+        self.compactor = compactor
+        # 可选的持久化存储，每条消息追加写入 store；log_offsets 记录每条消息在日志里的位置
+        # （摘要、恢复时读入的 system 消息为 -1）
+        self.store = store
+        self.session_id = session_id
+        self.log_offsets: list[int] = []
 
-    def add_message(self, role: str, content: str | None = None, **extra):
-        # messages 列表里保存对话上下文
-        msg = {"role": role}
-        if content is not None:  # 大模型返回的 tool 调用结果可能没有 content
-            msg["content"] = content
-        msg.update(extra)  # 再此还有可以优化超出max_tokens的情况
+    @classmethod
+    def resume(
+        cls, store: "SessionStore", session_id: str, window: int = 50, **kwargs
+    ) -> "Memory":
+        """
+        从 store 恢复会话：只读取 system 消息、最近一次压缩的摘要和最近 window 条消息，
+        之后新加的消息继续追加到同一个日志
+        """
+        memory = cls(store=store, session_id=session_id, **kwargs)
+        for offset, msg in store.load(session_id, window=window):
+            memory._append(Message.from_dict(msg), offset)
+        if memory.context_window is not None:
+            memory.context_window.reset(memory)
+        return memory
+
+    def _append(self, msg: Message, offset: int) -> None:
         self.messages.append(msg)
+        self.log_offsets.append(offset)
+        tokens = self.token_counter.count_message(msg)
+        self.token_counts.append(tokens)
+        self.total_tokens += tokens
+
+    def add_message(self, role: str, content: str | None = None, **extra):
+        # messages 列表里保存对话上下文，content 为 None 时不会出现在消息里
+        # （大模型返回的 tool 调用结果可能没有 content）
+        msg = Message(role, content, **extra)
+
+        offset = -1
+        if self.store is not None and self.session_id is not None:
+            offset = self.store.append(self.session_id, msg)
+        self._append(msg, offset)
+
+        if self.context_window is not None:
+            self.context_window.on_message_added(self)
+        if self.compactor is not None:
+            self.compactor.maybe_start(self)
+
+    def replace_span(self, start: int, end: int, msg: dict) -> None:
+        """用一条消息替换 messages[start:end]（例如压缩后的摘要），同步更新 token 计数"""
+        msg = Message.from_dict(msg)
+        tokens = self.token_counter.count_message(msg)
+        self.total_tokens += tokens - sum(self.token_counts[start:end])
+        self.messages[start:end] = [msg]
+        self.token_counts[start:end] = [tokens]
+        self.log_offsets[start:end] = [-1]
+        if self.context_window is not None:
+            self.context_window.reset(self)
+
+        if self.store is not None and self.session_id is not None:
+            # 快照记下摘要和它覆盖到的日志位置，恢复时不必再读被压缩的部分
+            following = [o for o in self.log_offsets[start + 1 :] if o >= 0]
+            log_offset = following[0] if following else self.store.log_size(self.session_id)
+            self.store.write_snapshot(self.session_id, summary=msg.to_dict(), log_offset=log_offset)
+
+    def replace_messages(self, replacements: dict[int, dict]) -> None:
+        """原位替换若干条消息（例如把旧的工具结果换成预览），同步更新 token 计数"""
+        for index, msg in replacements.items():
+            msg = Message.from_dict(msg)
+            tokens = self.token_counter.count_message(msg)
+            self.total_tokens += tokens - self.token_counts[index]
+            self.messages[index] = msg
+            self.token_counts[index] = tokens
+        if replacements and self.context_window is not None:
+            self.context_window.reset(self)
 
-    def get_context(self) -> list[dict]:
-        return self.messages  # 返回当前的对话上下文,每次请求都带上
+    def get_context(self) -> list[Message]:
+        # 返回当前的对话上下文,每次请求都带上
+        if self.compactor is not None:
+            # 后台摘要已经完成的话，先替换掉被压缩的那段历史
+            self.compactor.apply(self)
+        if self.context_window is not None:
+            # 超出预算时只返回窗口内的消息，避免超过模型的上下文长度
+            return self.context_window.get_context(self)
+        return self.messages
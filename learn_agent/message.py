@@ -0,0 +1,150 @@
+"""
+对话消息与请求体序列化
+
+Memory 里的每条消息是一个 Message：用 __slots__ 存字段，比普通 dict 省内存，
+同时实现了只读的 Mapping 接口，原来按 dict 读取消息的代码（msg["role"]、msg.get(...)）不用改。
+
+每条 Message 第一次被序列化时缓存自己的 JSON 片段。发请求时 build_request_body
+直接把这些片段拼成请求体，历史消息不会每一轮都重新序列化，
+每轮的序列化开销只和新增的消息有关。
+"""
+
+import json
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+
+def dumps(obj: Any) -> str:
+    """统一的紧凑 JSON 序列化（key 排序，保证相同内容得到相同的字节）"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class Message(Mapping):
+    """
+    一条对话消息，创建后不可修改（给字段赋值会抛出 AttributeError，缓存的 JSON 片段不会过期）
+
+    值为 None 的字段视为不存在，和 add_message 里"没有 content 就不放 content"的约定一致。
+    """
+
+    __slots__ = ("role", "content", "tool_calls", "tool_call_id", "name", "extra", "_json")
+
+    _FIELDS = ("role", "content", "tool_calls", "tool_call_id", "name")
+
+    def __init__(
+        self,
+        role: str,
+        content: str | None = None,
+        tool_calls: list[dict] | None = None,
+        tool_call_id: str | None = None,
+        name: str | None = None,
+        **extra,
+    ):
+        init = object.__setattr__
+        init(self, "role", role)
+        init(self, "content", content)
+        init(self, "tool_calls", tool_calls)
+        init(self, "tool_call_id", tool_call_id)
+        init(self, "name", name)
+        # 其他不常见的字段（例如 reasoning_content）
+        init(self, "extra", {k: v for k, v in extra.items() if v is not None} or None)
+        init(self, "_json", None)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError(f"Message is immutable, cannot set {key!r}; create a new Message instead")
+
+    def __delattr__(self, key: str) -> None:
+        raise AttributeError(f"Message is immutable, cannot delete {key!r}")
+
+    def __reduce__(self):
+        # copy / pickle 通过构造函数重建，不逐个给字段赋值
+        return _rebuild_message, (self.to_dict(),)
+
+    @classmethod
+    def from_dict(cls, msg: Mapping) -> "Message":
+        if isinstance(msg, Message):
+            return msg
+        return cls(**msg)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._FIELDS:
+            if getattr(self, key) is not None:
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Message({dict(self)!r})"
+
+    def to_dict(self) -> dict:
+        return dict(self)
+
+    @property
+    def json(self) -> str:
+        """这条消息在请求体里的 JSON 片段（第一次访问时序列化并缓存）"""
+        if self._json is None:
+            object.__setattr__(self, "_json", dumps(self.to_dict()))
+        return self._json
+
+
+def _rebuild_message(fields: dict) -> Message:
+    return Message(**fields)
+
+
+class SchemaList(list):
+    """
+    创建后不再修改的列表（例如工具 schema），第一次序列化后缓存 JSON，
+    之后每一轮组装请求体时直接复用
+    """
+
+    __slots__ = ("_json",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._json: str | None = None
+
+    @property
+    def json(self) -> str:
+        if self._json is None:
+            self._json = dumps(list(self))
+        return self._json
+
+
+def message_json(msg: Mapping) -> str:
+    if isinstance(msg, Message):
+        return msg.json
+    return dumps(msg)
+
+
+def messages_json(messages: list[Mapping]) -> str:
+    """把消息列表序列化成 JSON 数组，Message 直接复用缓存的片段"""
+    return "[" + ",".join(message_json(m) for m in messages) + "]"
+
+
+def build_request_body(kwargs: dict) -> bytes:
+    """
+    组装 chat/completions 的请求体
+
+    messages 用缓存的片段拼接，tools 是 SchemaList 时复用缓存的 JSON，其余参数正常序列化。
+    """
+    parts = []
+    for key, value in kwargs.items():
+        if key == "messages":
+            fragment = messages_json(value)
+        elif isinstance(value, SchemaList):
+            fragment = value.json
+        else:
+            fragment = dumps(value)
+        parts.append(f"{dumps(key)}:{fragment}")
+    return ("{" + ",".join(parts) + "}").encode("utf-8")
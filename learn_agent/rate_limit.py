@@ -0,0 +1,240 @@
+"""
+客户端限流：让所有 LLM 实例共享同一份请求配额
+
+- 令牌桶：分别限制每分钟请求数（RPM）和每分钟 token 数（TPM）
+- 并发上限：同时在途的请求数不超过 max_in_flight
+- 重试：遇到 429 / 5xx / 网络错误时指数退避 + 随机抖动，优先遵守服务端的 Retry-After；
+  一旦被限流，所有调用方一起暂停，而不是各自不停地重试
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable
+
+import openai
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def estimate_request_tokens(kwargs: dict) -> int:
+    """粗略估计一次请求会消耗的 token 数（约 4 个字符 1 个 token，再加上输出上限）"""
+    chars = sum(len(str(m.get("content") or "")) for m in kwargs.get("messages", []))
+    chars += sum(len(str(t)) for t in kwargs.get("tools") or [])
+    return chars // 4 + (kwargs.get("max_tokens") or 0)
+
+
+def parse_retry_after(error: Exception) -> float | None:
+    """从错误响应头里读取服务端建议的等待时间（秒）"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    # 也可能是 HTTP 日期格式
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    令牌桶（预约式）：先扣额度，余额为负时返回需要等待的秒数。
+    这样并发调用方天然按到达顺序排队，不需要忙等。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # 单次请求超过桶容量时按容量计，否则永远等不到
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiterStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float, new_request: bool = True) -> None:
+        # 在途名额的等待和配额的等待都算排队时间，但只有配额预约算一次请求
+        if new_request:
+            self.requests += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+            "total_wait": self.total_wait,
+        }
+
+
+class RateLimiter:
+    """
+    多个 LLM 实例共享的限流器
+
+    Args:
+        requests_per_minute (float | None): 每分钟最多请求数
+        tokens_per_minute (float | None): 每分钟最多 token 数（按估算值预扣）
+        max_in_flight (int | None): 同时在途的请求数上限
+        max_retries (int): 可重试错误的最大重试次数
+        base_delay (float): 指数退避的初始等待秒数
+        max_delay (float): 单次等待的上限
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_in_flight: int | None = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = RateLimiterStats()
+
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+        # 被限流后，在这个时间点之前所有请求都暂停
+        self._blocked_until = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        # 预扣额度，返回需要等待的秒数
+        with self._lock:
+            wait = max(0.0, self._blocked_until - time.monotonic())
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1))
+            if self._tokens is not None and tokens:
+                wait = max(wait, self._tokens.reserve(tokens))
+            self.stats.record_wait(wait)
+            return wait
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = parse_retry_after(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            # full jitter：避免所有调用方在同一时刻一起重试
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        with self._lock:
+            self.stats.retries += 1
+            if isinstance(error, openai.RateLimitError):
+                self.stats.rate_limited += 1
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """请求完成后用真实 token 数修正预扣的额度"""
+        if self._tokens is None:
+            return
+        with self._lock:
+            if actual > estimated:
+                self._tokens.reserve(actual - estimated)
+            else:
+                self._tokens.refund(estimated - actual)
+
+    @contextmanager
+    def slot(self):
+        """占用一个在途名额，整个请求（包括流式读取）结束后释放"""
+        if self._in_flight is None:
+            yield
+            return
+        start = time.monotonic()
+        self._in_flight.acquire()
+        with self._lock:
+            self.stats.record_wait(time.monotonic() - start, new_request=False)
+        try:
+            yield
+        finally:
+            self._in_flight.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        if self._in_flight is None:
+            yield
+            return
+        start = time.monotonic()
+        delay = 0.005
+        # 不能在事件循环里阻塞等待信号量，改为短间隔轮询
+        while not self._in_flight.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        with self._lock:
+            self.stats.record_wait(time.monotonic() - start, new_request=False)
+        try:
+            yield
+        finally:
+            self._in_flight.release()
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """按配额执行 fn，可重试的错误会退避后重试"""
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """call 的异步版本"""
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                return await fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
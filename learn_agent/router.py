@@ -0,0 +1,230 @@
+"""
+按轮次路由模型：每一轮对话按成本 / 延迟挑一个合适的模型
+
+Agent 每一轮都会调用一次 llm.chat，ModelRouter 实现了相同的接口，
+所以直接作为 llm 传给 Agent 即可。每次调用时：
+
+1. 估算上下文大小，过滤掉窗口放不下、或不支持工具调用的模型
+2. 判断这一轮的类型：
+   - plan：最后一条是用户输入，需要理解任务、规划工具调用，优先用能力强的模型
+   - followup：最后一条是工具结果，多半只是把结果整理成回答，优先用便宜快速的模型
+3. 参考每个路由在这类轮次上的历史成功率和延迟，成功率太低的自动升级到更强的模型
+"""
+
+import threading
+import time
+from typing import AsyncGenerator, Generator
+
+from learn_agent.llm import ChatModel, achat_model, achat_stream_model
+from learn_agent.rate_limit import estimate_request_tokens
+
+
+class Route:
+    """
+    一个可选的模型
+
+    Args:
+        name (str): 路由名称，用于统计和日志
+        llm (ChatModel): 实际调用的模型（LLM 或 LLMPool）
+        cost (float): 相对成本，越大表示越贵、能力越强
+        max_context_tokens (int): 模型的上下文窗口
+        supports_tools (bool): 是否支持工具调用
+    """
+
+    def __init__(
+        self,
+        name: str,
+        llm: ChatModel,
+        cost: float = 1.0,
+        max_context_tokens: int = 64_000,
+        supports_tools: bool = True,
+    ):
+        self.name = name
+        self.llm = llm
+        self.cost = cost
+        self.max_context_tokens = max_context_tokens
+        self.supports_tools = supports_tools
+
+
+class RouteStats:
+    """某个路由在某类轮次上的历史表现（EWMA）"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.calls = 0
+        self.success_rate = 1.0
+        self.latency: float | None = None
+
+    def record(self, ok: bool, latency: float) -> None:
+        self.calls += 1
+        self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+        if ok:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+
+class ModelRouter:
+    """
+    Args:
+        routes (list[Route]): 可选的模型
+        min_success_rate (float): 成功率低于该值的路由不再被选中（除非没有别的选择）
+        latency_weight (float): 打分时每秒延迟折合多少成本
+        alpha (float): 统计的 EWMA 平滑系数
+    """
+
+    def __init__(
+        self,
+        routes: list[Route],
+        min_success_rate: float = 0.8,
+        latency_weight: float = 0.1,
+        alpha: float = 0.2,
+    ):
+        if not routes:
+            raise ValueError("ModelRouter needs at least one route.")
+        self.routes = routes
+        self.min_success_rate = min_success_rate
+        self.latency_weight = latency_weight
+        self.alpha = alpha
+        self.stats: dict[tuple[str, str], RouteStats] = {}
+        self.last_route: Route | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str | None:
+        return getattr(self.routes[0].llm, "model", None)
+
+    @staticmethod
+    def round_kind(messages: list[dict]) -> str:
+        last_role = messages[-1].get("role") if messages else "user"
+        return "followup" if last_role == "tool" else "plan"
+
+    def _stats(self, route: Route, kind: str) -> RouteStats:
+        key = (route.name, kind)
+        if key not in self.stats:
+            self.stats[key] = RouteStats(self.alpha)
+        return self.stats[key]
+
+    def rank(self, messages: list[dict], tools: list[dict] | None = None) -> list[Route]:
+        """按优先级返回本轮可用的路由，第一个就是选中的"""
+        context_tokens = estimate_request_tokens({"messages": messages, "tools": tools})
+        kind = self.round_kind(messages)
+
+        candidates = [
+            r
+            for r in self.routes
+            if r.max_context_tokens >= context_tokens and (r.supports_tools or not tools)
+        ]
+        if not candidates:
+            # 都放不下时退回到窗口最大的模型
+            candidates = [max(self.routes, key=lambda r: r.max_context_tokens)]
+
+        with self._lock:
+            def score(route: Route) -> tuple:
+                stats = self._stats(route, kind)
+                unhealthy = stats.success_rate < self.min_success_rate
+                latency_cost = (stats.latency or 0.0) * self.latency_weight
+                # plan 轮次偏向能力强（cost 高）的模型，followup 轮次偏向便宜的模型
+                cost = -route.cost if kind == "plan" else route.cost
+                return (unhealthy, cost + latency_cost)
+
+            return sorted(candidates, key=score)
+
+    def select(self, messages: list[dict], tools: list[dict] | None = None) -> Route:
+        return self.rank(messages, tools)[0]
+
+    def record(self, route: Route, kind: str, ok: bool, latency: float) -> None:
+        with self._lock:
+            self._stats(route, kind).record(ok, latency)
+
+    def chat(self, messages: list[dict], tools: list[dict] | None = None):
+        kind = self.round_kind(messages)
+        last_error: Exception | None = None
+        # 选中的模型出错时，依次降级到下一个候选
+        for route in self.rank(messages, tools):
+            self.last_route = route
+            start = time.monotonic()
+            try:
+                msg = route.llm.chat(messages=messages, tools=tools)
+            except Exception as e:
+                self.record(route, kind, False, time.monotonic() - start)
+                last_error = e
+                continue
+            ok = bool(getattr(msg, "content", None) or getattr(msg, "tool_calls", None))
+            self.record(route, kind, ok, time.monotonic() - start)
+            return msg
+        raise last_error
+
+    def chat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> Generator[dict, None, None]:
+        kind = self.round_kind(messages)
+        last_error: Exception | None = None
+        for route in self.rank(messages, tools):
+            self.last_route = route
+            start = time.monotonic()
+            produced = False
+            # 已经产出过任何事件（例如 tool_call_ready 让调用方提前执行了工具）就不能再换模型重来
+            yielded = False
+            try:
+                for event in route.llm.chat_stream(messages=messages, tools=tools):
+                    if event.get("type") == "done":
+                        self.record(route, kind, produced, time.monotonic() - start)
+                    elif event.get("type") in ("content", "tool_call_ready", "tool_calls"):
+                        produced = True
+                    yielded = True
+                    yield event
+            except Exception as e:
+                self.record(route, kind, False, time.monotonic() - start)
+                if yielded:
+                    raise
+                last_error = e
+                continue
+            return
+        raise last_error
+
+    async def achat(self, messages: list[dict], tools: list[dict] | None = None):
+        kind = self.round_kind(messages)
+        last_error: Exception | None = None
+        for route in self.rank(messages, tools):
+            self.last_route = route
+            start = time.monotonic()
+            try:
+                msg = await achat_model(route.llm, messages, tools)
+            except Exception as e:
+                self.record(route, kind, False, time.monotonic() - start)
+                last_error = e
+                continue
+            ok = bool(getattr(msg, "content", None) or getattr(msg, "tool_calls", None))
+            self.record(route, kind, ok, time.monotonic() - start)
+            return msg
+        raise last_error
+
+    async def achat_stream(
+        self, messages: list[dict], tools: list[dict] | None = None
+    ) -> AsyncGenerator[dict, None]:
+        kind = self.round_kind(messages)
+        last_error: Exception | None = None
+        for route in self.rank(messages, tools):
+            self.last_route = route
+            start = time.monotonic()
+            produced = False
+            # 已经产出过任何事件（例如 tool_call_ready 让调用方提前执行了工具）就不能再换模型重来
+            yielded = False
+            try:
+                async for event in achat_stream_model(route.llm, messages, tools):
+                    if event.get("type") == "done":
+                        self.record(route, kind, produced, time.monotonic() - start)
+                    elif event.get("type") in ("content", "tool_call_ready", "tool_calls"):
+                        produced = True
+                    yielded = True
+                    yield event
+            except Exception as e:
+                self.record(route, kind, False, time.monotonic() - start)
+                if yielded:
+                    raise
+                last_error = e
+                continue
+            return
+        raise last_error
@@ -0,0 +1,187 @@
+"""
+持久化会话存储：每个 session 一个只追加的 JSONL 日志 + 一个小快照
+
+- <session_id>.jsonl：每条消息一行，追加写入，O(1)
+- <session_id>.snapshot.json：最近一次压缩得到的摘要，以及摘要覆盖到的日志位置 log_offset
+
+恢复会话时只读日志开头的 system 消息、快照，
+以及日志末尾最近的若干条消息（从文件尾部往前按块读取），
+不会把整个历史读进内存，也不用重新计算被压缩掉的部分。
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, Mapping
+
+from learn_agent.message import message_json
+
+
+class SessionStore:
+    """
+    Args:
+        root (str | Path): 存放会话文件的目录
+        snapshot_every (int): 每追加多少条消息刷新一次快照（同时 fsync 日志）
+    """
+
+    def __init__(self, root: str | Path = ".sessions", snapshot_every: int = 100):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        self._files: dict[str, BinaryIO] = {}
+        self._appends: dict[str, int] = {}
+        self._snapshots: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _log_path(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.jsonl"
+
+    def _snapshot_path(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.snapshot.json"
+
+    def _file(self, session_id: str) -> BinaryIO:
+        f = self._files.get(session_id)
+        if f is None:
+            f = self._files[session_id] = open(self._log_path(session_id), "ab+")
+            # 上次进程可能在写到一半时退出，补一个换行，让残缺的行独立成行
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        return f
+
+    def append(self, session_id: str, msg: Mapping) -> int:
+        """追加一条消息，返回它在日志中的字节偏移"""
+        # Message 的 JSON 片段会被缓存，发请求时直接复用
+        line = message_json(msg) + "\n"
+        with self._lock:
+            f = self._file(session_id)
+            offset = f.tell()
+            f.write(line.encode("utf-8"))
+            f.flush()
+            count = self._appends[session_id] = self._appends.get(session_id, 0) + 1
+            if count % self.snapshot_every == 0:
+                os.fsync(f.fileno())
+                snapshot = dict(self.read_snapshot(session_id) or {"summary": None, "log_offset": 0})
+                snapshot["log_size"] = f.tell()
+                self._write_snapshot(session_id, snapshot)
+        return offset
+
+    def log_size(self, session_id: str) -> int:
+        with self._lock:
+            return self._file(session_id).tell()
+
+    def write_snapshot(self, session_id: str, summary: dict | None, log_offset: int) -> None:
+        """
+        记录压缩后的状态
+
+        Args:
+            summary (dict | None): 摘要消息
+            log_offset (int): 摘要覆盖到的日志位置，恢复时只读这之后的消息
+        """
+        with self._lock:
+            self._write_snapshot(
+                session_id,
+                {
+                    "summary": summary,
+                    "log_offset": log_offset,
+                    "log_size": self._file(session_id).tell(),
+                },
+            )
+
+    def _write_snapshot(self, session_id: str, snapshot: dict) -> None:
+        # 先写临时文件再替换，保证快照文件总是完整的
+        path = self._snapshot_path(session_id)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self._snapshots[session_id] = snapshot
+
+    def read_snapshot(self, session_id: str) -> dict | None:
+        if session_id in self._snapshots:
+            return self._snapshots[session_id]
+        path = self._snapshot_path(session_id)
+        if not path.exists():
+            return None
+        snapshot = json.loads(path.read_text(encoding="utf-8"))
+        self._snapshots[session_id] = snapshot
+        return snapshot
+
+    def _read_head(self, session_id: str) -> tuple[list[dict], int]:
+        # 从日志开头读出连续的 system 消息，以及它们之后的字节偏移
+        head: list[dict] = []
+        offset = 0
+        path = self._log_path(session_id)
+        if not path.exists():
+            return head, offset
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                msg = json.loads(line)
+                if msg.get("role") != "system":
+                    break
+                head.append(msg)
+                offset += len(line)
+        return head, offset
+
+    def _read_tail(self, session_id: str, min_offset: int, count: int) -> list[tuple[int, dict]]:
+        # 从文件尾部往前按块读取，直到凑够 count 行或到达 min_offset
+        path = self._log_path(session_id)
+        if not path.exists() or count <= 0:
+            return []
+        with open(path, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            buf = b""
+            while pos > min_offset and buf.count(b"\n") <= count:
+                step = min(64 * 1024, pos - min_offset)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+
+        entries: list[tuple[int, dict]] = []
+        offset = pos
+        lines = buf.split(b"\n")
+        # 最后一段没有换行符，可能是写到一半的行，丢弃
+        for i, line in enumerate(lines[:-1]):
+            line_offset = offset
+            offset += len(line) + 1
+            # 没读到 min_offset 时，第一段可能是半行
+            if i == 0 and pos > min_offset:
+                continue
+            if not line.strip():
+                continue
+            try:
+                entries.append((line_offset, json.loads(line)))
+            except json.JSONDecodeError:
+                # 残缺的行
+                continue
+        return entries[-count:]
+
+    def load(self, session_id: str, window: int = 50) -> list[tuple[int, dict]]:
+        """
+        恢复会话：返回 [(日志偏移, 消息)]，依次是 system 消息、摘要（如有）和最近 window 条消息。
+        system 消息和摘要的偏移为 -1。
+        """
+        snapshot = self.read_snapshot(session_id) or {}
+        summary = snapshot.get("summary")
+        head, head_end = self._read_head(session_id)
+        min_offset = max(head_end, snapshot.get("log_offset", 0))
+
+        tail = self._read_tail(session_id, min_offset, window)
+        # 窗口不能从孤立的 tool 结果开始
+        while tail and tail[0][1].get("role") == "tool":
+            tail.pop(0)
+
+        entries = [(-1, msg) for msg in head]
+        if summary is not None:
+            entries.append((-1, summary))
+        return entries + tail
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
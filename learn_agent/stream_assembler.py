@@ -0,0 +1,133 @@
+"""
+流式响应组装器
+
+chat_stream 每收到一个 chunk 就交给 StreamAssembler.feed：
+- 内容片段和工具参数片段都先放进 list，结束时再 join 一次，避免反复 str +=
+- 每个工具调用配一个增量 JSON 扫描器，只扫描新到的片段；
+  参数一旦是完整的 JSON，就立刻产出 tool_call_ready 事件，
+  调用方不必等整个流结束就可以开始执行这个工具
+"""
+
+import json
+
+
+class JsonCompletenessScanner:
+    """增量判断一段 JSON 文本是否已经闭合（只关心括号深度和字符串状态）"""
+
+    __slots__ = ("depth", "in_string", "escape", "started", "complete")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.complete = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                self.started = True
+                self.complete = False
+            elif ch in "}]":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    self.complete = True
+        return self.complete
+
+
+class _ToolCallBuffer:
+    __slots__ = ("id", "type", "name", "arg_parts", "scanner", "ready")
+
+    def __init__(self):
+        self.id = ""
+        self.type = ""
+        self.name = ""
+        self.arg_parts: list[str] = []
+        self.scanner = JsonCompletenessScanner()
+        self.ready = False
+
+    @property
+    def arguments(self) -> str:
+        return "".join(self.arg_parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "function": {"name": self.name, "arguments": self.arguments},
+        }
+
+
+class StreamAssembler:
+    """把 chat.completions 的流式 delta 组装成完整的 content 和 tool_calls"""
+
+    def __init__(self):
+        self._content_parts: list[str] = []
+        self._tool_calls: dict[int, _ToolCallBuffer] = {}
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content_parts)
+
+    @property
+    def tool_calls(self) -> list[dict]:
+        return [self._tool_calls[i].to_dict() for i in sorted(self._tool_calls)]
+
+    def feed(self, delta) -> list[dict]:
+        """处理一个 delta，返回这一步产生的事件"""
+        events: list[dict] = []
+
+        if delta.content:
+            self._content_parts.append(delta.content)
+            events.append({"type": "content", "content": delta.content})
+
+        for tc in delta.tool_calls or ():
+            buf = self._tool_calls.get(tc.index)
+            if buf is None:
+                buf = self._tool_calls[tc.index] = _ToolCallBuffer()
+
+            if tc.id:
+                buf.id = tc.id
+            if tc.type:
+                buf.type = tc.type
+            if tc.function and tc.function.name:
+                buf.name = tc.function.name
+            if tc.function and tc.function.arguments:
+                buf.arg_parts.append(tc.function.arguments)
+                if not buf.ready and buf.scanner.feed(tc.function.arguments):
+                    events.extend(self._mark_ready(buf, tc.index))
+
+        return events
+
+    def _mark_ready(self, buf: _ToolCallBuffer, index: int, force: bool = False) -> list[dict]:
+        # 扫描器只是粗判，真正能 json.loads 才算参数完整
+        if not force:
+            try:
+                json.loads(buf.arguments)
+            except ValueError:
+                return []
+        buf.ready = True
+        return [{"type": "tool_call_ready", "index": index, "tool_call": buf.to_dict()}]
+
+    def finish(self) -> list[dict]:
+        """流结束：补发还没 ready 的工具调用（如无参数调用），再给出完整的 tool_calls"""
+        events: list[dict] = []
+        for index in sorted(self._tool_calls):
+            buf = self._tool_calls[index]
+            if not buf.ready:
+                events.extend(self._mark_ready(buf, index, force=True))
+        if self._tool_calls:
+            events.append({"type": "tool_calls", "tool_calls": self.tool_calls})
+        return events
@@ -0,0 +1,75 @@
+"""
+Token 计数
+
+装了 tiktoken 时用它精确计数；没装（或编码文件下载不到）时用估算：
+中日韩字符约 1 字 1 token，其余约 4 个字符 1 token。
+
+计数结果会被缓存起来（Memory 在加消息时记一次，Toolkit 缓存自己的 schema），
+之后每一轮的预算检查都是 O(1)，不用把整个历史重新分词一遍。
+"""
+
+import json
+import re
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 是可选依赖
+    tiktoken = None
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+class TokenCounter:
+    """
+    Args:
+        encoding_name (str): tiktoken 编码名称
+        chars_per_token (float): 估算时非中日韩字符每个 token 的字符数
+    """
+
+    # 每条消息的角色、分隔符等固定开销
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, encoding_name: str = "cl100k_base", chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception:
+                self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count_text(self, text: str | None) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK_PATTERN.findall(text))
+        estimate = cjk + (len(text) - cjk) / self.chars_per_token
+        return max(1, round(estimate))
+
+    def count_message(self, msg: dict) -> int:
+        tokens = self.MESSAGE_OVERHEAD + self.count_text(msg.get("content"))
+        for tc in msg.get("tool_calls") or ():
+            function = tc.get("function") or {}
+            tokens += self.MESSAGE_OVERHEAD
+            tokens += self.count_text(function.get("name"))
+            tokens += self.count_text(function.get("arguments"))
+        if msg.get("tool_call_id"):
+            tokens += self.count_text(msg["tool_call_id"])
+        return tokens
+
+    def count_messages(self, messages: list[dict]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+    def count_tools(self, schemas: list[dict]) -> int:
+        if not schemas:
+            return 0
+        return self.count_text(json.dumps(schemas, ensure_ascii=False))
+
+
+# 进程内默认共享的计数器
+default_counter = TokenCounter()
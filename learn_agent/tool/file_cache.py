@@ -0,0 +1,176 @@
+"""
+进程内共享的文件内容缓存
+
+主 Agent 和每个子代理都有自己的 FileTool，它们会反复从磁盘读取同样的文件。
+FileContentCache 按 (解析后的路径, mtime, size) 缓存文件内容和行索引，
+同一个进程里的所有 FileTool 默认共用 shared_file_cache：
+
+- 小文件缓存完整内容，大文件不缓存内容（用 mmap 读取），只缓存行索引
+- 内容和行索引（每行 8 字节）一起计入总字节数，超出上限时做 LRU 淘汰
+- write_file / edit_file 写入后立即失效对应的条目
+"""
+
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from os import stat_result
+from pathlib import Path
+
+
+class LineIndex:
+    """
+    一个文件的换行符偏移索引：offsets[i] 是第 i 行（从 0 开始）的起始字节偏移。
+
+    索引按需向后扩展，只扫描到目前请求过的最远一行，
+    所以读大文件开头的几行不用扫描整个文件；扫描过的部分之后直接复用。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.offsets = array("Q", [0])
+        # 是否已经扫描到文件末尾
+        self.complete = size == 0
+        self.lock = threading.Lock()
+
+    def extend_to(self, buf: bytes | mmap.mmap, line: int) -> None:
+        """扫描到第 line 行的结束位置（或文件末尾）"""
+        offsets = self.offsets
+        while not self.complete and len(offsets) <= line + 1:
+            newline = buf.find(b"\n", offsets[-1])
+            if newline == -1 or newline + 1 == self.size:
+                self.complete = True
+                break
+            offsets.append(newline + 1)
+
+    @property
+    def line_count(self) -> int | None:
+        return len(self.offsets) if self.complete else None
+
+    def span(self, line: int) -> tuple[int, int]:
+        # 调用前要先 extend_to(line)
+        end = self.offsets[line + 1] if line + 1 < len(self.offsets) else self.size
+        return self.offsets[line], end
+
+
+class CachedFile:
+    __slots__ = ("key", "data", "lines", "charged")
+
+    def __init__(self, key: tuple[int, int], data: bytes | None):
+        self.key = key
+        # None 表示文件太大，内容不缓存
+        self.data = data
+        self.lines = LineIndex(key[1])
+        # 已经计入缓存总字节数的大小
+        self.charged = 0
+
+    @property
+    def nbytes(self) -> int:
+        """内容加上行索引占用的字节数"""
+        content = len(self.data) if self.data is not None else 0
+        return content + len(self.lines.offsets) * self.lines.offsets.itemsize
+
+
+class FileContentCache:
+    """
+    Args:
+        max_bytes (int): 缓存的文件内容和行索引总共最多占多少字节
+        max_file_bytes (int): 超过这个大小的文件只缓存行索引
+        max_entries (int): 最多缓存多少个文件
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_file_bytes: int = 4 * 1024 * 1024,
+        max_entries: int = 4096,
+    ):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Path, CachedFile]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: Path, stat: stat_result) -> CachedFile:
+        """
+        取 path 的缓存条目，stat 是调用方刚拿到的文件状态；
+        没有缓存或者 mtime / size 变了时重新读取
+        """
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 读文件不占着锁，其他线程可以同时命中缓存
+        data = path.read_bytes() if stat.st_size <= self.max_file_bytes else None
+        if data is not None and len(data) != stat.st_size:
+            # 读取时文件正在被改写，这次的内容不缓存
+            return CachedFile((stat.st_mtime_ns, len(data)), data)
+        entry = CachedFile(key, data)
+        with self._lock:
+            self._remove(path)
+            self._entries[path] = entry
+            self._charge(entry)
+        return entry
+
+    def update(self, path: Path, entry: CachedFile) -> None:
+        """entry 的行索引扩展之后调用：重新计算它占用的字节数，超出上限时淘汰"""
+        with self._lock:
+            if self._entries.get(path) is entry:
+                self._charge(entry)
+
+    def _charge(self, entry: CachedFile) -> None:
+        # 调用方持有锁
+        nbytes = entry.nbytes
+        self._bytes += nbytes - entry.charged
+        entry.charged = nbytes
+        while self._entries and (
+            self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, path: Path) -> bool:
+        # 调用方持有锁
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.charged
+        return True
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            if self._remove(path):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# 同一个进程里的 FileTool 默认共用这一个缓存
+shared_file_cache = FileContentCache()
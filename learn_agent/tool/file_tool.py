@@ -1,14 +1,65 @@
+import mmap
+import os
+import shutil
+import threading
 from pathlib import Path
-from .toolkit import Toolkit
+from pydantic import BaseModel
+from .file_cache import FileContentCache, LineIndex, shared_file_cache
+from .shell_session import ShellSession
+from .toolkit import Toolkit, concurrency_safe, report_progress
+from .workspace_index import WorkspaceIndex
+
+# read_file 单次返回的最大字符数
+MAX_READ_CHARS = 50000
+
+
+def _atomic_write(fp: Path, content: str) -> None:
+    # 先写同目录下的临时文件再替换，中途失败也不会留下写了一半的文件
+    tmp = fp.with_name(f".{fp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(content)
+        if fp.exists():
+            shutil.copymode(fp, tmp)
+        os.replace(tmp, fp)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class FileEdit(BaseModel):
+    path: str
+    old_text: str
+    new_text: str
+    replace_all: bool = False
 
 
 # https://github.com/jjyaoao/HelloAgents/blob/main/hello_agents/tools/builtin/terminal_tool.py
 class FileTool(Toolkit):
-    def __init__(self, work_dir: Path = Path.cwd(), **kwargs):
+    def __init__(
+        self,
+        work_dir: Path = Path.cwd(),
+        bash_timeout: float = 300,
+        file_cache: FileContentCache | None = None,
+        **kwargs,
+    ):
         self.work_dir = Path(work_dir).expanduser().resolve()
+        # bash 命令在同一个 shell 会话里执行，cd、export 在命令之间保持
+        self.shell = ShellSession(self.work_dir, max_chars=MAX_READ_CHARS)
+        self.bash_timeout = bash_timeout
+        # grep / glob 用的增量索引，第一次搜索时建立
+        self.index = WorkspaceIndex(self.work_dir)
+        # 文件内容和行索引的缓存，默认和进程里其他 FileTool（包括子代理的）共用
+        self.file_cache = file_cache if file_cache is not None else shared_file_cache
         super().__init__(
             name="FileTool",
-            tools=[self.bash, self.read_file, self.write_file, self.edit_file],
+            tools=[
+                self.bash,
+                self.read_file,
+                self.write_file,
+                self.edit_file,
+                self.multi_edit,
+                self.grep,
+                self.glob,
+            ],
             **kwargs,
         )
 
@@ -19,58 +70,198 @@ class FileTool(Toolkit):
             raise ValueError("Unsafe path detected.")
         return path
 
+    def _invalidate_file(self, fp: Path) -> None:
+        self.file_cache.invalidate(fp)
+        self.index.update_file(fp)
+
     def bash(self, command: str):
         """
         execute shell command. common patterns:
         - Read: cat/head/tail,grep/find/rg/ls,wc -l
         - Write: echo,>,>>,tee
+        The shell session persists between calls, so cd and export carry over.
 
         Args:
             command (str): shell command to execute
         """
-        import subprocess
-
         DANGER_COMMANDS = ["rm -rf /", "sudo", "shutdown", "reboot"]
         if any(d in command for d in DANGER_COMMANDS):
             return "ERROR: Dangerous command detected. Aborting."
 
-        try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.work_dir,
-                timeout=300,
-            )
-            output = result.stdout + result.stderr
-        except subprocess.TimeoutExpired:
-            output = "Command timed out."
+        # 输出片段实时上报，run_stream 在命令结束前就能转发给前端
+        output, exit_code = self.shell.run(
+            command,
+            timeout=self.bash_timeout,
+            on_output=lambda chunk: report_progress({"output": chunk}),
+        )
+        # 命令可能改动了任何文件，下次搜索前重新检查
+        self.index.mark_stale()
+        if exit_code:
+            output += f"\n[exit code {exit_code}]"
+        return output
+
+    def close(self) -> None:
+        self.shell.close()
 
-        return output[:50000]
+    def fork(self) -> "FileTool":
+        """
+        复制出一个有独立 shell 会话（从 work_dir 开始，没有之前的 cd / export）的 FileTool，
+        文件缓存和工作目录索引继续共用。每次子代理运行用一份，用完后 close()
+        """
+        forked = FileTool(
+            work_dir=self.work_dir,
+            bash_timeout=self.bash_timeout,
+            file_cache=self.file_cache,
+            include_tools=self.tool_names(),
+        )
+        forked.index = self.index
+        return forked
 
-    def read_file(self, path: str, limit: int | None = None) -> str:
+    # 内容由进程共享、按字节数限制的 file_cache 缓存，不再按工具包 memoize
+    @concurrency_safe
+    def read_file(self, path: str, limit: int | None = None, offset: int = 0) -> str:
         """
-        Read file contents with optional line limit.
-        For large files, use limit to read just the first N lines.
-        Output truncated to 50KB to prevent context overflow.
+        Read file contents, optionally a range of lines.
+        For large files, use offset and limit to read just the lines you need.
+        Output truncated to 50KB to prevent context overflow. When more lines remain,
+        the last line reads "... (N more lines, continue with offset=K)"; call again with offset=K.
 
         Args:
             path (str): Path to the file to read.
-            limit (int | None): Optional
+            limit (int | None): Maximum number of lines to return (default: until the 50KB cap).
+            offset (int): Line number to start from (0-based).
         """
         try:
-            text = self._safe_path(path).read_text()
-            lines = text.splitlines()
+            fp = self._safe_path(path)
+            stat = fp.stat()
+            if stat.st_size == 0:
+                return ""
+            cached = self.file_cache.get(fp, stat)
+            if cached.data is not None:
+                output = self._read_lines(cached.data, cached.lines, max(0, offset), limit)
+            else:
+                # 大文件不缓存内容，用 mmap 只读取请求的范围
+                with open(fp, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    output = self._read_lines(mm, cached.lines, max(0, offset), limit)
+            # 行索引可能变长了，重新计入缓存大小
+            self.file_cache.update(fp, cached)
+            return output
+
+        except Exception as e:
+            return f"Error: {e}"
+
+    def _read_lines(
+        self, buf: bytes | mmap.mmap, index: LineIndex, offset: int, limit: int | None
+    ) -> str:
+        # 只解码请求的行，时间和内存都和读取的范围成正比
+        lines: list[str] = []
+        chars = 0
+        line = offset
+        with index.lock:
+            while limit is None or line < offset + limit:
+                index.extend_to(buf, line)
+                if line >= len(index.offsets):
+                    break
+                start, end = index.span(line)
+                text = buf[start:end].decode("utf-8", errors="replace").rstrip("\r\n")
+                if chars + len(text) > MAX_READ_CHARS:
+                    if not lines:
+                        lines.append(text[:MAX_READ_CHARS])
+                        line += 1
+                    break
+                lines.append(text)
+                chars += len(text) + 1
+                line += 1
+            index.extend_to(buf, line)
+            more = line < len(index.offsets)
+            total = index.line_count
+
+        if more:
+            remaining = f"{total - line} more lines" if total is not None else "more lines"
+            lines.append(f"... ({remaining}, continue with offset={line})")
+        return "\n".join(lines)
+
+    def _search_prefix(self, path: str) -> str:
+        # 搜索范围限定到 work_dir 下的某个子目录
+        rel = self._safe_path(path).relative_to(self.work_dir).as_posix()
+        return "" if rel == "." else f"{rel}/"
+
+    @staticmethod
+    def _page(lines: list[str], offset: int, limit: int, total: str) -> str:
+        page = lines[offset : offset + limit]
+        end = offset + len(page)
+        if end < len(lines):
+            page.append(f"... ({len(lines) - end} more {total}, continue with offset={end})")
+        return "\n".join(page)
 
-            if limit and limit < len(lines):
-                lines = lines[:limit]
-                lines.append(f"... ({len(text.splitlines()) - limit} more lines)")
+    @concurrency_safe
+    def grep(
+        self,
+        pattern: str,
+        path: str = ".",
+        glob: str | None = None,
+        ignore_case: bool = False,
+        literal: bool = False,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> str:
+        """
+        Search file contents under the work directory with a regular expression.
+        Faster than running grep through bash; results are paginated.
+        Files larger than 2MB are not searched; they are listed after the results,
+        use bash (grep) for those.
 
-            return "\n".join(lines)[:50000]
+        Args:
+            pattern (str): Regular expression (or plain text when literal is true) to search for.
+            path (str): Directory to search in, relative to the work directory.
+            glob (str | None): Only search files matching this glob, e.g. "*.py" or "src/**/*.ts".
+            ignore_case (bool): Case-insensitive search.
+            literal (bool): Treat pattern as plain text instead of a regular expression.
+            offset (int): Number of matches to skip, for paging.
+            limit (int): Maximum number of matches to return.
+        """
+        try:
+            prefix = self._search_prefix(path)
+            matches, truncated = self.index.grep(pattern, prefix, glob, ignore_case, literal)
+            skipped = self.index.large_files(prefix, glob)
+        except Exception as e:
+            return f"Error: {e}"
+        if not matches:
+            out = "No matches found."
+        else:
+            lines = [f"{name}:{lineno}: {line[:300]}" for name, lineno, line in matches]
+            out = self._page(lines, max(0, offset), limit, "matches")
+            if truncated:
+                out += f"\n(stopped after {len(matches)} matches, narrow the search with path or glob)"
+        if skipped:
+            # 大文件不在索引里，明确告诉模型哪些文件没有搜索
+            limit_mb = self.index.max_file_bytes / (1024 * 1024)
+            shown = ", ".join(skipped[:10]) + (", ..." if len(skipped) > 10 else "")
+            out += (
+                f"\n({len(skipped)} files over {limit_mb:g}MB not searched: {shown}; "
+                "use bash grep for them)"
+            )
+        return out
+
+    @concurrency_safe
+    def glob(self, pattern: str, path: str = ".", offset: int = 0, limit: int = 200) -> str:
+        """
+        Find files by name pattern under the work directory, e.g. "**/*.py" or "tests/test_*.py".
+        Faster than running find through bash; results are paginated.
 
+        Args:
+            pattern (str): Glob pattern relative to path; ** matches any number of directories.
+            path (str): Directory to search in, relative to the work directory.
+            offset (int): Number of paths to skip, for paging.
+            limit (int): Maximum number of paths to return.
+        """
+        try:
+            names = self.index.glob(pattern, self._search_prefix(path))
         except Exception as e:
             return f"Error: {e}"
+        if not names:
+            return "No files found."
+        return self._page(names, max(0, offset), limit, "files")
 
     def write_file(self, path: str, content: str) -> str:
         """
@@ -86,7 +277,8 @@ class FileTool(Toolkit):
         try:
             fp = self._safe_path(path)
             fp.parent.mkdir(parents=True, exist_ok=True)
-            fp.write_text(content)
+            _atomic_write(fp, content)
+            self._invalidate_file(fp)
             return f"Wrote {len(content)} bytes to {path}"
 
         except Exception as e:
@@ -112,8 +304,69 @@ class FileTool(Toolkit):
 
             # Replace only first occurrence for safety
             new_content = content.replace(old_text, new_text, 1)
-            fp.write_text(new_content)
+            _atomic_write(fp, new_content)
+            self._invalidate_file(fp)
             return f"Edited {path}"
 
         except Exception as e:
             return f"Error: {e}"
+
+    def multi_edit(self, edits: list[FileEdit]) -> str:
+        """
+        Apply several exact-text replacements, across one or more files, in a single call.
+        Edits are applied in order; later edits to the same file see the result of earlier ones.
+        All edits are checked first: if any old_text is not found, nothing is written.
+        Prefer this over repeated edit_file calls for multi-site changes.
+
+        Args:
+            edits (list[FileEdit]): Replacements to apply, in order
+             - path (str): Path to the file to edit
+             - old_text (str): Exact text to find
+             - new_text (str): Text to replace with
+             - replace_all (bool): Replace every occurrence instead of only the first
+        """
+        # 先在内存里按顺序应用所有修改，每个文件只读一次
+        originals: dict[Path, str] = {}
+        contents: dict[Path, str] = {}
+        counts: dict[Path, int] = {}
+        errors = []
+        for i, edit in enumerate(edits):
+            try:
+                fp = self._safe_path(edit.path)
+                if fp not in contents:
+                    originals[fp] = contents[fp] = fp.read_text()
+                    counts[fp] = 0
+            except Exception as e:
+                errors.append(f"- edit {i} ({edit.path}): {e}")
+                continue
+            if not edit.old_text:
+                errors.append(f"- edit {i} ({edit.path}): old_text is empty")
+            elif edit.old_text not in contents[fp]:
+                errors.append(f"- edit {i} ({edit.path}): text not found")
+            else:
+                contents[fp] = contents[fp].replace(
+                    edit.old_text, edit.new_text, -1 if edit.replace_all else 1
+                )
+                counts[fp] += 1
+        if errors:
+            return "Error: no changes written.\n" + "\n".join(errors)
+
+        # 逐个文件原子替换；某个文件写失败时把已经写入的文件恢复原样
+        written: list[Path] = []
+        try:
+            for fp, content in contents.items():
+                if content != originals[fp]:
+                    _atomic_write(fp, content)
+                    written.append(fp)
+        except Exception as e:
+            for fp in written:
+                _atomic_write(fp, originals[fp])
+            return f"Error: {e}; no changes written."
+        finally:
+            for fp in written:
+                self._invalidate_file(fp)
+
+        summary = ", ".join(
+            f"{fp.relative_to(self.work_dir).as_posix()} ({counts[fp]})" for fp in contents
+        )
+        return f"Applied {len(edits)} edits to {len(contents)} files: {summary}"
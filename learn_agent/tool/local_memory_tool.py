@@ -0,0 +1,326 @@
+"""LocalMemoryTool - Offline long-term memory with a local vector index.
+
+Same four tool methods as Mem0Tool, but nothing leaves the machine:
+
+- embeddings come from a local embedder (hashing of words and character n-grams by default)
+- vectors live in a memory-mapped NumPy matrix, one row per memory
+- metadata (id, user, content, time) lives in SQLite
+- search is a single matrix-vector product plus top-k, a few milliseconds for 100k+ memories
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into L2-normalized float32 vectors of a fixed size."""
+
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray: ...
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder over words and character n-grams.
+
+    No model download and no network; good enough for keyword-ish recall,
+    and works for CJK text because n-grams are taken per character.
+
+    Args:
+        dim (int): Size of the embedding vectors.
+        ngram_range (tuple[int, int]): Character n-gram sizes to hash (inclusive).
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> list[str]:
+        features = []
+        lo, hi = self.ngram_range
+        for word in _WORD_PATTERN.findall(text.lower()):
+            features.append(word)
+            padded = f" {word} "
+            for n in range(lo, hi + 1):
+                features.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 is stable across processes, unlike hash()
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class LocalVectorStore:
+    """Memory-mapped embedding matrix + SQLite metadata.
+
+    Row ``i`` of ``vectors.f32`` holds the embedding of the memory stored with ``row = i``
+    in SQLite. Deleted memories keep their row but are masked out of search.
+
+    Args:
+        path (str | Path): Directory for ``vectors.f32`` and ``memories.db``.
+        embedder (Embedder | None): Embedder to use. Defaults to HashingEmbedder.
+        initial_capacity (int): Rows to allocate up front; the file doubles when full.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = ".local_memory",
+        embedder: Embedder | None = None,
+        initial_capacity: int = 1024,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(self.path / "memories.db", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE, user_id TEXT, "
+            "content TEXT, created_at REAL, deleted INTEGER DEFAULT 0)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        stored_dim = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        if stored_dim is None:
+            self._db.execute("INSERT INTO meta VALUES ('dim', ?)", (str(self.dim),))
+        elif int(stored_dim[0]) != self.dim:
+            raise ValueError(
+                f"Store at {self.path} was built with dim={stored_dim[0]}, embedder has dim={self.dim}"
+            )
+        self._db.commit()
+
+        # Per-row state kept in memory so search never touches SQLite until the top-k is known
+        rows = self._db.execute("SELECT row, user_id, deleted FROM memories ORDER BY row").fetchall()
+        self._count = rows[-1][0] + 1 if rows else 0
+        self._user_codes: dict[str, int] = {}
+        capacity = max(initial_capacity, self._count)
+        self._owner = np.full(capacity, -1, dtype=np.int32)
+        for row, user_id, deleted in rows:
+            if not deleted:
+                self._owner[row] = self._user_code(user_id)
+
+        self._vectors_path = self.path / "vectors.f32"
+        self._vectors = self._open_vectors(capacity)
+
+    def _user_code(self, user_id: str) -> int:
+        if user_id not in self._user_codes:
+            self._user_codes[user_id] = len(self._user_codes)
+        return self._user_codes[user_id]
+
+    def _open_vectors(self, capacity: int) -> np.memmap:
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        capacity = self._vectors_path.stat().st_size // (self.dim * 4)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        self._vectors.flush()
+        del self._vectors
+        self._vectors = self._open_vectors(capacity)
+        owner = np.full(capacity, -1, dtype=np.int32)
+        owner[: len(self._owner)] = self._owner
+        self._owner = owner
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._owner[: self._count] >= 0))
+
+    def add(self, content: str, user_id: str = "default") -> str:
+        return self.add_many([content], user_id=user_id)[0]
+
+    def add_many(self, contents: list[str], user_id: str = "default") -> list[str]:
+        """Add several memories with one embedding call and one SQLite commit."""
+        if not contents:
+            return []
+        vectors = self.embedder.embed(contents)
+        memory_ids = [uuid.uuid4().hex for _ in contents]
+        now = time.time()
+        with self._lock:
+            start = self._count
+            self._ensure_capacity(start + len(contents))
+            self._vectors[start : start + len(contents)] = vectors
+            self._owner[start : start + len(contents)] = self._user_code(user_id)
+            self._count += len(contents)
+            self._db.executemany(
+                "INSERT INTO memories (row, id, user_id, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (start + i, memory_id, user_id, content, now)
+                    for i, (memory_id, content) in enumerate(zip(memory_ids, contents))
+                ],
+            )
+            self._db.commit()
+        return memory_ids
+
+    def search(self, query: str, user_id: str = "default", limit: int = 5) -> list[dict]:
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            code = self._user_codes.get(user_id)
+            if code is None or self._count == 0:
+                return []
+            # Cosine similarity: all vectors are L2-normalized, so it is a dot product
+            scores = np.asarray(self._vectors[: self._count] @ vector)
+            scores[self._owner[: self._count] != code] = -np.inf
+            k = min(limit, self._count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top = [int(r) for r in top if np.isfinite(scores[r])]
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            records = {
+                row: (memory_id, content)
+                for row, memory_id, content in self._db.execute(
+                    f"SELECT row, id, content FROM memories WHERE row IN ({placeholders})", top
+                )
+            }
+        return [
+            {"id": records[r][0], "memory": records[r][1], "score": round(float(scores[r]), 4)}
+            for r in top
+        ]
+
+    def get_all(self, user_id: str = "default") -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, content, created_at FROM memories "
+                "WHERE user_id = ? AND deleted = 0 ORDER BY row",
+                (user_id,),
+            ).fetchall()
+        return [{"id": i, "memory": c, "created_at": t} for i, c, t in rows]
+
+    def delete(self, memory_id: str, user_id: str = "default") -> bool:
+        with self._lock:
+            found = self._db.execute(
+                "SELECT row FROM memories WHERE id = ? AND user_id = ? AND deleted = 0",
+                (memory_id, user_id),
+            ).fetchone()
+            if found is None:
+                return False
+            self._db.execute("UPDATE memories SET deleted = 1 WHERE row = ?", (found[0],))
+            self._db.commit()
+            self._owner[found[0]] = -1
+        return True
+
+    def delete_many(self, memory_ids: list[str], user_id: str = "default") -> None:
+        for memory_id in memory_ids:
+            self.delete(memory_id, user_id=user_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors.flush()
+            self._db.close()
+
+
+class LocalMemoryTool(Toolkit):
+    """Offline drop-in for Mem0Tool backed by LocalVectorStore.
+
+    Provides methods to add, search, retrieve, and delete memories.
+    """
+
+    def __init__(
+        self,
+        user_id: str = "default",
+        path: str | Path = ".local_memory",
+        embedder: Embedder | None = None,
+        store: LocalVectorStore | None = None,
+        **kwargs,
+    ):
+        """Initialize LocalMemoryTool.
+
+        Args:
+            user_id (str): The user ID for memory storage. Defaults to "default".
+            path (str | Path): Directory for the local index. Ignored when store is given.
+            embedder (Embedder | None): Local embedder. Defaults to HashingEmbedder.
+            store (LocalVectorStore | None): Share one store between several tools.
+        """
+        self.user_id = user_id
+        self.store = store or LocalVectorStore(path, embedder=embedder)
+        super().__init__(
+            name="LocalMemoryTool",
+            tools=[self.add_memory, self.search_memory, self.get_all_memories, self.delete_memory],
+            **kwargs,
+        )
+
+    # Batch interface used by WriteBehindMemoryTool
+    def add_many(self, contents: list[str]) -> list[str]:
+        return self.store.add_many(contents, user_id=self.user_id)
+
+    def delete_many(self, memory_ids: list[str]) -> None:
+        self.store.delete_many(memory_ids, user_id=self.user_id)
+
+    def search(self, query: str) -> list[dict]:
+        return self.store.search(query, user_id=self.user_id)
+
+    def get_all(self) -> list[dict]:
+        return self.store.get_all(user_id=self.user_id)
+
+    def add_memory(self, content: str) -> str:
+        """Add a new memory.
+
+        Args:
+            content (str): The memory content to store.
+
+        Returns:
+            str: Confirmation message with memory ID.
+        """
+        memory_id = self.store.add(content, user_id=self.user_id)
+        return f"Memory added: {{'id': '{memory_id}', 'memory': {content!r}}}"
+
+    @concurrency_safe
+    def search_memory(self, query: str) -> str:
+        """Search for relevant memories.
+
+        Args:
+            query (str): The search query.
+
+        Returns:
+            str: Search results as string.
+        """
+        return str(self.store.search(query, user_id=self.user_id))
+
+    @concurrency_safe
+    def get_all_memories(self) -> str:
+        """Get all stored memories for the user.
+
+        Returns:
+            str: All memories as string.
+        """
+        return str(self.store.get_all(user_id=self.user_id))
+
+    def delete_memory(self, memory_id: str) -> str:
+        """Delete a specific memory.
+
+        Args:
+            memory_id (str): The ID of the memory to delete.
+
+        Returns:
+            str: Confirmation message.
+        """
+        if not self.store.delete(memory_id, user_id=self.user_id):
+            return f"Memory {memory_id} not found"
+        return f"Memory {memory_id} deleted"
@@ -1,7 +1,8 @@
 """Mem0Tool - Memory management using mem0 for persistent storage."""
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from mem0 import MemoryClient
-from learn_agent.tool.toolkit import Toolkit
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe
 
 
 class Mem0Tool(Toolkit):
@@ -10,20 +11,58 @@ class Mem0Tool(Toolkit):
     Provides methods to add, search, retrieve, and delete memories.
     """
 
-    def __init__(self, user_id: str = "default", **kwargs):
+    def __init__(self, user_id: str = "default", client: MemoryClient | None = None, **kwargs):
         """Initialize Mem0Tool.
 
         Args:
             user_id (str): The user ID for memory storage. Defaults to "default".
+            client (MemoryClient | None): mem0 client to use. Defaults to a new MemoryClient().
         """
         self.user_id = user_id
-        self.client = MemoryClient()
+        self.client = client if client is not None else MemoryClient()
         super().__init__(
             name="Mem0Tool",
             tools=[self.add_memory, self.search_memory, self.get_all_memories, self.delete_memory],
             **kwargs,
         )
 
+    @staticmethod
+    def _records(results: Any) -> list[dict]:
+        # The hosted API returns either a list or {"results": [...]}
+        if isinstance(results, dict):
+            results = results.get("results", [])
+        return list(results or [])
+
+    # Batch interface used by WriteBehindMemoryTool
+    def add_many(self, contents: list[str]) -> list[str | None]:
+        """Add several memories, one concurrent request each, so every id maps back to its input.
+
+        mem0 runs LLM extraction on each add, so an id is best-effort: it is the first record
+        created for that content, or None when mem0 merged it into an existing memory.
+        """
+        if not contents:
+            return []
+        with ThreadPoolExecutor(max_workers=min(8, len(contents))) as executor:
+            return list(executor.map(self._add_one, contents))
+
+    def _add_one(self, content: str) -> str | None:
+        result = self.client.add([{"role": "user", "content": content}], user_id=self.user_id)
+        records = self._records(result)
+        return records[0].get("id") if records else None
+
+    def delete_many(self, memory_ids: list[str]) -> None:
+        self.client.batch_delete([{"memory_id": memory_id} for memory_id in memory_ids])
+
+    def search(self, query: str) -> list[dict]:
+        return self._records(
+            self.client.search(query, user_id=self.user_id, filters={"user_id": self.user_id})
+        )
+
+    def get_all(self) -> list[dict]:
+        return self._records(
+            self.client.get_all(user_id=self.user_id, filters={"user_id": self.user_id})
+        )
+
     def add_memory(self, content: str) -> str:
         """Add a new memory.
 
@@ -36,6 +75,7 @@ class Mem0Tool(Toolkit):
         result = self.client.add([{"role": "user", "content": content}], user_id=self.user_id)
         return f"Memory added: {result}"
 
+    @concurrency_safe
     def search_memory(self, query: str) -> str:
         """Search for relevant memories.
 
@@ -48,6 +88,7 @@ class Mem0Tool(Toolkit):
         results = self.client.search(query, user_id=self.user_id, filters={"user_id": self.user_id})
         return str(results)
 
+    @concurrency_safe
     def get_all_memories(self) -> str:
         """Get all stored memories for the user.
 
@@ -0,0 +1,108 @@
+"""
+大工具结果的场外存储
+
+read_file / bash 之类的工具一次可能返回几万字符，原样放进 Memory 的话，
+之后每一轮都要重新发送一遍。ResultStore 把大结果按内容哈希存到磁盘上，
+上下文里只留开头和结尾的预览，加上一个 handle；
+模型需要看完整内容时，用 read_tool_result 按 offset / limit 分页读取。
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from .toolkit import Toolkit, concurrency_safe
+
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+
+class ResultStore:
+    """
+    Args:
+        root (str | Path): 存放结果的目录，文件名就是内容的哈希，相同内容只存一份
+        max_inline_chars (int): 新的工具结果超过多少字符就放到场外
+        preview_chars (int): 预览保留开头、结尾各多少字符
+    """
+
+    def __init__(
+        self,
+        root: str | Path = ".tool_results",
+        max_inline_chars: int = 8000,
+        preview_chars: int = 500,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_inline_chars = max_inline_chars
+        self.preview_chars = preview_chars
+
+    def _path(self, handle: str) -> Path:
+        if not _HANDLE_PATTERN.match(handle):
+            raise ValueError(f"Invalid result handle: {handle}")
+        return self.root / handle[:2] / f"{handle}.txt"
+
+    def put(self, text: str) -> str:
+        """保存一段内容，返回它的 handle"""
+        handle = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        path = self._path(handle)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+        return handle
+
+    def read(self, handle: str, offset: int = 0, limit: int = 4000) -> str:
+        text = self._path(handle).read_text(encoding="utf-8")
+        offset = max(0, offset)
+        chunk = text[offset : offset + limit]
+        remaining = len(text) - offset - len(chunk)
+        if remaining > 0:
+            chunk += (
+                f"\n... [{remaining} more chars, continue with "
+                f'read_tool_result(handle="{handle}", offset={offset + len(chunk)})]'
+            )
+        return chunk
+
+    def preview(self, text: str, handle: str) -> str:
+        head = text[: self.preview_chars]
+        tail = text[-self.preview_chars :]
+        omitted = len(text) - len(head) - len(tail)
+        return (
+            f"{head}\n... [{omitted} chars omitted, full result ({len(text)} chars) stored as "
+            f'handle="{handle}"; use read_tool_result to page through it] ...\n{tail}'
+        )
+
+    def shrink(self, text: str, max_chars: int | None = None) -> str:
+        """超过 max_chars（默认 max_inline_chars）时存到场外，返回预览；否则原样返回"""
+        max_chars = self.max_inline_chars if max_chars is None else max_chars
+        if len(text) <= max(max_chars, 2 * self.preview_chars):
+            return text
+        return self.preview(text, self.put(text))
+
+
+class ResultTool(Toolkit):
+    def __init__(self, store: ResultStore | None = None, **kwargs):
+        self.store = store or ResultStore()
+        super().__init__(
+            name="ResultTool",
+            tools=[self.read_tool_result],
+            **kwargs,
+        )
+
+    @concurrency_safe
+    def read_tool_result(self, handle: str, offset: int = 0, limit: int = 4000) -> str:
+        """
+        Read a large tool result that was stored out of context.
+        Only a preview of such results is kept in the conversation; use the handle from the preview
+        to page through the full text.
+
+        Args:
+            handle (str): The handle shown in the preview.
+            offset (int): Character offset to start reading from.
+            limit (int): Maximum number of characters to return.
+        """
+        try:
+            return self.store.read(handle, offset, limit)
+        except Exception as e:
+            return f"Error: {e}"
@@ -0,0 +1,220 @@
+"""
+长期运行的 shell 会话
+
+FileTool.bash 原来每条命令都新开一个 subprocess.run(shell=True)，
+等命令结束后把全部 stdout / stderr 读进内存再截断，输出巨大的命令可能先把内存耗尽。
+
+ShellSession 为每个 FileTool 保留一个 bash 进程，命令之间 cwd 和环境变量保持不变；
+输出按块增量读取，超过上限后只计数、不再缓存，每一块还可以通过回调实时转发出去。
+"""
+
+import codecs
+import os
+import selectors
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Callable
+
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+class ShellSession:
+    """
+    Args:
+        cwd (str | Path): shell 启动时的工作目录
+        max_chars (int): 每条命令最多保留多少字符的输出，超出的部分丢弃
+        chunk_size (int): 每次从管道读取的字节数
+    """
+
+    def __init__(self, cwd: str | Path, max_chars: int = 50000, chunk_size: int = 64 * 1024):
+        self.cwd = Path(cwd)
+        self.max_chars = max_chars
+        self.chunk_size = chunk_size
+        self._proc: subprocess.Popen | None = None
+        self._finalizer: weakref.finalize | None = None
+        # 上一条命令结束之后才到达的输出（通常来自后台任务），下一条命令开头单独标出来
+        self._leftover = b""
+        # 同一个 shell 同时只能执行一条命令
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self._proc is not None and self._proc.poll() is None:
+            return self._proc
+        shell = shutil.which("bash") or "/bin/sh"
+        self._proc = subprocess.Popen(
+            [shell],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd,
+            bufsize=0,
+            # 独立的进程组，超时时连同命令启动的子进程一起结束
+            start_new_session=True,
+        )
+        self._finalizer = weakref.finalize(self, _kill_process_group, self._proc)
+        return self._proc
+
+    def close(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        if self._finalizer is not None:
+            # 结束进程组并关闭管道
+            self._finalizer()
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+        self._proc = None
+        self._finalizer = None
+        self._leftover = b""
+
+    def run(
+        self,
+        command: str,
+        timeout: float = 300,
+        on_output: Callable[[str], None] | None = None,
+    ) -> tuple[str, int | None]:
+        """
+        在会话里执行一条命令，返回 (输出, 退出码)。
+        超时时退出码为 None；shell 本身退出（例如命令里有 exit）时返回 shell 的退出状态。
+        这两种情况下一条命令都会启动新的 shell。
+
+        后台任务（cmd &）和 shell 共用输出管道，两条命令之间到达的输出
+        会放在下一条命令输出的开头，并用 [background output] 标出来。
+
+        Args:
+            command (str): 要执行的命令
+            timeout (float): 超时秒数
+            on_output (Callable[[str], None] | None): 每读到一块输出就调用一次（超出上限的部分不再转发）
+        """
+        with self._lock:
+            proc = self._ensure_started()
+            leftover = self._drain(proc)
+            if proc.poll() is not None:
+                # shell 在两条命令之间退出了（例如被后台任务结束），换一个新的
+                self._reset()
+                proc = self._ensure_started()
+            marker = f"__LEARN_AGENT_DONE_{uuid.uuid4().hex}__"
+            # eval 让语法错误只影响这一条命令；stdin 指向 /dev/null，命令不会读走后面的脚本
+            script = (
+                f"eval {shlex.quote(command)} < /dev/null 2>&1\n"
+                f"printf '%s:%s\\n' {marker} \"$?\"\n"
+            )
+            try:
+                proc.stdin.write(script.encode("utf-8"))
+                proc.stdin.flush()
+            except BrokenPipeError:
+                self._reset()
+                return "Error: shell session exited unexpectedly, please retry.", None
+            return self._collect(
+                proc, marker.encode(), leftover, time.monotonic() + timeout, timeout, on_output
+            )
+
+    def _drain(self, proc: subprocess.Popen) -> bytes:
+        """取出管道里已经到达、不属于任何命令的输出，不等待"""
+        data, self._leftover = self._leftover, b""
+        fd = proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while selector.select(0):
+                chunk = os.read(fd, self.chunk_size)
+                if not chunk:
+                    break
+                data += chunk
+        return data
+
+    def _collect(
+        self,
+        proc: subprocess.Popen,
+        marker: bytes,
+        leftover: bytes,
+        deadline: float,
+        timeout: float,
+        on_output: Callable[[str], None] | None,
+    ) -> tuple[str, int | None]:
+        fd = proc.stdout.fileno()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        kept: list[str] = []
+        kept_chars = 0
+        dropped = 0
+
+        def emit(data: bytes, final: bool = False) -> None:
+            nonlocal kept_chars, dropped
+            text = decoder.decode(data, final)
+            if not text:
+                return
+            room = self.max_chars - kept_chars
+            if room <= 0:
+                dropped += len(text)
+                return
+            if len(text) > room:
+                dropped += len(text) - room
+                text = text[:room]
+            kept.append(text)
+            kept_chars += len(text)
+            if on_output is not None:
+                on_output(text)
+
+        def result(suffix: str = "") -> str:
+            output = "".join(kept)
+            if dropped:
+                output += f"\n... [output truncated, {dropped} more chars]"
+            return output + suffix
+
+        if leftover:
+            if not leftover.endswith(b"\n"):
+                leftover += b"\n"
+            emit(b"[background output]\n" + leftover + b"[end of background output]\n", final=True)
+
+        # 末尾可能是标记的前半截，先留着不输出
+        pending = b""
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reset()
+                    emit(pending, final=True)
+                    return result(f"\nCommand timed out after {timeout}s; shell session restarted."), None
+                if not selector.select(min(remaining, 0.5)):
+                    if proc.poll() is None:
+                        continue
+                    # shell 已经退出，但后台任务还占着管道，读不到 EOF
+                    chunk = b""
+                else:
+                    chunk = os.read(fd, self.chunk_size)
+                if not chunk:
+                    # shell 自己退出了
+                    code = proc.wait()
+                    self._reset()
+                    emit(pending, final=True)
+                    return result("\nShell exited; a new session will be started."), code
+
+                pending += chunk
+                found = pending.find(marker)
+                if found != -1 and pending.find(b"\n", found) != -1:
+                    end = pending.index(b"\n", found)
+                    status = pending[found + len(marker) + 1 : end]
+                    # 标记之后的内容已经不属于这条命令
+                    self._leftover = pending[end + 1 :]
+                    emit(pending[:found], final=True)
+                    return result(), int(status)
+                if found == -1 and len(pending) > len(marker):
+                    cut = len(pending) - len(marker)
+                    emit(pending[:cut])
+                    pending = pending[cut:]
@@ -1,5 +1,5 @@
 from pathlib import Path
-from learn_agent.tool.toolkit import Toolkit
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe, memoize
 import re
 
 
@@ -13,6 +13,8 @@ class SkillTool(Toolkit):
             tools=[self.list_skills, self.run_skill],
         )
 
+    @concurrency_safe
+    @memoize(ttl=300)
     def run_skill(self, skill_name: str) -> str:
         """
         Load a skill to gain specialized knowledge for a task.
@@ -149,6 +151,8 @@ class SkillTool(Toolkit):
 
         return content
 
+    @concurrency_safe
+    @memoize(ttl=300)
     def list_skills(self) -> list:
         """Return list of available skill names."""
         return list(self.skills.keys())
@@ -1,7 +1,7 @@
-from learn_agent.tool.toolkit import Toolkit
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe
 from pydantic import BaseModel
 from learn_agent.memory import Memory
-from learn_agent.llm import DeepSeek
+from learn_agent.llm import ChatModel, DeepSeek
 import time
 from pathlib import Path
 
@@ -18,10 +18,13 @@ class SubAgentTool(Toolkit):
         self,
         agent_type: dict,
         work_dir: Path = Path.cwd(),
+        llm: ChatModel | None = None,
         **kwargs,
     ):
         self.agent_type = agent_type
         self.work_dir = work_dir
+        # 子代理使用的模型，可以传 LLMPool；不传则每个任务新建一个 DeepSeek
+        self.llm = llm
 
         super().__init__(
             name="SubAgentTool",
@@ -50,6 +53,8 @@ class SubAgentTool(Toolkit):
         This gives visibility without polluting the main conversation.
         """
 
+    # 每次委派都用 fork 出来的工具包，同一类型的委派也可以并行
+    @concurrency_safe
     def delegate_task(self, description: str, prompt: str, agent_type: str) -> str:
         """
          Spawn a subagent for a focused subtask.
@@ -76,15 +81,25 @@ class SubAgentTool(Toolkit):
         sub_system_prompt = f"""you are a {agent_type} subagent. at {self.work_dir.absolute()}
             {config["system_prompt"]}
         """
+        # 每次运行用自己的一份有状态工具包（shell 会话、todo 列表）：
+        # 上一个任务的 cd / export 不会带进来，并行的委派之间也互不影响
+        tools = config.get("tools") or []
+        tools = [tools] if isinstance(tools, Toolkit) else list(tools)
+        forked = [toolkit.fork() for toolkit in tools]
         sub_agent = ClaudeCodeAgent(
             session_id="subagent_session",
             name=f"subagent_{agent_type}",
             system_prompt=sub_system_prompt,
-            llm=DeepSeek(model="deepseek-chat"),
-            tools=config.get("tools"),
+            llm=self.llm or DeepSeek(model="deepseek-chat"),
+            tools=forked,
             memory=Memory(),
         )
-        res = sub_agent.run(prompt)
+        try:
+            res = sub_agent.run(prompt)
+        finally:
+            for toolkit, original in zip(forked, tools):
+                if toolkit is not original:
+                    toolkit.close()
 
         end_time = time.time()
         duration = end_time - start_time
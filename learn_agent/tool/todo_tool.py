@@ -17,6 +17,10 @@ class TodoTool(Toolkit):
         )
         self.todos = []
 
+    def fork(self) -> "TodoTool":
+        # 每次运行各有自己的 todo 列表
+        return TodoTool(include_tools=self.tool_names())
+
     def update_todos(self, items: list[Todo]) -> str:
         """
         Validate and update the todo list.
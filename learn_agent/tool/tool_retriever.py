@@ -0,0 +1,84 @@
+"""
+按相关性挑选每一轮要发送的工具 schema
+
+挂载的工具包多了以后，把所有工具的 schema（包括很长的 docstring）每一轮都发给模型，
+要占掉几千个 prompt token。ToolRetriever 用 BM25 给每个工具的名字、描述和参数说明建索引，
+每一轮只发送和当前问题最相关的 top-k 个工具，加上始终需要的核心工具。
+"""
+
+import math
+import re
+from collections import Counter
+
+# 英文按单词切分（snake_case / camelCase 拆开），中文按单字和相邻两字切分
+_WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+|[\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for word in _WORD_PATTERN.findall(text):
+        if _CJK_PATTERN.fullmatch(word):
+            tokens.extend(word)
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _schema_text(schema: dict) -> str:
+    function = schema.get("function", schema)
+    parts = [function.get("name", ""), function.get("description", "")]
+    for name, prop in function.get("parameters", {}).get("properties", {}).items():
+        parts.append(name)
+        parts.append(prop.get("description", ""))
+    return " ".join(parts)
+
+
+class ToolRetriever:
+    """
+    工具 schema 的 BM25 索引
+
+    Args:
+        schemas (list[dict]): OpenAI tools schema 列表
+        k1 (float): BM25 词频饱和参数
+        b (float): BM25 文档长度归一化参数
+    """
+
+    def __init__(self, schemas: list[dict] | None = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.index(schemas or [])
+
+    def index(self, schemas: list[dict]) -> None:
+        self.names: list[str] = [s.get("function", s)["name"] for s in schemas]
+        self._term_freqs: list[Counter] = [Counter(tokenize(_schema_text(s))) for s in schemas]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(schemas)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+
+    def scores(self, query: str) -> dict[str, float]:
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        result = {}
+        for name, tf, length in zip(self.names, self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1.0))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            result[name] = score
+        return result
+
+    def select(self, query: str, top_k: int) -> list[str]:
+        """返回和 query 最相关的最多 top_k 个工具名（得分为 0 的不返回）"""
+        scores = self.scores(query)
+        ranked = sorted((name for name in self.names if scores[name] > 0), key=lambda n: -scores[n])
+        return ranked[:top_k]
@@ -1,5 +1,20 @@
-from typing import Any, Callable
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Iterator, get_type_hints
+import asyncio
+import contextvars
+import functools
 import inspect
+import logging
+import threading
+import time
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, create_model
+from pydantic_core import to_jsonable_python
+from learn_agent.message import SchemaList, dumps
+from learn_agent.token_counter import TokenCounter, default_counter
+
+logger = logging.getLogger(__name__)
 
 
 def _parse_param_descriptions(doc: str | None) -> dict[str, str]:
@@ -63,42 +78,129 @@ def _parse_param_descriptions(doc: str | None) -> dict[str, str]:
     return result
 
 
-def _py_type_to_json_type(t: Any) -> str:
-    # 极简映射：够用即可（你后面可以扩展）对应 OpenAI tools schema 里的数据类型
-    if t in (int,):
-        return "integer"
-    if t in (float,):
-        return "number"
-    if t in (bool,):
-        return "boolean"
-    if t in (str,):
-        return "string"
-    return "string"
+class ToolArgumentError(ValueError):
+    """工具参数校验失败，errors 是结构化的错误列表，原样回填给模型方便它修正"""
+
+    def __init__(self, tool_name: str, errors: list[dict]):
+        self.tool_name = tool_name
+        self.errors = errors
+        summary = "; ".join(f"{e['loc']}: {e['msg']}" for e in errors)
+        super().__init__(f"Invalid arguments for {tool_name}: {summary}")
+
+
+def _inline_refs(schema: Any, defs: dict, seen: frozenset = frozenset()) -> Any:
+    # 把 $ref 展开成具体定义（不少模型服务不支持 $ref），顺便去掉冗余的 title
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if ref is not None:
+            name = ref.rsplit("/", 1)[-1]
+            if name in seen or name not in defs:
+                # 递归类型无法展开，退化成 object
+                return {"type": "object"}
+            return _inline_refs(defs[name], defs, seen | {name})
+        return {
+            k: _inline_refs(v, defs, seen)
+            for k, v in schema.items()
+            if k not in ("title", "$defs")
+        }
+    if isinstance(schema, list):
+        return [_inline_refs(v, defs, seen) for v in schema]
+    return schema
+
+
+def type_to_json_schema(t: Any) -> dict:
+    """
+    把 Python 类型注解转成 JSON Schema：
+    支持 int / float / bool / str、Optional、Union、list、dict、Literal、pydantic 模型等，
+    pydantic 无法处理的类型退化成 string
+    """
+    try:
+        schema = TypeAdapter(t).json_schema()
+    except Exception:
+        return {"type": "string"}
+    return _inline_refs(schema, schema.get("$defs", {}))
+
+
+def _tool_parameters(fn: Callable[..., Any]) -> list[tuple[str, Any, Any]]:
+    # [(参数名, 类型注解, 默认值)]，没有注解的参数类型为 inspect.Parameter.empty
+    try:
+        hints = get_type_hints(fn)
+    except Exception:
+        hints = {}
+    params = []
+    for name, p in inspect.signature(fn).parameters.items():
+        if name == "self" or p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+            continue
+        params.append((name, hints.get(name, p.empty), p.default))
+    return params
+
+
+def build_arg_validator(fn: Callable[..., Any]) -> type[BaseModel] | None:
+    """
+    根据函数签名生成参数校验模型，工具注册时编译一次。
+    校验会把 JSON 转成注解里的类型（例如 list[Todo] 里的每一项变成 Todo 实例），
+    并拒绝多余的参数；没有注解的参数接受任意值。
+    签名里有 pydantic 无法处理的类型时返回 None（不做校验）。
+    """
+    fn_name = getattr(fn, "__name__", fn.__class__.__name__)
+    fields = {
+        name: (
+            Any if ann is inspect.Parameter.empty else ann,
+            ... if default is inspect.Parameter.empty else default,
+        )
+        for name, ann, default in _tool_parameters(fn)
+    }
+    try:
+        return create_model(
+            f"{fn_name}_arguments",
+            __config__=ConfigDict(extra="forbid", arbitrary_types_allowed=True),
+            **fields,
+        )
+    except Exception:
+        return None
+
+
+def validate_arguments(
+    tool_name: str, validator: type[BaseModel] | None, kwargs: dict
+) -> dict:
+    if validator is None:
+        return kwargs
+    try:
+        validated = validator.model_validate(kwargs)
+    except ValidationError as e:
+        raise ToolArgumentError(
+            tool_name,
+            [
+                {
+                    "loc": ".".join(str(part) for part in err["loc"]) or "(arguments)",
+                    "msg": err["msg"],
+                    "type": err["type"],
+                }
+                for err in e.errors(include_url=False, include_input=False)
+            ],
+        ) from None
+    # 只传入调用方给出的参数，其余沿用函数自己的默认值
+    return {name: getattr(validated, name) for name in validated.model_fields_set}
 
 
 def function_to_tool_schema(fn: Callable[..., Any]) -> dict:
     """
-    把一个 Python 函数转成 OpenAI tools function schema（最小版）
-    - 参数从签名拿
+    把一个 Python 函数转成 OpenAI tools function schema
+    - 参数和类型从签名拿，类型用 type_to_json_schema 转换
     - description 用 docstring
     """
     doc = inspect.getdoc(fn) or ""
     param_descs = _parse_param_descriptions(doc)
 
-    sig = inspect.signature(fn)
     props: dict[str, Any] = {}
     required: list[str] = []
 
-    for name, p in sig.parameters.items():
-        if name == "self":
-            continue
-        ann = p.annotation if p.annotation is not inspect._empty else str
-        json_type = _py_type_to_json_type(
-            ann if ann in (int, float, bool, str) else str
-        )
-        props[name] = {"type": json_type, "description": param_descs.get(name, "")}
+    for name, ann, default in _tool_parameters(fn):
+        # 没有注解的参数在 schema 里按 string 描述
+        schema = type_to_json_schema(str if ann is inspect.Parameter.empty else ann)
+        props[name] = {**schema, "description": param_descs.get(name, "")}
 
-        if p.default is inspect._empty:
+        if default is inspect.Parameter.empty:
             required.append(name)
 
     fn_name = getattr(fn, "__name__", fn.__class__.__name__)
@@ -117,6 +219,159 @@ def function_to_tool_schema(fn: Callable[..., Any]) -> dict:
     }
 
 
+def concurrency_safe(fn: Callable) -> Callable:
+    """
+    标记工具可以和同一轮里的其他工具并行执行（只读、或者自己保证了线程安全）。
+    没有标记的工具默认不安全：它会等前面的工具都执行完再单独执行，后面的工具也要等它。
+    """
+    fn.__concurrency_safe__ = True
+    return fn
+
+
+# 正在执行的工具的进度回调，由 Agent 在执行工具前设置
+_progress_sink: ContextVar[Callable[[dict], None] | None] = ContextVar("tool_progress_sink", default=None)
+
+
+@contextmanager
+def tool_progress(sink: Callable[[dict], None] | None) -> Iterator[None]:
+    """在这个上下文里执行的工具调用 report_progress 时，事件交给 sink"""
+    token = _progress_sink.set(sink)
+    try:
+        yield
+    finally:
+        _progress_sink.reset(token)
+
+
+def report_progress(event: dict) -> None:
+    """
+    工具执行过程中上报进度（例如命令的输出片段），run_stream 会在工具结束前转发出去。
+    没有调用方在监听时什么也不做。
+    """
+    sink = _progress_sink.get()
+    if sink is not None:
+        sink(event)
+
+
+def memoize(
+    ttl: float | None = None,
+    fingerprint: Callable[..., Hashable] | None = None,
+) -> Callable[[Callable], Callable]:
+    """
+    标记工具的结果可以缓存：同一个工具、相同参数（校验、规范化之后）的调用直接返回上次的结果。
+    只适合没有副作用的工具。
+
+    Args:
+        ttl (float | None): 缓存多少秒后过期，None 表示不按时间过期
+        fingerprint (Callable | None): fingerprint(owner, **kwargs) 返回结果依赖的外部状态，
+            owner 是工具方法绑定的对象（普通函数则是所在的工具包）
+            （例如文件的 mtime / size），和缓存时不一致就视为失效
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        fn.__memoize__ = (ttl, fingerprint)
+        return fn
+
+    return decorator
+
+
+class _CacheEntry:
+    __slots__ = ("tool_name", "kwargs", "result", "fingerprint", "expires_at")
+
+    def __init__(self, tool_name, kwargs, result, fingerprint, expires_at):
+        self.tool_name = tool_name
+        self.kwargs = kwargs
+        self.result = result
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+
+
+class ToolCache:
+    """
+    工具结果的 LRU 缓存，线程安全（并行执行的工具会同时读写）
+
+    Args:
+        max_entries (int): 最多缓存多少条结果，超过后淘汰最久没用到的
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(tool_name: str, kwargs: dict) -> tuple[str, str]:
+        # 参数规范化成排好序的 JSON，pydantic 模型等也能参与比较
+        return tool_name, dumps(to_jsonable_python(kwargs, fallback=str))
+
+    def get(self, key: tuple[str, str], fingerprint: Hashable = None) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expired = entry.expires_at is not None and time.monotonic() >= entry.expires_at
+                if expired or entry.fingerprint != fingerprint:
+                    del self._entries[key]
+                    self.invalidations += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.result
+
+    def set(
+        self,
+        key: tuple[str, str],
+        kwargs: dict,
+        result: Any,
+        fingerprint: Hashable = None,
+        ttl: float | None = None,
+    ) -> None:
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = _CacheEntry(key[0], kwargs, result, fingerprint, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(
+        self, tool_name: str | None = None, where: Callable[[dict], bool] | None = None
+    ) -> int:
+        """删除某个工具（且参数满足 where）的缓存，返回删除的条数"""
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if (tool_name is None or entry.tool_name == tool_name)
+                and (where is None or where(entry.kwargs))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
 # 通过继承 Toolkit 来实现自己定制的具体的工具包，可以添加自己的参数和方法
 
 
@@ -129,6 +384,16 @@ class Toolkit:
     ):
         self.name = name or self.__class__.__name__
         self._tools: dict[str, Callable] = {}
+        # 每个工具的参数校验模型，注册时编译好
+        self._validators: dict[str, type[BaseModel] | None] = {}
+        # schema 生成要做 inspect.signature 和 docstring 解析，算一次缓存起来
+        self._schemas: SchemaList | None = None
+        # 按 TokenCounter 缓存 schema 的 token 数
+        self._schema_tokens: dict[TokenCounter, int] = {}
+        # 工具集合每变化一次加一，Agent 据此判断自己的索引是否过期
+        self.version = 0
+        # 用 @memoize 标记的工具的结果缓存
+        self.tool_cache = ToolCache(max_entries=kwargs.get("cache_entries", 256))
         include_tools = kwargs.get("include_tools")
         include_set = set(include_tools) if include_tools else None
         if tools:
@@ -136,6 +401,19 @@ class Toolkit:
                 fn_name = getattr(fn, "__name__", fn.__class__.__name__)
                 if include_set is None or fn_name in include_set:
                     self._tools[fn_name] = fn
+                    self._validators[fn_name] = build_arg_validator(fn)
+
+    def add_tool(self, fn: Callable) -> None:
+        """添加（或替换同名）工具，缓存的 schema 随之失效"""
+        fn_name = getattr(fn, "__name__", fn.__class__.__name__)
+        self._tools[fn_name] = fn
+        self._validators[fn_name] = build_arg_validator(fn)
+        self._schemas = None
+        self._schema_tokens.clear()
+        self.version += 1
+
+    def tool_names(self) -> list[str]:
+        return list(self._tools)
 
     @staticmethod
     def _normalize_tool_spec(tool_spec) -> tuple[set[str], set[str]]:
@@ -165,19 +443,100 @@ class Toolkit:
             }
         if selected is self._tools:
             return self
-        return Toolkit(name=self.name, tools=list(selected.values()))
+        toolkit = Toolkit(name=self.name, tools=list(selected.values()))
+        # 共用结果缓存，原工具包写文件等操作的失效对挑选出的工具包同样生效
+        toolkit.tool_cache = self.tool_cache
+        return toolkit
+
+    def list_tools_schemas(self) -> SchemaList:
+        # 把工具函数统一转换为 OpenAI tools schema，结果缓存，调用方不要修改
+        if self._schemas is None:
+            self._schemas = SchemaList(function_to_tool_schema(fn) for fn in self._tools.values())
+        return self._schemas
 
-    def list_tools_schemas(self) -> list[dict]:
-        # 把工具函数统一转换为 OpenAI tools schema
-        return [function_to_tool_schema(fn) for fn in self._tools.values()]
+    def count_schema_tokens(self, counter: TokenCounter | None = None) -> int:
+        # schema 只在 add_tool 时变化，算一次就够了
+        counter = counter or default_counter
+        if counter not in self._schema_tokens:
+            self._schema_tokens[counter] = counter.count_tools(self.list_tools_schemas())
+        return self._schema_tokens[counter]
+
+    def fork(self) -> "Toolkit":
+        """
+        给另一次 agent 运行（例如并行的子代理）用的工具包。
+        默认工具包没有跟某次运行绑定的状态，直接共用同一个；
+        有这类状态的工具包（shell 会话、todo 列表）覆盖它，返回独立的副本
+        """
+        return self
+
+    def close(self) -> None:
+        """释放工具包持有的资源（例如 shell 进程），默认什么也不做"""
 
     def has(self, tool_name: str) -> bool:
         return tool_name in self._tools
 
+    def is_concurrency_safe(self, tool_name: str) -> bool:
+        return getattr(self._tools.get(tool_name), "__concurrency_safe__", False)
+
     def call(self, tool_name: str, **kwargs) -> Any:
         print(f"Calling tool {tool_name} with args {kwargs}")
         # 调用具体的工具函数
         if not self.has(tool_name):
             raise ValueError(f"Tool {tool_name} not found in toolkit {self.name}")
         fn = self._tools[tool_name]
-        return fn(**kwargs)
+        kwargs = validate_arguments(tool_name, self._validators.get(tool_name), kwargs)
+        spec = getattr(fn, "__memoize__", None)
+        if spec is None:
+            return fn(**kwargs)
+
+        key, fingerprint = self._cache_lookup_key(tool_name, spec, kwargs)
+        hit, result = self.tool_cache.get(key, fingerprint)
+        if not hit:
+            result = fn(**kwargs)
+            self.tool_cache.set(key, kwargs, result, fingerprint, ttl=spec[0])
+        return result
+
+    def _cache_lookup_key(
+        self, tool_name: str, spec: tuple, kwargs: dict
+    ) -> tuple[tuple[str, str], Hashable]:
+        fingerprint_fn = spec[1]
+        fn = self._tools[tool_name]
+        # select_tools 挑出来的方法仍然绑定在原来的工具包上，指纹要用它来算
+        owner = getattr(fn, "__self__", self)
+        fingerprint = fingerprint_fn(owner, **kwargs) if fingerprint_fn is not None else None
+        # 补上默认值，显式传默认值和不传是同一次调用
+        bound = inspect.signature(fn).bind_partial(**kwargs)
+        bound.apply_defaults()
+        return ToolCache.make_key(tool_name, bound.arguments), fingerprint
+
+    async def acall(self, tool_name: str, **kwargs) -> Any:
+        """
+        异步调用工具：async def 的工具直接 await，
+        普通函数放到线程池里执行，不阻塞事件循环
+        """
+        logger.debug("Calling tool %s with args %s", tool_name, kwargs)
+        if not self.has(tool_name):
+            raise ValueError(f"Tool {tool_name} not found in toolkit {self.name}")
+        fn = self._tools[tool_name]
+        kwargs = validate_arguments(tool_name, self._validators.get(tool_name), kwargs)
+        spec = getattr(fn, "__memoize__", None)
+        if spec is not None:
+            key, fingerprint = self._cache_lookup_key(tool_name, spec, kwargs)
+            hit, result = self.tool_cache.get(key, fingerprint)
+            if hit:
+                return result
+
+        if inspect.iscoroutinefunction(fn):
+            result = await fn(**kwargs)
+        else:
+            # 复制当前上下文，工具在线程池里也能 report_progress
+            ctx = contextvars.copy_context()
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(ctx.run, fn, **kwargs)
+            )
+            if inspect.isawaitable(result):
+                result = await result
+
+        if spec is not None:
+            self.tool_cache.set(key, kwargs, result, fingerprint, ttl=spec[0])
+        return result
@@ -1,4 +1,4 @@
-from .toolkit import Toolkit
+from .toolkit import Toolkit, concurrency_safe, memoize
 
 
 class WeatherTool(Toolkit):
@@ -9,6 +9,8 @@ class WeatherTool(Toolkit):
             **kwargs,
         )
 
+    @concurrency_safe
+    @memoize(ttl=600)
     def get_temperature(self, num: int | None = 2) -> list[dict[str, float]]:
         """
         获取几天的温度
@@ -20,6 +22,8 @@ class WeatherTool(Toolkit):
         """
         return [{"2024-01-01": 25.0}, {"2024-01-02": 26.5}]  # 示例数据
 
+    @concurrency_safe
+    @memoize(ttl=600)
     def get_humidity(self, num: int | None = 2) -> list[dict[str, float]]:
         """
         获取几天的湿度
@@ -0,0 +1,315 @@
+"""
+工作目录的增量索引，给 FileTool 的 grep / glob 用
+
+模型大部分搜索原来都走 bash("grep -r ...") / find：每次都要 fork 一个 shell，
+再把整个 work_dir 重新扫一遍。WorkspaceIndex 在进程内维护：
+
+- 文件列表和每个文件的 (mtime, size)，刷新时只重新读取变化了的文件
+- 每个文本文件内容（转小写后）的 trigram 集合，存成排好序的 uint32 数组
+
+搜索时先从字面量 / 正则里提取必须出现的 trigram，排除不可能匹配的文件，
+只在剩下的候选文件里逐行匹配；同一个查询的结果按索引版本缓存，翻页时直接复用。
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+
+try:
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore[no-redef]
+
+IGNORED_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    "venv",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".sessions",
+    ".tool_results",
+    ".local_memory",
+}
+
+_EMPTY = np.empty(0, dtype=np.uint32)
+
+
+def trigram_codes(data: bytes) -> np.ndarray:
+    """data 里所有 trigram（3 个字节拼成一个 uint32），去重并排序"""
+    if len(data) < 3:
+        return _EMPTY
+    b = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+
+
+def _literal_runs(parsed) -> list[str]:
+    # 只看顶层的顺序结构：连续的 LITERAL 组成一段必须出现的字面量，
+    # 遇到分支、重复、字符集之类的节点就断开
+    runs: list[str] = []
+    current: list[str] = []
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(arg))
+            continue
+        if op is sre_parse.SUBPATTERN and arg[-1] is not None:
+            # 普通分组 (...)：内部的字面量同样必须出现
+            if current:
+                runs.append("".join(current))
+                current = []
+            runs.extend(_literal_runs(arg[-1]))
+            continue
+        if op is sre_parse.AT:
+            continue
+        if current:
+            runs.append("".join(current))
+            current = []
+    if current:
+        runs.append("".join(current))
+    return runs
+
+
+def required_trigrams(pattern: str, literal: bool, ignore_case: bool) -> np.ndarray:
+    """匹配 pattern 的文本里一定包含的 trigram（转小写后），提取不出来时返回空数组"""
+    if literal:
+        runs = [pattern]
+    else:
+        try:
+            parsed = sre_parse.parse(pattern)
+        except Exception:
+            return _EMPTY
+        # 顶层有 | 分支时任何一段字面量都不是必须的
+        if any(op is sre_parse.BRANCH for op, _ in parsed):
+            return _EMPTY
+        runs = _literal_runs(parsed)
+
+    codes = []
+    for run in runs:
+        data = run.encode("utf-8").lower()
+        if ignore_case and not data.isascii():
+            # 非 ASCII 字符忽略大小写时字节不一定相同，只用纯 ASCII 的片段；
+            # 各片段分别取 trigram，不能拼起来，否则会产生跨过非 ASCII 字符的 trigram
+            codes.extend(trigram_codes(frag) for frag in re.findall(rb"[\x00-\x7f]{3,}", data))
+            continue
+        codes.append(trigram_codes(data))
+    return np.unique(np.concatenate(codes)) if codes else _EMPTY
+
+
+class _FileEntry:
+    __slots__ = ("mtime_ns", "size", "trigrams")
+
+    def __init__(self, mtime_ns: int, size: int, trigrams: np.ndarray | None):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # None 表示不参与内容搜索（二进制或过大的文件）
+        self.trigrams = trigrams
+
+
+class WorkspaceIndex:
+    """
+    Args:
+        root (str | Path): 要索引的目录
+        max_file_bytes (int): 超过这个大小的文件只出现在文件列表里，不参与 grep
+        refresh_interval (float): 两次全量检查 mtime 之间至少间隔多少秒；
+            FileTool 自己写文件时会立即更新对应的条目，bash 执行后会要求下次搜索前重新检查
+        max_matches (int): 一次查询最多收集多少条匹配
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        max_file_bytes: int = 2 * 1024 * 1024,
+        refresh_interval: float = 2.0,
+        max_matches: int = 5000,
+    ):
+        self.root = Path(root)
+        self.max_file_bytes = max_file_bytes
+        self.refresh_interval = refresh_interval
+        self.max_matches = max_matches
+        self._files: dict[str, _FileEntry] = {}
+        # 文件集合或内容每变化一次加一，查询结果缓存据此判断是否过期
+        self.generation = 0
+        self._refreshed_at: float | None = None
+        self._lock = threading.RLock()
+        self._results: OrderedDict[tuple, tuple[int, list]] = OrderedDict()
+
+    def _walk(self, directory: str, rel: str, seen: dict[str, os.stat_result]) -> None:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            name = f"{rel}{entry.name}"
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_DIRS:
+                        self._walk(entry.path, f"{name}/", seen)
+                elif entry.is_file():
+                    seen[name] = entry.stat()
+            except OSError:
+                continue
+
+    def _load(self, rel: str, stat: os.stat_result) -> _FileEntry:
+        trigrams = None
+        if stat.st_size <= self.max_file_bytes:
+            try:
+                data = (self.root / rel).read_bytes()
+            except OSError:
+                data = b"\0"
+            if b"\0" not in data[:8192]:
+                trigrams = trigram_codes(data.lower())
+        return _FileEntry(stat.st_mtime_ns, stat.st_size, trigrams)
+
+    def refresh(self, force: bool = False) -> None:
+        """重新检查文件列表，只重新读取新增和 mtime / size 变化了的文件"""
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._refreshed_at is not None
+                and now - self._refreshed_at < self.refresh_interval
+            ):
+                return
+            seen: dict[str, os.stat_result] = {}
+            self._walk(str(self.root), "", seen)
+            changed = len(seen) != len(self._files)
+            for rel in list(self._files):
+                if rel not in seen:
+                    del self._files[rel]
+                    changed = True
+            for rel, stat in seen.items():
+                entry = self._files.get(rel)
+                if entry is None or (entry.mtime_ns, entry.size) != (stat.st_mtime_ns, stat.st_size):
+                    self._files[rel] = self._load(rel, stat)
+                    changed = True
+            if changed:
+                self.generation += 1
+            self._refreshed_at = time.monotonic()
+
+    def mark_stale(self) -> None:
+        """下次查询前强制全量检查（例如执行过可能改动任何文件的 bash 命令）"""
+        with self._lock:
+            self._refreshed_at = None
+
+    def update_file(self, path: str | Path) -> None:
+        """立即更新一个文件的条目（FileTool 写文件之后调用）"""
+        with self._lock:
+            if self._refreshed_at is None:
+                # 还没建立索引，第一次查询时会全量建立
+                return
+            try:
+                rel = Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+            except ValueError:
+                return
+            try:
+                stat = os.stat(self.root / rel)
+            except OSError:
+                if self._files.pop(rel, None) is not None:
+                    self.generation += 1
+                return
+            self._files[rel] = self._load(rel, stat)
+            self.generation += 1
+
+    def files(self, prefix: str = "") -> list[str]:
+        """所有文件的相对路径（posix 风格，已排序），prefix 限定子目录"""
+        self.refresh()
+        with self._lock:
+            names = list(self._files)
+        if prefix:
+            names = [n for n in names if n.startswith(prefix)]
+        return sorted(names)
+
+    def glob(self, pattern: str, prefix: str = "") -> list[str]:
+        """按 glob 模式（支持 **）匹配相对于 prefix 目录的路径"""
+        matched = []
+        for name in self.files(prefix):
+            if PurePosixPath(name[len(prefix) :]).full_match(pattern):
+                matched.append(name)
+        return matched
+
+    def large_files(self, prefix: str = "", glob: str | None = None) -> list[str]:
+        """超过 max_file_bytes、不参与 grep 的文件（已排序）"""
+        self.refresh()
+        with self._lock:
+            names = [n for n, e in self._files.items() if e.size > self.max_file_bytes]
+        return sorted(
+            n
+            for n in names
+            if n.startswith(prefix) and (not glob or PurePosixPath(n[len(prefix) :]).full_match(glob))
+        )
+
+    def _candidates(self, required: np.ndarray, prefix: str) -> list[str]:
+        with self._lock:
+            items = [(n, e.trigrams) for n, e in self._files.items() if e.trigrams is not None]
+        result = []
+        for name, trigrams in items:
+            if prefix and not name.startswith(prefix):
+                continue
+            if len(required):
+                if len(trigrams) == 0:
+                    continue
+                pos = np.searchsorted(trigrams, required)
+                if pos.max() >= len(trigrams) or not np.array_equal(trigrams[pos], required):
+                    continue
+            result.append(name)
+        result.sort()
+        return result
+
+    def grep(
+        self,
+        pattern: str,
+        prefix: str = "",
+        glob: str | None = None,
+        ignore_case: bool = False,
+        literal: bool = False,
+    ) -> tuple[list[tuple[str, int, str]], bool]:
+        """
+        搜索文件内容，返回 ([(相对路径, 行号, 行内容)], 是否因为达到 max_matches 而截断)
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        regex = re.compile(re.escape(pattern) if literal else pattern, flags)
+        self.refresh()
+        key = (pattern, prefix, glob, ignore_case, literal)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == self.generation:
+                self._results.move_to_end(key)
+                return cached[1]
+            generation = self.generation
+
+        required = required_trigrams(pattern, literal, ignore_case)
+        matches: list[tuple[str, int, str]] = []
+        truncated = False
+        for name in self._candidates(required, prefix):
+            if glob and not PurePosixPath(name[len(prefix) :]).full_match(glob):
+                continue
+            try:
+                text = (self.root / name).read_text(encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+            if not regex.search(text):
+                continue
+            for lineno, line in enumerate(text.splitlines(), 1):
+                if regex.search(line):
+                    matches.append((name, lineno, line))
+                    if len(matches) >= self.max_matches:
+                        truncated = True
+                        break
+            if truncated:
+                break
+
+        result = (matches, truncated)
+        with self._lock:
+            self._results[key] = (generation, result)
+            while len(self._results) > 32:
+                self._results.popitem(last=False)
+        return result
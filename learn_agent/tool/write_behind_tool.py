@@ -0,0 +1,377 @@
+"""WriteBehindMemoryTool - Non-blocking long-term memory writes.
+
+Wraps a memory backend (Mem0Tool, LocalMemoryTool, ...) and exposes the same four tool methods.
+``add_memory`` and ``delete_memory`` only put the operation into a buffer and return right away;
+a background thread flushes the buffer in batches when it reaches ``max_batch`` operations or
+``flush_interval`` seconds after the oldest pending one, so the agent loop never waits on
+memory persistence.
+
+Before writing, duplicate or near-duplicate contents in the buffer are merged into one.
+``search_memory`` and ``get_all_memories`` include pending adds and hide pending deletes,
+so the agent always reads its own writes.
+
+A failing backend is retried with exponential backoff; failed operations stay in the buffer
+and are reported by ``flush`` / ``close`` instead of being dropped.
+"""
+
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Protocol
+
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+# How many pending id -> backend id mappings are remembered after their flush
+_MAX_RESOLVED = 4096
+
+
+class MemoryBackend(Protocol):
+    """Batch interface implemented by Mem0Tool and LocalMemoryTool."""
+
+    def add_many(self, contents: list[str]) -> list[str | None]: ...
+
+    def delete_many(self, memory_ids: list[str]) -> None: ...
+
+    def search(self, query: str) -> list[dict]: ...
+
+    def get_all(self) -> list[dict]: ...
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD_PATTERN.sub(" ", text.lower()).strip()
+
+
+def _trigrams(text: str) -> set[str]:
+    text = f" {text} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _PendingAdd:
+    __slots__ = ("id", "content", "grams")
+
+    def __init__(self, content: str):
+        self.id = f"pending-{uuid.uuid4().hex[:12]}"
+        self.content = content
+        self.grams = _trigrams(_normalize(content))
+
+
+class WriteBehindMemoryTool(Toolkit):
+    """Memory tool that buffers writes and persists them in the background.
+
+    Provides methods to add, search, retrieve, and delete memories.
+    """
+
+    def __init__(
+        self,
+        backend: MemoryBackend,
+        max_batch: int = 32,
+        flush_interval: float = 2.0,
+        similarity_threshold: float = 0.9,
+        retry_backoff: float = 1.0,
+        max_retry_backoff: float = 60.0,
+        **kwargs,
+    ):
+        """Initialize WriteBehindMemoryTool.
+
+        Args:
+            backend (MemoryBackend): Where memories are actually stored.
+            max_batch (int): Flush as soon as this many operations are pending.
+            flush_interval (float): Flush at most this many seconds after the oldest pending operation.
+            similarity_threshold (float): Pending contents at least this similar (trigram Jaccard) are merged.
+            retry_backoff (float): Seconds to wait before retrying after the first failed flush;
+                doubled after each further consecutive failure.
+            max_retry_backoff (float): Upper bound of the retry delay.
+        """
+        self.backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.similarity_threshold = similarity_threshold
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self._adds: list[_PendingAdd] = []
+        self._deletes: list[str] = []
+        # Operations taken by the flusher but not yet confirmed, still visible to reads
+        self._inflight_adds: list[_PendingAdd] = []
+        self._inflight_deletes: set[str] = set()
+        # pending id -> id assigned by the backend after the flush
+        self._resolved: OrderedDict[str, str | None] = OrderedDict()
+        # pending ids deleted while their add was in flight, deleted once the add is confirmed
+        self._deferred_deletes: set[str] = set()
+        self._first_pending_at: float | None = None
+        # Set after a failed flush, no flush is attempted before this time
+        self._retry_at: float | None = None
+        self._consecutive_failures = 0
+        self._closed = False
+        # A flush failed after close(), the worker stopped and left the batch in the buffer
+        self._abandoned = False
+        self.flushes = 0
+        self.failures = 0
+        self.last_error: Exception | None = None
+
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._worker.start()
+
+        super().__init__(
+            name="WriteBehindMemoryTool",
+            tools=[self.add_memory, self.search_memory, self.get_all_memories, self.delete_memory],
+            **kwargs,
+        )
+
+    # ------------------------------------------------------------------
+    # Buffering
+    # ------------------------------------------------------------------
+
+    def _pending_count(self) -> int:
+        return len(self._adds) + len(self._deletes)
+
+    def _enqueued(self) -> None:
+        # Caller holds the lock
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        self._cond.notify()
+
+    def _merge(self, item: _PendingAdd) -> _PendingAdd | None:
+        # Find a pending add with the same or nearly the same content
+        for pending in self._adds:
+            if _similarity(pending.grams, item.grams) >= self.similarity_threshold:
+                # Keep the more complete wording
+                if len(item.content) > len(pending.content):
+                    pending.content = item.content
+                    pending.grams = item.grams
+                return pending
+        return None
+
+    def _due_in(self) -> float | None:
+        # Caller holds the lock. Seconds until the next flush is due, None if nothing is pending
+        if not self._pending_count():
+            return None
+        now = time.monotonic()
+        if self._retry_at is not None:
+            # Backing off after a failure, even if the batch is full
+            return max(0.0, self._retry_at - now)
+        if self._pending_count() >= self.max_batch or self._first_pending_at is None:
+            return 0.0
+        return max(0.0, self._first_pending_at + self.flush_interval - now)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    delay = self._due_in()
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+                if self._closed and (not self._pending_count() or self._abandoned):
+                    return
+            self._flush_once()
+
+    def _flush_once(self) -> None:
+        with self._cond:
+            adds, self._adds = self._adds, []
+            deletes, self._deletes = self._deletes, []
+            self._first_pending_at = None
+            self._inflight_adds = adds
+            self._inflight_deletes = set(deletes)
+        if not adds and not deletes:
+            return
+
+        try:
+            if deletes:
+                self.backend.delete_many(deletes)
+            ids = self.backend.add_many([item.content for item in adds]) if adds else []
+        except Exception as e:
+            with self._cond:
+                self._inflight_adds = []
+                self._inflight_deletes = set()
+                # Put the batch back in front of anything queued meanwhile
+                self._adds = adds + self._adds
+                self._deletes = deletes + self._deletes
+                self._first_pending_at = time.monotonic()
+                self.failures += 1
+                self.last_error = e
+                self._consecutive_failures += 1
+                if self._closed:
+                    self._abandoned = True
+                    logger.error(
+                        "write-behind flush failed during close, %d operations kept: %s",
+                        self._pending_count(),
+                        e,
+                    )
+                else:
+                    delay = min(
+                        self.max_retry_backoff,
+                        self.retry_backoff * 2 ** (self._consecutive_failures - 1),
+                    )
+                    self._retry_at = time.monotonic() + delay
+                    logger.warning("write-behind flush failed, retrying in %.1fs: %s", delay, e)
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            for item, memory_id in zip(adds, ids):
+                self._resolved[item.id] = memory_id
+                if len(self._resolved) > _MAX_RESOLVED:
+                    self._resolved.popitem(last=False)
+                if item.id in self._deferred_deletes:
+                    self._deferred_deletes.discard(item.id)
+                    if memory_id is not None:
+                        self._deletes.append(memory_id)
+                        self._enqueued()
+            self._inflight_adds = []
+            self._inflight_deletes = set()
+            self._retry_at = None
+            self._consecutive_failures = 0
+            self.flushes += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Persist everything pending now; returns False if it did not finish within timeout.
+
+        Raises:
+            RuntimeError: The backend failed; the operations stay buffered and are retried later.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # Skip the interval and any retry backoff
+            self._first_pending_at = time.monotonic() - self.flush_interval
+            self._retry_at = None
+            failures = self.failures
+            self._cond.notify_all()
+            while self._pending_count() or self._inflight_adds or self._inflight_deletes:
+                if self.failures != failures or self._abandoned:
+                    raise RuntimeError(
+                        f"Memory flush failed, {self._pending_count()} operations still pending: "
+                        f"{self.last_error}"
+                    ) from self.last_error
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.05)
+        return True
+
+    def close(self, timeout: float | None = None) -> None:
+        """Flush pending operations and stop the background thread.
+
+        Raises:
+            RuntimeError: The final flush failed; the operations are kept in the buffer.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        with self._cond:
+            if self._abandoned and self._pending_count():
+                raise RuntimeError(
+                    f"Memory tool closed with {self._pending_count()} unsaved operations: "
+                    f"{self.last_error}"
+                ) from self.last_error
+
+    # ------------------------------------------------------------------
+    # Read-your-writes helpers
+    # ------------------------------------------------------------------
+
+    def _visible_pending(self) -> tuple[list[_PendingAdd], set[str]]:
+        with self._cond:
+            deleted = self._inflight_deletes | set(self._deletes) | self._deferred_deletes
+            adds = [item for item in self._inflight_adds + self._adds if item.id not in deleted]
+        return adds, deleted
+
+    def _merge_records(self, records: list[dict], pending: list[dict], deleted: set[str]) -> list[dict]:
+        kept = [r for r in records if r.get("id") not in deleted]
+        return pending + kept
+
+    # ------------------------------------------------------------------
+    # Tool methods
+    # ------------------------------------------------------------------
+
+    @concurrency_safe
+    def add_memory(self, content: str) -> str:
+        """Add a new memory.
+
+        Args:
+            content (str): The memory content to store.
+
+        Returns:
+            str: Confirmation message with memory ID.
+        """
+        item = _PendingAdd(content)
+        with self._cond:
+            merged = self._merge(item)
+            if merged is not None:
+                return f"Memory added: {{'id': '{merged.id}', 'memory': {merged.content!r}, 'merged': True}}"
+            self._adds.append(item)
+            self._enqueued()
+        return f"Memory added: {{'id': '{item.id}', 'memory': {content!r}}}"
+
+    @concurrency_safe
+    def search_memory(self, query: str) -> str:
+        """Search for relevant memories.
+
+        Args:
+            query (str): The search query.
+
+        Returns:
+            str: Search results as string.
+        """
+        adds, deleted = self._visible_pending()
+        query_grams = _trigrams(_normalize(query))
+        pending = []
+        for item in adds:
+            score = len(query_grams & item.grams) / len(query_grams) if query_grams else 0.0
+            if score > 0:
+                pending.append({"id": item.id, "memory": item.content, "score": round(score, 4), "pending": True})
+        pending.sort(key=lambda r: r["score"], reverse=True)
+        return str(self._merge_records(self.backend.search(query), pending, deleted))
+
+    @concurrency_safe
+    def get_all_memories(self) -> str:
+        """Get all stored memories for the user.
+
+        Returns:
+            str: All memories as string.
+        """
+        adds, deleted = self._visible_pending()
+        pending = [{"id": item.id, "memory": item.content, "pending": True} for item in adds]
+        return str(self._merge_records(self.backend.get_all(), pending, deleted))
+
+    @concurrency_safe
+    def delete_memory(self, memory_id: str) -> str:
+        """Delete a specific memory.
+
+        Args:
+            memory_id (str): The ID of the memory to delete.
+
+        Returns:
+            str: Confirmation message.
+        """
+        with self._cond:
+            for i, item in enumerate(self._adds):
+                if item.id == memory_id:
+                    # Never written, just drop it from the buffer
+                    del self._adds[i]
+                    return f"Memory {memory_id} deleted"
+            if any(item.id == memory_id for item in self._inflight_adds):
+                self._deferred_deletes.add(memory_id)
+                return f"Memory {memory_id} deleted"
+            backend_id = self._resolved.get(memory_id, memory_id)
+            if backend_id is None or (
+                memory_id.startswith("pending-") and memory_id not in self._resolved
+            ):
+                return f"Memory {memory_id} not found"
+            self._deletes.append(backend_id)
+            self._enqueued()
+        return f"Memory {memory_id} deleted"
@@ -0,0 +1,394 @@
+"""测试 Agent 主循环（使用假的 LLM，不访问真实接口）"""
+
+import asyncio
+import json
+import threading
+import time
+
+from openai.types.chat import ChatCompletionMessage
+
+from learn_agent.agent.agent import Agent
+from learn_agent.llm_pool import LLMPool
+from learn_agent.memory import Memory
+from learn_agent.router import ModelRouter, Route
+from learn_agent.tool.toolkit import Toolkit, concurrency_safe
+
+
+def _tool_call(call_id: str, name: str, arguments: str) -> dict:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+
+
+class ScriptedStreamLLM:
+    """按轮次回放预先写好的流式事件"""
+
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+
+    def chat_stream(self, messages, tools=None):
+        yield from self.rounds.pop(0)()
+
+
+def test_run_stream_starts_tool_before_stream_finishes():
+    tool_started = threading.Event()
+
+    def slow_lookup(key: str) -> str:
+        tool_started.set()
+        return key.upper()
+
+    def first_round():
+        tc = _tool_call("call_1", "slow_lookup", '{"key": "abc"}')
+        yield {"type": "tool_call_ready", "index": 0, "tool_call": tc}
+        # 模型还在生成时，工具已经开始执行
+        assert tool_started.wait(timeout=5)
+        yield {"type": "tool_calls", "tool_calls": [tc]}
+        yield {"type": "done"}
+
+    def second_round():
+        yield {"type": "content", "content": "ABC"}
+        yield {"type": "done"}
+
+    memory = Memory()
+    agent = Agent(
+        llm=ScriptedStreamLLM([first_round, second_round]),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[slow_lookup])],
+        memory=memory,
+    )
+    events = list(agent.run_stream("hi"))
+
+    assert [e["type"] for e in events] == [
+        "user_message",
+        "tool_call",
+        "tool_result",
+        "assistant",
+        "done",
+    ]
+    assert events[2]["result"] == "ABC"
+    assert [m["role"] for m in memory.messages] == ["system", "user", "assistant", "tool", "assistant"]
+
+
+class ScriptedLLM:
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+
+    def chat(self, messages, tools=None):
+        return ChatCompletionMessage.model_validate(self.rounds.pop(0))
+
+
+def _parallel_agent(tools, rounds, max_parallel_tools=4):
+    return Agent(
+        llm=ScriptedLLM(rounds),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=tools)],
+        memory=Memory(),
+        max_parallel_tools=max_parallel_tools,
+    )
+
+
+def test_run_executes_safe_tools_in_parallel_in_order():
+    @concurrency_safe
+    def sleepy(seconds: float) -> float:
+        time.sleep(seconds)
+        return seconds
+
+    calls = [_tool_call(f"c{i}", "sleepy", json.dumps({"seconds": s})) for i, s in enumerate([0.3, 0.1, 0.2])]
+    agent = _parallel_agent(
+        [sleepy],
+        [{"role": "assistant", "tool_calls": calls}, {"role": "assistant", "content": "ok"}],
+    )
+    start = time.monotonic()
+    assert agent.run("go") == "ok"
+    # 接近最慢的那个工具，而不是三个相加
+    assert time.monotonic() - start < 0.5
+
+    tool_msgs = [m for m in agent.memory.messages if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_msgs] == ["c0", "c1", "c2"]
+    assert [json.loads(m["content"])["result"] for m in tool_msgs] == [0.3, 0.1, 0.2]
+
+
+def test_unsafe_tool_is_a_barrier():
+    log = []
+    lock = threading.Lock()
+
+    @concurrency_safe
+    def read(name: str) -> str:
+        time.sleep(0.05)
+        with lock:
+            log.append(f"read {name}")
+        return name
+
+    def write(name: str) -> str:
+        with lock:
+            log.append(f"write {name}")
+        return name
+
+    calls = [
+        _tool_call("c0", "read", '{"name": "a"}'),
+        _tool_call("c1", "write", '{"name": "b"}'),
+        _tool_call("c2", "read", '{"name": "c"}'),
+    ]
+    agent = _parallel_agent(
+        [read, write],
+        [{"role": "assistant", "tool_calls": calls}, {"role": "assistant", "content": "ok"}],
+    )
+    agent.run("go")
+    assert log == ["read a", "write b", "read c"]
+
+
+class ScriptedAsyncLLM:
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+
+    async def achat(self, messages, tools=None):
+        await asyncio.sleep(0.01)
+        return ChatCompletionMessage.model_validate(self.rounds.pop(0))
+
+    async def achat_stream(self, messages, tools=None):
+        for event in self.rounds.pop(0)():
+            await asyncio.sleep(0)
+            yield event
+
+
+def test_arun_awaits_async_tools_and_offloads_sync_ones():
+    loop_blocked = []
+
+    async def fetch(url: str) -> str:
+        await asyncio.sleep(0.2)
+        return f"page {url}"
+
+    @concurrency_safe
+    def compute(n: int) -> int:
+        time.sleep(0.2)
+        return n * 2
+
+    calls = [
+        _tool_call("c0", "fetch", '{"url": "a"}'),
+        _tool_call("c1", "compute", '{"n": 21}'),
+    ]
+
+    async def main():
+        agent = Agent(
+            llm=ScriptedAsyncLLM(
+                [{"role": "assistant", "tool_calls": calls}, {"role": "assistant", "content": "ok"}]
+            ),
+            session_id="s",
+            name="test",
+            tools=[Toolkit(tools=[concurrency_safe(fetch), compute])],
+            memory=Memory(),
+        )
+
+        async def ticker():
+            # 事件循环没有被同步工具卡住的话，ticker 能持续运行
+            for _ in range(10):
+                start = time.monotonic()
+                await asyncio.sleep(0.01)
+                loop_blocked.append(time.monotonic() - start > 0.1)
+
+        start = time.monotonic()
+        answer, _ = await asyncio.gather(agent.arun("go"), ticker())
+        return agent, answer, time.monotonic() - start
+
+    agent, answer, elapsed = asyncio.run(main())
+    assert answer == "ok"
+    assert elapsed < 0.35
+    assert not any(loop_blocked)
+    tool_msgs = [m for m in agent.memory.messages if m["role"] == "tool"]
+    assert [json.loads(m["content"])["result"] for m in tool_msgs] == ["page a", 42]
+
+
+def test_arun_stream_matches_run_stream_events():
+    def lookup(key: str) -> str:
+        return key.upper()
+
+    def first_round():
+        tc = _tool_call("call_1", "lookup", '{"key": "abc"}')
+        yield {"type": "tool_call_ready", "index": 0, "tool_call": tc}
+        yield {"type": "tool_calls", "tool_calls": [tc]}
+        yield {"type": "done"}
+
+    def second_round():
+        yield {"type": "content", "content": "ABC"}
+        yield {"type": "done"}
+
+    async def main():
+        agent = Agent(
+            llm=ScriptedAsyncLLM([first_round, second_round]),
+            session_id="s",
+            name="test",
+            tools=[Toolkit(tools=[lookup])],
+            memory=Memory(),
+        )
+        return [event async for event in agent.arun_stream("hi")]
+
+    events = asyncio.run(main())
+    assert [e["type"] for e in events] == ["user_message", "tool_call", "tool_result", "assistant", "done"]
+    assert events[2]["result"] == "ABC"
+
+
+def test_arun_with_pool_of_sync_llms():
+    # 池和路由器总有 achat，里面只有同步接口的端点要放到线程里调用
+    class SyncLLM:
+        def chat(self, messages, tools=None):
+            return ChatCompletionMessage.model_validate({"role": "assistant", "content": "pooled"})
+
+        def chat_stream(self, messages, tools=None):
+            yield {"type": "content", "content": "pooled"}
+            yield {"type": "done"}
+
+    def make_agent(llm):
+        return Agent(llm=llm, session_id="s", name="test", tools=[], memory=Memory())
+
+    pool = LLMPool([SyncLLM(), SyncLLM()])
+    assert asyncio.run(make_agent(pool).arun("hi")) == "pooled"
+    assert [s.failures for s in pool.stats] == [0, 0]
+
+    async def stream(agent):
+        return [event async for event in agent.arun_stream("hi")]
+
+    events = asyncio.run(stream(make_agent(LLMPool([SyncLLM()]))))
+    assert events[-1] == {"type": "done", "final": "pooled"}
+
+    router = ModelRouter([Route("sync", SyncLLM())])
+    assert asyncio.run(make_agent(router).arun("hi")) == "pooled"
+
+
+def test_invalid_arguments_return_structured_error():
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    agent = _parallel_agent([add], [])
+    content, result, error = agent._execute_tool("add", {"a": "x"})
+    payload = json.loads(content)
+    assert payload["ok"] is False
+    assert payload["error"]["code"] == "INVALID_ARGUMENTS"
+    assert {d["loc"] for d in payload["error"]["details"]} == {"a", "b"}
+
+
+def test_run_sends_only_relevant_tool_schemas():
+    def get_weather(city: str) -> str:
+        """Get the current weather forecast for a city."""
+        return "sunny"
+
+    def send_email(to: str, body: str) -> str:
+        """Send an email message."""
+        return "sent"
+
+    def read_file(path: str) -> str:
+        """Read a file from disk."""
+        return "text"
+
+    def list_todos() -> str:
+        """List the todo items."""
+        return "[]"
+
+    class RecordingLLM(ScriptedLLM):
+        def __init__(self, rounds):
+            super().__init__(rounds)
+            self.sent = []
+
+        def chat(self, messages, tools=None):
+            self.sent.append({s["function"]["name"] for s in tools})
+            return super().chat(messages, tools)
+
+    llm = RecordingLLM(
+        [
+            # 模型调用了这一轮没有发送的工具
+            {"role": "assistant", "tool_calls": [_tool_call("c1", "send_email", '{"to": "a", "body": "b"}')]},
+            {"role": "assistant", "content": "done"},
+        ]
+    )
+    agent = Agent(
+        llm=llm,
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[get_weather, send_email, read_file, list_todos])],
+        memory=Memory(),
+        tool_top_k=1,
+        core_tools=["list_todos"],
+    )
+    assert agent.run("what is the weather in Paris?") == "done"
+    assert llm.sent[0] == {"get_weather", "list_todos"}
+    # 调用过的工具之后的轮次补上 schema，调用本身照常执行
+    assert llm.sent[1] == {"get_weather", "list_todos", "send_email"}
+    assert json.loads(agent.memory.messages[3]["content"])["result"] == "sent"
+
+    # 追问检索不到任何工具时沿用上一次的选择，而不是只发送核心工具
+    llm.rounds.append({"role": "assistant", "content": "more"})
+    assert agent.run("continue") == "more"
+    assert llm.sent[2] == {"get_weather", "list_todos"}
+
+
+def test_read_tool_result_is_always_sent_with_result_store(tmp_path):
+    from learn_agent.tool.result_tool import ResultStore
+
+    def get_weather(city: str) -> str:
+        """Get the current weather forecast for a city."""
+        return "sunny"
+
+    def send_email(to: str, body: str) -> str:
+        """Send an email message."""
+        return "sent"
+
+    agent = Agent(
+        llm=ScriptedLLM([]),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[get_weather, send_email])],
+        memory=Memory(),
+        result_store=ResultStore(tmp_path),
+        tool_top_k=1,
+    )
+    names = {s["function"]["name"] for s in agent._select_tool_schemas("weather in Paris", set())}
+    assert names == {"get_weather", "read_tool_result"}
+    # 之前没有检索结果可以沿用时发送全部工具
+    fresh = Agent(
+        llm=ScriptedLLM([]),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[get_weather, send_email])],
+        memory=Memory(),
+        tool_top_k=1,
+    )
+    assert len(fresh._select_tool_schemas("ok", set())) == 2
+
+
+def test_run_stream_forwards_tool_progress():
+    from learn_agent.tool.toolkit import report_progress
+
+    release = threading.Event()
+
+    def build(target: str) -> str:
+        report_progress({"output": "compiling\n"})
+        # 工具还没结束，进度事件已经转发出去
+        assert release.wait(timeout=5)
+        report_progress({"output": "linking\n"})
+        return "built"
+
+    def first_round():
+        tc = _tool_call("call_1", "build", '{"target": "all"}')
+        yield {"type": "tool_calls", "tool_calls": [tc]}
+        yield {"type": "done"}
+
+    def second_round():
+        yield {"type": "content", "content": "ok"}
+        yield {"type": "done"}
+
+    agent = Agent(
+        llm=ScriptedStreamLLM([first_round, second_round]),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[build])],
+        memory=Memory(),
+    )
+    events = []
+    for event in agent.run_stream("hi"):
+        events.append(event)
+        if event["type"] == "tool_output":
+            release.set()
+
+    outputs = [e for e in events if e["type"] == "tool_output"]
+    assert [e["output"] for e in outputs] == ["compiling\n", "linking\n"]
+    assert outputs[0]["tool_call_id"] == "call_1" and outputs[0]["name"] == "build"
+    assert [e["type"] for e in events].index("tool_result") > events.index(outputs[-1])
@@ -0,0 +1,73 @@
+"""测试后台压缩早期对话"""
+
+import threading
+from types import SimpleNamespace
+
+from learn_agent.compaction import SUMMARY_PREFIX, Compactor, is_summary
+from learn_agent.memory import Memory
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.release = threading.Event()
+        self.transcripts = []
+
+    def chat(self, messages, tools=None):
+        self.release.wait(timeout=5)
+        self.transcripts.append(messages[-1]["content"])
+        return SimpleNamespace(content="user wants a refactor of utils.py")
+
+
+def _add_turn(memory: Memory, i: int) -> None:
+    memory.add_message(role="user", content=f"step {i} " + "x" * 200)
+    memory.add_message(
+        role="assistant",
+        tool_calls=[{"id": f"c{i}", "type": "function", "function": {"name": "bash", "arguments": "{}"}}],
+    )
+    memory.add_message(role="tool", content="y" * 200, tool_call_id=f"c{i}")
+
+
+def test_compaction_runs_in_background_and_replaces_span():
+    summarizer = FakeSummarizer()
+    compactor = Compactor(summarizer, threshold_tokens=300, keep_recent_tokens=150)
+    memory = Memory(compactor=compactor)
+    memory.add_message(role="system", content="sys")
+    for i in range(6):
+        _add_turn(memory, i)
+
+    # 总结还没完成：get_context 不会阻塞，历史保持原样
+    before = len(memory.messages)
+    assert len(memory.get_context()) == before
+
+    summarizer.release.set()
+    compactor.wait()
+    context = memory.get_context()
+
+    assert compactor.compactions == 1
+    assert context[0]["role"] == "system"
+    assert is_summary(context[1])
+    assert context[1]["content"].startswith(SUMMARY_PREFIX)
+    assert len(context) < before
+    assert memory.total_tokens == sum(memory.token_counts)
+    # 保留下来的第一条不是孤立的 tool 结果
+    assert context[2]["role"] != "tool"
+    assert "step 0" in summarizer.transcripts[0]
+
+
+def test_failed_summarization_is_recorded():
+    class FailingSummarizer:
+        def chat(self, messages, tools=None):
+            raise ConnectionError("summarizer down")
+
+    compactor = Compactor(FailingSummarizer(), threshold_tokens=300, keep_recent_tokens=150)
+    memory = Memory(compactor=compactor)
+    memory.add_message(role="system", content="sys")
+    for i in range(6):
+        _add_turn(memory, i)
+    before = len(memory.messages)
+
+    memory.get_context()
+    compactor.wait()
+    assert len(memory.get_context()) == before
+    assert compactor.compactions == 0
+    assert isinstance(compactor.last_error, ConnectionError)
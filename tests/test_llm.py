@@ -0,0 +1,190 @@
+"""测试 LLM 客户端（使用 httpx.MockTransport，不访问真实接口）"""
+
+import asyncio
+import json
+
+import httpx
+
+from learn_agent.llm import LLM, AsyncLLM, get_http_client
+from learn_agent.llm_cache import LLMCache
+
+
+def _completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "mock",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+    }
+
+
+def _sse(deltas: list[dict]) -> bytes:
+    lines = []
+    for delta in deltas:
+        chunk = {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "mock",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+STREAM_DELTAS = [
+    {"role": "assistant", "content": "你"},
+    {"content": "好"},
+    {
+        "tool_calls": [
+            {
+                "index": 0,
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "get_temperature", "arguments": '{"num"'},
+            }
+        ]
+    },
+    {"tool_calls": [{"index": 0, "function": {"arguments": ": 3}"}}]},
+]
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if body.get("stream"):
+        return httpx.Response(
+            200,
+            content=_sse(STREAM_DELTAS),
+            headers={"content-type": "text/event-stream"},
+        )
+    return httpx.Response(200, json=_completion("hi"))
+
+
+def test_llm_instances_share_http_client():
+    a = LLM(api_key="test", model="mock", base_url="http://mock")
+    b = LLM(api_key="test", model="mock", base_url="http://mock")
+    assert a.http_client is b.http_client is get_http_client()
+
+
+def test_chat_and_stream_with_mock_transport():
+    llm = LLM(
+        api_key="test",
+        model="mock",
+        base_url="http://mock",
+        http_client=httpx.Client(transport=httpx.MockTransport(_handler)),
+    )
+    assert llm.chat([{"role": "user", "content": "hi"}]).content == "hi"
+
+    events = list(llm.chat_stream([{"role": "user", "content": "hi"}]))
+    assert [e["content"] for e in events if e["type"] == "content"] == ["你", "好"]
+    tool_calls = next(e for e in events if e["type"] == "tool_calls")["tool_calls"]
+    assert tool_calls[0]["function"]["arguments"] == '{"num": 3}'
+    assert events[-1] == {"type": "done"}
+
+
+def test_async_chat_stream():
+    async def main():
+        llm = AsyncLLM(
+            api_key="test",
+            model="mock",
+            base_url="http://mock",
+            async_http_client=httpx.AsyncClient(
+                transport=httpx.MockTransport(_handler)
+            ),
+        )
+        msg = await llm.achat([{"role": "user", "content": "hi"}])
+        events = [e async for e in llm.achat_stream([{"role": "user", "content": "hi"}])]
+        return msg, events
+
+    msg, events = asyncio.run(main())
+    assert msg.content == "hi"
+    assert [e["type"] for e in events] == [
+        "content",
+        "content",
+        "tool_call_ready",
+        "tool_calls",
+        "done",
+    ]
+
+
+def test_warmup_sends_head_requests():
+    methods = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        methods.append(request.method)
+        return httpx.Response(200)
+
+    llm = LLM(
+        api_key="test",
+        model="mock",
+        base_url="http://mock",
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    assert llm.warmup(connections=3) == 3
+    assert llm.warmup(connections=0) == 0
+    assert methods == ["HEAD"] * 3
+
+    async def main():
+        allm = AsyncLLM(
+            api_key="test",
+            model="mock",
+            base_url="http://mock",
+            async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        return await allm.awarmup(connections=2), await allm.awarmup(connections=0)
+
+    assert asyncio.run(main()) == (2, 0)
+    assert methods == ["HEAD"] * 5
+
+
+def test_cache_serves_repeated_requests(tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return _handler(request)
+
+    def make_llm(cache: LLMCache) -> LLM:
+        return LLM(
+            api_key="test",
+            model="mock",
+            base_url="http://mock",
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+            cache=cache,
+        )
+
+    llm = make_llm(LLMCache(path=tmp_path / "cache.db"))
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+    assert llm.chat(messages).content == "hi"
+    assert llm.chat(messages).content == "hi"
+    first = list(llm.chat_stream(messages, tools=[{"type": "function"}]))
+    replay = list(llm.chat_stream(messages, tools=[{"type": "function"}]))
+    assert len(calls) == 2
+    assert [e["type"] for e in replay] == ["content", "tool_call_ready", "tool_calls", "done"]
+    assert replay[2] == next(e for e in first if e["type"] == "tool_calls")
+
+    # 新进程（新的内存层）依然可以从 SQLite 命中
+    reloaded = make_llm(LLMCache(path=tmp_path / "cache.db"))
+    assert reloaded.chat(messages).content == "hi"
+    assert len(calls) == 2
+
+
+def test_cache_lru_and_ttl():
+    cache = LLMCache(max_entries=2, ttl=None)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"content": key, "tool_calls": None})
+    assert cache.get("a") is None
+    assert cache.get("c")["content"] == "c"
+
+    expired = LLMCache(ttl=-1)
+    expired.set("a", {"content": "a", "tool_calls": None})
+    assert expired.get("a") is None
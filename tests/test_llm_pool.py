@@ -0,0 +1,77 @@
+"""测试多端点 LLMPool 的选择、故障转移和对冲请求"""
+
+import time
+
+import pytest
+
+from learn_agent.llm_pool import LLMPool
+
+
+class FakeLLM:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.model = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def chat(self, messages, tools=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} down")
+        return self.name
+
+    def chat_stream(self, messages, tools=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} down")
+        yield {"type": "content", "content": self.name}
+        yield {"type": "done"}
+
+
+def test_failover_to_next_endpoint():
+    bad, good = FakeLLM("bad", fail=True), FakeLLM("good")
+    pool = LLMPool([bad, good])
+    assert pool.chat([]) == "good"
+    # 失败的端点被降权，下一次直接走好的端点
+    assert pool.chat([]) == "good"
+    assert bad.calls == 1
+
+    events = list(LLMPool([FakeLLM("bad", fail=True), FakeLLM("good")]).chat_stream([]))
+    assert events[0] == {"type": "content", "content": "good"}
+
+
+def test_prefers_lower_latency_endpoint():
+    slow, fast = FakeLLM("slow", delay=0.03), FakeLLM("fast")
+    pool = LLMPool([slow, fast])
+    for _ in range(4):
+        pool.chat([])
+    assert pool.chat([]) == "fast"
+    assert slow.calls == 1
+
+
+def test_all_endpoints_failing_raises():
+    pool = LLMPool([FakeLLM("a", fail=True), FakeLLM("b", fail=True)])
+    with pytest.raises(ConnectionError):
+        pool.chat([])
+
+
+def test_hedged_request_beats_slow_primary():
+    primary, backup = FakeLLM("primary"), FakeLLM("backup", delay=0.2)
+    pool = LLMPool([primary, backup], hedge=True, hedge_min_samples=3)
+    # 备用端点会被探索一次，之后都走更快的主端点
+    for _ in range(4):
+        pool.chat([])
+    assert primary.calls == 3
+
+    # 主端点突然变慢，超过 p95 后向备用端点发出对冲请求
+    primary.delay = 1.0
+    backup.delay = 0.0
+    start = time.monotonic()
+    assert pool.chat([]) == "backup"
+    assert time.monotonic() - start < 0.5
+
+    events = list(pool.chat_stream([]))
+    assert events[-1] == {"type": "done"}
@@ -0,0 +1,48 @@
+"""测试 Memory 与按 token 预算裁剪的上下文窗口"""
+
+from learn_agent.context_window import ContextWindow
+from learn_agent.memory import Memory
+
+
+def _fill(memory: Memory, turns: int) -> None:
+    memory.add_message(role="system", content="sys")
+    for i in range(turns):
+        memory.add_message(role="user", content=f"question {i} " + "x" * 40)
+        memory.add_message(
+            role="assistant",
+            tool_calls=[{"id": f"c{i}", "type": "function", "function": {"name": "bash", "arguments": "{}"}}],
+        )
+        memory.add_message(role="tool", content="y" * 40, tool_call_id=f"c{i}")
+        memory.add_message(role="assistant", content=f"answer {i}")
+
+
+def test_without_window_returns_full_history():
+    memory = Memory()
+    _fill(memory, 3)
+    assert memory.get_context() is memory.messages
+
+
+def test_window_keeps_system_and_drops_oldest_turns():
+    window = ContextWindow(max_tokens=120)
+    memory = Memory(context_window=window)
+    _fill(memory, 10)
+
+    context = memory.get_context()
+    assert context[0]["content"] == "sys"
+    assert context[-1]["content"] == "answer 9"
+    assert window.dropped > 0
+    assert sum(memory.token_counter.count_message(m) for m in context[1:]) <= window.budget
+    # 窗口不会从孤立的 tool 结果开始
+    assert context[1]["role"] != "tool"
+    # 增量维护的结果与重新计算的一致
+    assert context == [memory.messages[0]] + memory.messages[window.start :]
+
+
+def test_tool_results_stay_with_their_assistant_message():
+    window = ContextWindow(max_tokens=60)
+    memory = Memory(context_window=window)
+    _fill(memory, 6)
+    context = memory.get_context()
+    for i, msg in enumerate(context):
+        if msg["role"] == "tool":
+            assert context[i - 1].get("tool_calls")
@@ -0,0 +1,57 @@
+"""测试 Message 与请求体拼接"""
+
+import copy
+import json
+
+import pytest
+
+from learn_agent.memory import Memory
+from learn_agent.message import Message, build_request_body
+
+
+def test_message_reads_like_dict():
+    msg = Message("assistant", tool_calls=[{"id": "c1"}])
+    assert msg["role"] == "assistant"
+    assert msg.get("content") is None
+    assert "content" not in msg
+    assert msg == {"role": "assistant", "tool_calls": [{"id": "c1"}]}
+    assert dict(Message("user", "hi", reasoning_content="r")) == {
+        "role": "user",
+        "content": "hi",
+        "reasoning_content": "r",
+    }
+
+
+def test_json_fragment_is_cached():
+    msg = Message("tool", '{"ok": true}', tool_call_id="c1")
+    fragment = msg.json
+    assert msg.json is fragment
+    assert json.loads(fragment) == {"role": "tool", "content": '{"ok": true}', "tool_call_id": "c1"}
+
+    # 字段不能再赋值，缓存的片段不会过期
+    with pytest.raises(AttributeError):
+        msg.content = "changed"
+    assert copy.deepcopy(msg) == msg and msg.json is fragment
+
+
+def test_request_body_matches_plain_json():
+    memory = Memory()
+    memory.add_message(role="system", content="sys")
+    memory.add_message(role="user", content="你好")
+    kwargs = {
+        "model": "m",
+        "messages": memory.get_context() + [{"role": "user", "content": "plain dict"}],
+        "stream": False,
+        "tools": [{"type": "function", "function": {"name": "f"}}],
+    }
+    body = json.loads(build_request_body(kwargs))
+    assert body == {
+        "model": "m",
+        "messages": [
+            {"role": "system", "content": "sys"},
+            {"role": "user", "content": "你好"},
+            {"role": "user", "content": "plain dict"},
+        ],
+        "stream": False,
+        "tools": [{"type": "function", "function": {"name": "f"}}],
+    }
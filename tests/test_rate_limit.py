@@ -0,0 +1,62 @@
+"""测试客户端限流器"""
+
+import time
+
+import httpx
+import openai
+import pytest
+
+from learn_agent.rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+
+def _rate_limit_error(headers: dict) -> openai.RateLimitError:
+    response = httpx.Response(
+        429, headers=headers, request=httpx.Request("POST", "http://mock/chat/completions")
+    )
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_token_bucket_reserve_returns_wait():
+    bucket = TokenBucket(per_minute=60)  # 每秒 1 个
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(_rate_limit_error({"retry-after-ms": "250"})) == 0.25
+    assert parse_retry_after(_rate_limit_error({"retry-after": "3"})) == 3.0
+    assert parse_retry_after(_rate_limit_error({})) is None
+
+
+def test_call_retries_and_honors_retry_after():
+    limiter = RateLimiter(max_retries=2, base_delay=0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 2:
+            raise _rate_limit_error({"retry-after-ms": "50"})
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    stats = limiter.stats.as_dict()
+    assert stats["retries"] == 1
+    assert stats["rate_limited"] == 1
+
+
+def test_call_gives_up_after_max_retries():
+    limiter = RateLimiter(max_retries=1, base_delay=0.0)
+
+    def always_429():
+        raise _rate_limit_error({"retry-after-ms": "0"})
+
+    with pytest.raises(openai.RateLimitError):
+        limiter.call(always_429)
+
+
+def test_slot_limits_in_flight():
+    limiter = RateLimiter(max_in_flight=1)
+    with limiter.slot():
+        assert not limiter._in_flight.acquire(blocking=False)
+    assert limiter._in_flight.acquire(blocking=False)
@@ -0,0 +1,85 @@
+"""测试按轮次的模型路由"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from learn_agent.router import ModelRouter, Route
+
+
+class FakeLLM:
+    def __init__(self, name: str, empty: bool = False):
+        self.model = name
+        self.empty = empty
+        self.calls = 0
+
+    def chat(self, messages, tools=None):
+        self.calls += 1
+        return SimpleNamespace(content=None if self.empty else self.model, tool_calls=None)
+
+
+PLAN_ROUND = [{"role": "system", "content": "sys"}, {"role": "user", "content": "重构这个模块"}]
+FOLLOWUP_ROUND = PLAN_ROUND + [
+    {"role": "assistant", "content": None, "tool_calls": []},
+    {"role": "tool", "content": '{"ok": true}', "tool_call_id": "call_1"},
+]
+
+
+def test_plan_rounds_use_large_model_and_followups_use_small():
+    small, large = FakeLLM("small"), FakeLLM("large")
+    router = ModelRouter([Route("small", small, cost=1), Route("large", large, cost=10)])
+
+    assert router.chat(PLAN_ROUND).content == "large"
+    assert router.chat(FOLLOWUP_ROUND).content == "small"
+
+
+def test_context_too_large_skips_small_window():
+    router = ModelRouter(
+        [
+            Route("small", FakeLLM("small"), cost=1, max_context_tokens=2),
+            Route("large", FakeLLM("large"), cost=10),
+        ]
+    )
+    assert router.select(FOLLOWUP_ROUND).name == "large"
+
+
+def test_unhealthy_route_is_escalated():
+    small, large = FakeLLM("small", empty=True), FakeLLM("large")
+    router = ModelRouter([Route("small", small, cost=1), Route("large", large, cost=10)])
+    for _ in range(3):
+        router.chat(FOLLOWUP_ROUND)
+    # small 一直返回空结果，成功率跌破阈值后 followup 轮次改走 large
+    assert router.select(FOLLOWUP_ROUND).name == "large"
+
+
+def test_stream_does_not_fail_over_after_tool_call_ready():
+    tool_call = {"id": "c1", "type": "function", "function": {"name": "write", "arguments": "{}"}}
+
+    class BrokenStream:
+        def chat_stream(self, messages, tools=None):
+            # 调用方收到 tool_call_ready 时可能已经开始执行工具了
+            yield {"type": "tool_call_ready", "index": 0, "tool_call": tool_call}
+            raise ConnectionError("stream dropped")
+
+    class Backup:
+        calls = 0
+
+        def chat_stream(self, messages, tools=None):
+            Backup.calls += 1
+            yield {"type": "tool_calls", "tool_calls": [tool_call]}
+            yield {"type": "done"}
+
+    router = ModelRouter([Route("primary", BrokenStream(), cost=10), Route("backup", Backup(), cost=1)])
+    events = []
+    with pytest.raises(ConnectionError):
+        for event in router.chat_stream(PLAN_ROUND):
+            events.append(event)
+    assert [e["type"] for e in events] == ["tool_call_ready"]
+
+    async def consume():
+        return [event async for event in router.achat_stream(PLAN_ROUND)]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert Backup.calls == 0
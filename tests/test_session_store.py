@@ -0,0 +1,79 @@
+"""测试只追加的会话存储与惰性恢复"""
+
+from learn_agent.memory import Memory
+from learn_agent.session_store import SessionStore
+
+
+def _turn(memory: Memory, i: int) -> None:
+    memory.add_message(role="user", content=f"question {i}")
+    memory.add_message(
+        role="assistant",
+        tool_calls=[{"id": f"c{i}", "type": "function", "function": {"name": "bash", "arguments": "{}"}}],
+    )
+    memory.add_message(role="tool", content=f"result {i}", tool_call_id=f"c{i}")
+    memory.add_message(role="assistant", content=f"answer {i}")
+
+
+def test_resume_loads_system_and_recent_window(tmp_path):
+    store = SessionStore(tmp_path)
+    memory = Memory(store=store, session_id="s1")
+    memory.add_message(role="system", content="sys")
+    for i in range(50):
+        _turn(memory, i)
+    store.close()
+
+    resumed = Memory.resume(SessionStore(tmp_path), "s1", window=6)
+    roles = [m["role"] for m in resumed.messages]
+    assert resumed.messages[0] == {"role": "system", "content": "sys"}
+    # 窗口不能从孤立的 tool 结果开始
+    assert roles[1] != "tool"
+    assert len(resumed.messages) <= 7
+    assert resumed.messages[-1] == {"role": "assistant", "content": "answer 49"}
+    assert resumed.total_tokens == sum(resumed.token_counts)
+
+
+def test_resume_keeps_appending_to_same_log(tmp_path):
+    store = SessionStore(tmp_path)
+    memory = Memory(store=store, session_id="s1")
+    memory.add_message(role="system", content="sys")
+    _turn(memory, 0)
+
+    resumed = Memory.resume(store, "s1")
+    assert resumed.messages == memory.messages
+    resumed.add_message(role="user", content="again")
+
+    again = Memory.resume(store, "s1")
+    assert again.messages[-1] == {"role": "user", "content": "again"}
+    assert [m["role"] for m in again.messages].count("system") == 1
+
+
+def test_resume_after_compaction_skips_summarized_part(tmp_path):
+    store = SessionStore(tmp_path)
+    memory = Memory(store=store, session_id="s1")
+    memory.add_message(role="system", content="sys")
+    for i in range(5):
+        _turn(memory, i)
+    summary = {"role": "user", "content": "summary of turns 0-2"}
+    memory.replace_span(1, 13, summary)
+
+    resumed = Memory.resume(store, "s1", window=100)
+    assert resumed.messages[0]["role"] == "system"
+    assert resumed.messages[1] == summary
+    assert resumed.messages[2:] == memory.messages[2:]
+
+
+def test_tail_ignores_partial_last_line(tmp_path):
+    store = SessionStore(tmp_path)
+    store.append("s1", {"role": "user", "content": "hi"})
+    store.close()
+    with open(tmp_path / "s1.jsonl", "ab") as f:
+        f.write(b'{"role": "assist')
+
+    store = SessionStore(tmp_path)
+    entries = store.load("s1")
+    assert [msg for _, msg in entries] == [{"role": "user", "content": "hi"}]
+
+    # 之后的追加不会和残缺的行粘在一起
+    store.append("s1", {"role": "user", "content": "next"})
+    entries = store.load("s1")
+    assert [msg["content"] for _, msg in entries] == ["hi", "next"]
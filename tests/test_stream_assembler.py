@@ -0,0 +1,43 @@
+"""测试流式组装器的增量 JSON 检测与 tool_call_ready 事件"""
+
+from types import SimpleNamespace
+
+from learn_agent.stream_assembler import JsonCompletenessScanner, StreamAssembler
+
+
+def _delta(content=None, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls)
+
+
+def _tc(index, arguments=None, id=None, name=None):
+    return SimpleNamespace(
+        index=index,
+        id=id,
+        type="function" if id else None,
+        function=SimpleNamespace(name=name, arguments=arguments),
+    )
+
+
+def test_scanner_handles_strings_and_escapes():
+    scanner = JsonCompletenessScanner()
+    assert not scanner.feed('{"a": "}\\"{')
+    assert not scanner.feed('", "b": [1, 2')
+    assert scanner.feed("]}")
+
+
+def test_tool_call_ready_emitted_before_stream_ends():
+    assembler = StreamAssembler()
+    events = assembler.feed(_delta(content="好的"))
+    assert events == [{"type": "content", "content": "好的"}]
+
+    assert assembler.feed(_delta(tool_calls=[_tc(0, '{"path": "a', "call_0", "read_file")])) == []
+    events = assembler.feed(_delta(tool_calls=[_tc(0, '.txt"}')]))
+    assert events[0]["type"] == "tool_call_ready"
+    assert events[0]["tool_call"]["function"]["arguments"] == '{"path": "a.txt"}'
+
+    # 第二个调用没有参数，只能在流结束时补发
+    assembler.feed(_delta(tool_calls=[_tc(1, None, "call_1", "list_skills")]))
+    events = assembler.finish()
+    assert [e["type"] for e in events] == ["tool_call_ready", "tool_calls"]
+    assert [tc["id"] for tc in events[-1]["tool_calls"]] == ["call_0", "call_1"]
+    assert assembler.content == "好的"
@@ -0,0 +1,42 @@
+"""测试 token 计数与 Memory / Toolkit 的缓存计数"""
+
+from learn_agent.memory import Memory
+from learn_agent.token_counter import TokenCounter
+from learn_agent.tool.weather_tool import WeatherTool
+
+
+def test_count_message_includes_tool_calls():
+    counter = TokenCounter()
+    plain = counter.count_message({"role": "assistant", "content": "hello world"})
+    with_call = counter.count_message(
+        {
+            "role": "assistant",
+            "content": "hello world",
+            "tool_calls": [{"function": {"name": "bash", "arguments": '{"command": "ls"}'}}],
+        }
+    )
+    assert with_call > plain > TokenCounter.MESSAGE_OVERHEAD
+
+
+def test_estimate_counts_cjk_per_char():
+    counter = TokenCounter()
+    if counter.exact:
+        return
+    assert counter.count_text("你好世界") == 4
+    assert counter.count_text("a" * 40) == 10
+
+
+def test_memory_keeps_running_total():
+    memory = Memory()
+    memory.add_message(role="system", content="你是一个助手")
+    memory.add_message(role="user", content="查看下当前文件夹")
+    assert len(memory.token_counts) == 2
+    assert memory.total_tokens == sum(memory.token_counts)
+    assert memory.total_tokens == memory.token_counter.count_messages(memory.messages)
+
+
+def test_toolkit_caches_schema_tokens():
+    toolkit = WeatherTool()
+    tokens = toolkit.count_schema_tokens()
+    assert tokens > 0
+    assert toolkit.count_schema_tokens() == tokens
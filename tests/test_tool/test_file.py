@@ -16,3 +16,193 @@ def test_bash(file_tool: FileTool):
     ic(file_list)
     assert "Hello, World!" in output
     assert "test.md" in file_list
+
+
+def test_read_file_line_ranges(tmp_path: Path):
+    tool = FileTool(work_dir=tmp_path)
+    (tmp_path / "log.txt").write_text("".join(f"line {i}\n" for i in range(1000)))
+
+    assert tool.read_file("log.txt", limit=2) == "line 0\nline 1\n... (more lines, continue with offset=2)"
+    # 只扫描到请求的范围
+    index = tool.file_cache._entries[(tmp_path / "log.txt").resolve()].lines
+    assert not index.complete and len(index.offsets) < 10
+
+    assert tool.read_file("log.txt", offset=998) == "line 998\nline 999"
+    assert index.complete and index.line_count == 1000
+    assert tool.read_file("log.txt", offset=10, limit=1) == "line 10\n... (989 more lines, continue with offset=11)"
+    assert tool.read_file("log.txt", offset=5000) == ""
+
+
+def test_read_file_sees_changes_and_caps_output(tmp_path: Path):
+    tool = FileTool(work_dir=tmp_path)
+    fp = tmp_path / "a.txt"
+    fp.write_bytes(b"a\r\nb")
+    assert tool.read_file("a.txt") == "a\nb"
+
+    fp.write_text("x" * 30000 + "\n" + "y" * 30000 + "\n")
+    out = tool.read_file("a.txt")
+    assert out.startswith("x" * 30000 + "\n... (1 more lines, continue with offset=1)")
+
+    fp.write_text("")
+    assert tool.read_file("a.txt") == ""
+
+
+def test_bash_session_keeps_state_and_caps_output(tmp_path: Path):
+    tool = FileTool(work_dir=tmp_path, bash_timeout=2)
+    (tmp_path / "sub").mkdir()
+    try:
+        tool.bash("cd sub && export GREETING=hi")
+        assert tool.bash("pwd; echo $GREETING") == f"{tmp_path / 'sub'}\nhi\n"
+        assert tool.bash("echo oops >&2; false") == "oops\n\n[exit code 1]"
+
+        out = tool.bash("yes | head -c 200000")
+        assert len(out) < 50100 and out.endswith("[output truncated, 150000 more chars]")
+
+        # 超时后重启会话，回到初始目录
+        assert "timed out" in tool.bash("sleep 10")
+        assert tool.bash("pwd") == f"{tmp_path}\n"
+    finally:
+        tool.close()
+
+
+def test_bash_background_output_and_exit_status(tmp_path: Path):
+    import time
+
+    tool = FileTool(work_dir=tmp_path, bash_timeout=5)
+    try:
+        assert tool.bash("(sleep 0.2; echo late) &") == ""
+        time.sleep(0.5)
+        # 后台任务的输出不混进下一条命令的输出里
+        assert tool.bash("echo next") == "[background output]\nlate\n[end of background output]\nnext\n"
+        assert tool.bash("echo again") == "again\n"
+
+        assert tool.bash("exit 3").endswith("[exit code 3]")
+        assert tool.bash("echo alive") == "alive\n"
+    finally:
+        tool.close()
+
+
+def test_grep_and_glob_use_incremental_index(tmp_path: Path):
+    tool = FileTool(work_dir=tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "src" / "app.py").write_text("import os\n\ndef main():\n    return os.getcwd()\n")
+    (tmp_path / "src" / "util.py").write_text("def helper():\n    pass\n")
+    (tmp_path / "README.md").write_text("Main docs\n")
+    (tmp_path / "node_modules" / "dep.py").write_text("def main(): pass\n")
+
+    assert tool.grep(r"def \w+\(") == "src/app.py:3: def main():\nsrc/util.py:1: def helper():"
+    assert tool.grep("main", ignore_case=True, glob="*.md") == "README.md:1: Main docs"
+    assert tool.grep("^import", path="src") == "src/app.py:1: import os"
+    assert tool.grep("os.getcwd()", literal=True) == "src/app.py:4:     return os.getcwd()"
+    assert tool.grep("missing") == "No matches found."
+    assert tool.grep("def", limit=1) == "src/app.py:3: def main():\n... (1 more matches, continue with offset=1)"
+
+    assert tool.glob("**/*.py") == "src/app.py\nsrc/util.py"
+    assert tool.glob("*.py", path="src", limit=1) == "src/app.py\n... (1 more files, continue with offset=1)"
+
+    # 通过 FileTool 写入的文件立即可搜，其余文件没有重新读取
+    entry = tool.index._files["src/util.py"]
+    tool.write_file("src/new.py", "def main(): ...\n")
+    assert "src/new.py:1: def main(): ..." in tool.grep("def main")
+    assert tool.index._files["src/util.py"] is entry
+
+    # bash 改动的文件在下次搜索前重新检查
+    tool.bash("rm src/app.py")
+    assert tool.grep("getcwd") == "No matches found."
+    tool.close()
+
+
+def test_required_trigrams():
+    from learn_agent.tool.workspace_index import required_trigrams, trigram_codes
+
+    expected = sorted([*trigram_codes(b"foo"), *trigram_codes(b"bar")])
+    assert list(required_trigrams("(Foo).*bar$", literal=False, ignore_case=False)) == expected
+    assert len(required_trigrams("foo|bar", literal=False, ignore_case=False)) == 0
+    assert len(required_trigrams("a.b", literal=False, ignore_case=False)) == 0
+    assert len(required_trigrams("Hello", literal=True, ignore_case=False)) == 3
+    # 非 ASCII 字符两侧的片段分别取 trigram，不产生跨过它的 trigram
+    expected = sorted([*trigram_codes(b"abc"), *trigram_codes(b"def")])
+    assert list(required_trigrams("abcädef", literal=True, ignore_case=True)) == expected
+
+
+def test_file_cache_is_shared_and_invalidated(tmp_path: Path):
+    from learn_agent.tool.file_cache import FileContentCache
+
+    cache = FileContentCache(max_bytes=100)
+    main, sub = FileTool(work_dir=tmp_path, file_cache=cache), FileTool(work_dir=tmp_path, file_cache=cache)
+    (tmp_path / "a.txt").write_text("a" * 40)
+    (tmp_path / "b.txt").write_text("b" * 40)
+
+    assert main.read_file("a.txt") == "a" * 40
+    # 子代理的 FileTool 直接命中主 Agent 读过的内容
+    assert sub.read_file("a.txt", limit=1) == "a" * 40
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    sub.edit_file("a.txt", "aaaa", "xx")
+    assert main.read_file("a.txt") == "xx" + "a" * 36
+    assert cache.stats()["invalidations"] == 1
+
+    # 按字节数淘汰最久没用的文件
+    main.read_file("b.txt")
+    (tmp_path / "c.txt").write_text("c" * 40)
+    main.read_file("c.txt")
+    stats = cache.stats()
+    # 每个文件 40 字节内容 + 一行的行索引 8 字节
+    assert stats["evictions"] == 1 and stats["bytes"] == 96
+
+    # 大文件只缓存行索引，行索引同样计入字节数
+    big = FileContentCache(max_bytes=1000, max_file_bytes=10)
+    tool = FileTool(work_dir=tmp_path, file_cache=big)
+    (tmp_path / "log.txt").write_text("x\n" * 200)
+    tool.read_file("log.txt", limit=10)
+    index = big._entries[(tmp_path / "log.txt").resolve()].lines
+    assert 10 < len(index.offsets) < 200 and big.stats()["bytes"] == len(index.offsets) * 8
+    # 扫描整个文件后索引超出上限，条目被淘汰
+    tool.read_file("log.txt", offset=190)
+    assert big.stats()["entries"] == 0 and big.stats()["bytes"] == 0
+
+
+def test_multi_edit_validates_then_writes_atomically(tmp_path: Path):
+    from learn_agent.tool.file_tool import FileEdit
+
+    tool = FileTool(work_dir=tmp_path)
+    (tmp_path / "a.py").write_text("x = 1\ny = x + x\n")
+    (tmp_path / "b.py").write_text("from a import x\n")
+
+    # 有一处找不到时什么都不写
+    out = tool.call(
+        "multi_edit",
+        edits=[
+            {"path": "a.py", "old_text": "x = 1", "new_text": "value = 1"},
+            {"path": "b.py", "old_text": "missing", "new_text": "?"},
+        ],
+    )
+    assert out == "Error: no changes written.\n- edit 1 (b.py): text not found"
+    assert (tmp_path / "a.py").read_text() == "x = 1\ny = x + x\n"
+
+    assert tool.read_file("a.py") == "x = 1\ny = x + x"
+    out = tool.multi_edit(
+        [
+            FileEdit(path="a.py", old_text="x = 1", new_text="value = 1"),
+            FileEdit(path="./a.py", old_text="x + x", new_text="value + value"),
+            FileEdit(path="b.py", old_text="x", new_text="value", replace_all=True),
+        ]
+    )
+    assert out == "Applied 3 edits to 2 files: a.py (2), b.py (1)"
+    assert tool.read_file("a.py") == "value = 1\ny = value + value"
+    assert (tmp_path / "b.py").read_text() == "from a import value\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.py", "b.py"]
+
+
+def test_grep_reports_files_over_size_cutoff(tmp_path: Path):
+    tool = FileTool(work_dir=tmp_path)
+    tool.index.max_file_bytes = 1024 * 1024
+    (tmp_path / "small.log").write_text("needle\n")
+    (tmp_path / "big.log").write_text("needle\n" + "x" * 1024 * 1024)
+
+    note = "\n(1 files over 1MB not searched: big.log; use bash grep for them)"
+    assert tool.grep("needle") == "small.log:1: needle" + note
+    assert tool.grep("missing") == "No matches found." + note
+    # 被 glob 排除的大文件不提示
+    assert tool.grep("needle", glob="small.*") == "small.log:1: needle"
@@ -0,0 +1,43 @@
+"""测试本地离线向量记忆"""
+
+import numpy as np
+
+from learn_agent.tool.local_memory_tool import HashingEmbedder, LocalMemoryTool, LocalVectorStore
+
+
+def test_hashing_embedder_is_normalized_and_stable():
+    embedder = HashingEmbedder(dim=64)
+    a, b = embedder.embed(["dark mode preference", "dark mode preference"])
+    assert np.allclose(a, b)
+    assert abs(float(np.linalg.norm(a)) - 1.0) < 1e-5
+    assert embedder.embed([""])[0].sum() == 0
+
+
+def test_add_search_delete_and_reopen(tmp_path):
+    tool = LocalMemoryTool(user_id="u1", path=tmp_path)
+    tool.add_memory("My name is John and I prefer dark mode")
+    tool.add_memory("I am allergic to peanuts and shellfish")
+    LocalMemoryTool(user_id="u2", store=tool.store).add_memory("u2 likes peanuts")
+
+    hits = tool.store.search("peanuts allergy", user_id="u1")
+    assert hits[0]["memory"] == "I am allergic to peanuts and shellfish"
+    assert all(h["memory"] != "u2 likes peanuts" for h in hits)
+
+    memory_id = hits[0]["id"]
+    assert tool.delete_memory(memory_id) == f"Memory {memory_id} deleted"
+    assert "peanuts" not in tool.get_all_memories()
+    tool.store.close()
+
+    # 重新打开后数据还在，已删除的不会出现在搜索结果里
+    store = LocalVectorStore(tmp_path)
+    assert [m["memory"] for m in store.get_all("u1")] == ["My name is John and I prefer dark mode"]
+    assert all(h["id"] != memory_id for h in store.search("peanuts", user_id="u1"))
+    assert len(store) == 2
+
+
+def test_store_grows_past_initial_capacity(tmp_path):
+    store = LocalVectorStore(tmp_path, embedder=HashingEmbedder(dim=32), initial_capacity=2)
+    for i in range(10):
+        store.add(f"note number {i}")
+    assert len(store) == 10
+    assert store.search("note number 7", limit=1)[0]["memory"] == "note number 7"
@@ -0,0 +1,35 @@
+"""测试 Mem0Tool 的批量接口（使用假的 mem0 客户端）"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("mem0")
+
+from learn_agent.tool.mem0_tool import Mem0Tool  # noqa: E402
+
+
+class FakeClient:
+    """mem0 对每条内容做抽取：重复的内容合并进已有记忆，不产生新记录"""
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def add(self, messages, user_id=None):
+        with self._lock:
+            self.requests.append(messages)
+            content = messages[0]["content"]
+            if content == "duplicate":
+                return {"results": []}
+            return {"results": [{"id": f"id-{content}", "memory": content, "event": "ADD"}]}
+
+
+def test_add_many_maps_ids_to_inputs():
+    client = FakeClient()
+    tool = Mem0Tool(client=client)
+    ids = tool.add_many(["a", "duplicate", "b"])
+    # 返回的结果比输入少时，仍然能对应到每一条输入
+    assert ids == ["id-a", None, "id-b"]
+    assert all(len(messages) == 1 for messages in client.requests)
+    assert tool.add_many([]) == []
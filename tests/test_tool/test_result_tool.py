@@ -0,0 +1,106 @@
+"""测试大工具结果的场外存储"""
+
+import json
+import re
+
+from learn_agent.agent.agent import Agent
+from learn_agent.memory import Memory
+from learn_agent.tool.result_tool import ResultStore, ResultTool
+from learn_agent.tool.toolkit import Toolkit
+
+
+def _handle(preview: str) -> str:
+    return re.search(r'handle="([0-9a-f]{16})"', preview).group(1)
+
+
+def test_shrink_keeps_head_tail_and_handle(tmp_path):
+    store = ResultStore(tmp_path, max_inline_chars=100, preview_chars=10)
+    assert store.shrink("short") == "short"
+
+    text = "HEAD" + "x" * 500 + "TAIL"
+    preview = store.shrink(text)
+    assert preview.startswith("HEAD") and preview.endswith("TAIL")
+    assert len(preview) < len(text)
+    # 相同内容只存一份
+    assert store.put(text) == _handle(preview)
+
+
+def test_read_tool_result_pages_through_payload(tmp_path):
+    store = ResultStore(tmp_path)
+    handle = store.put("0123456789")
+    tool = ResultTool(store)
+
+    first = tool.read_tool_result(handle, offset=0, limit=4)
+    assert first.startswith("0123")
+    assert "offset=4" in first
+    assert tool.read_tool_result(handle, offset=8, limit=4) == "89"
+    assert tool.read_tool_result("../etc/passwd").startswith("Error")
+
+
+class ScriptedLLM:
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+
+    def chat(self, messages, tools=None):
+        return self.rounds.pop(0)
+
+
+class _Msg:
+    def __init__(self, content=None, tool_calls=None):
+        self.content = content
+        self.tool_calls = tool_calls
+
+
+class _ToolCall:
+    def __init__(self, call_id, name, arguments):
+        self.id = call_id
+        self.function = type("F", (), {"name": name, "arguments": arguments})()
+
+    def model_dump(self):
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {"name": self.function.name, "arguments": self.function.arguments},
+        }
+
+
+def test_agent_offloads_large_results_and_ages_old_ones(tmp_path):
+    def dump(size: int) -> str:
+        return "y" * size
+
+    store = ResultStore(tmp_path, max_inline_chars=5000, preview_chars=100)
+    memory = Memory()
+    agent = Agent(
+        llm=ScriptedLLM(
+            [
+                _Msg(tool_calls=[_ToolCall("c1", "dump", '{"size": 20000}')]),
+                _Msg(tool_calls=[_ToolCall("c2", "dump", '{"size": 3000}')]),
+                _Msg(content="done"),
+                _Msg(content="again"),
+            ]
+        ),
+        session_id="s",
+        name="test",
+        tools=[Toolkit(tools=[dump])],
+        memory=memory,
+        result_store=store,
+        aged_result_chars=1000,
+    )
+    assert any(toolkit.has("read_tool_result") for toolkit in agent.tools)
+
+    agent.run("go")
+    tool_msgs = [m for m in memory.messages if m["role"] == "tool"]
+    big = json.loads(tool_msgs[0]["content"])["result"]
+    assert len(big) < 2000
+    assert store.read(_handle(big), limit=20000) == "y" * 20000
+    # 3000 字符没有超过 max_inline_chars，本轮保持原样
+    assert len(tool_msgs[1]["content"]) > 3000
+
+    before = memory.total_tokens
+    agent.run("next")
+    tool_msgs = [m for m in memory.messages if m["role"] == "tool"]
+    assert len(tool_msgs[1]["content"]) < 1000
+    assert memory.total_tokens < before
+    # 场外保存的是工具的原始输出，不是包装过的 JSON
+    aged = json.loads(tool_msgs[1]["content"])["result"]
+    assert store.read(_handle(aged), limit=5000) == "y" * 3000
@@ -0,0 +1,54 @@
+"""测试子代理委派"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from openai.types.chat import ChatCompletionMessage
+
+from learn_agent.tool.file_tool import FileTool
+from learn_agent.tool.subagent_tool import SubAgentTool
+
+
+class BashLLM:
+    """把任务 prompt 当成一条 bash 命令执行，再把命令输出原样作为回答"""
+
+    def chat(self, messages, tools=None):
+        last = messages[-1]
+        if last["role"] == "tool":
+            return ChatCompletionMessage(role="assistant", content=json.loads(last["content"])["result"])
+        call = {
+            "id": f"call_{len(messages)}",
+            "type": "function",
+            "function": {"name": "bash", "arguments": json.dumps({"command": last["content"]})},
+        }
+        return ChatCompletionMessage.model_validate({"role": "assistant", "tool_calls": [call]})
+
+
+def test_each_subagent_run_gets_a_fresh_shell(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+    file_tool = FileTool(work_dir=tmp_path, include_tools=["bash"])
+    agent_types = {"explore": {"description": "", "tools": file_tool, "system_prompt": ""}}
+    tool = SubAgentTool(agent_types, work_dir=tmp_path, llm=BashLLM())
+
+    assert tool.delegate_task("a", "cd sub && export LEAK=1 && pwd", "explore") == f"{tmp_path / 'sub'}\n"
+    # 上一次运行的 cd / export 没有带到下一次
+    assert tool.delegate_task("b", "pwd; echo ${LEAK:-unset}", "explore") == f"{tmp_path}\nunset\n"
+    # 配置里的 FileTool 本身没有启动过 shell
+    assert file_tool.shell._proc is None
+
+
+def test_parallel_delegations_do_not_share_a_shell(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+    file_tool = FileTool(work_dir=tmp_path, include_tools=["bash"])
+    agent_types = {"explore": {"description": "", "tools": [file_tool], "system_prompt": ""}}
+    tool = SubAgentTool(agent_types, work_dir=tmp_path, llm=BashLLM())
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(tool.delegate_task, "a", "cd sub && sleep 0.3 && pwd", "explore")
+        time.sleep(0.1)
+        # 另一个委派的 cd 不影响这里的相对路径
+        second = executor.submit(tool.delegate_task, "b", "pwd", "explore")
+        assert second.result() == f"{tmp_path}\n"
+        assert first.result() == f"{tmp_path / 'sub'}\n"
@@ -0,0 +1,20 @@
+"""测试工具 schema 的 BM25 检索"""
+
+from learn_agent.tool.file_tool import FileTool
+from learn_agent.tool.tool_retriever import ToolRetriever, tokenize
+from learn_agent.tool.weather_tool import WeatherTool
+
+
+def test_tokenize_splits_identifiers_and_cjk():
+    assert tokenize("read_file getTemperature") == ["read", "file", "get", "temperature"]
+    assert tokenize("获取温度") == ["获", "取", "温", "度", "获取", "取温", "温度"]
+
+
+def test_select_ranks_relevant_tools():
+    schemas = [*FileTool().list_tools_schemas(), *WeatherTool().list_tools_schemas()]
+    retriever = ToolRetriever(schemas)
+
+    assert retriever.select("明天的温度是多少", top_k=1) == ["get_temperature"]
+    assert set(retriever.select("edit the text in config.py", top_k=2)) == {"edit_file", "multi_edit"}
+    # 没有任何相关词时不返回工具
+    assert retriever.select("xyz", top_k=3) == []
@@ -1,8 +1,12 @@
 """测试 toolkit 参数描述解析功能"""
 
+import json
+
 import pytest
 from learn_agent.tool.toolkit import (
     Toolkit,
+    ToolCache,
+    memoize,
     function_to_tool_schema,
     _parse_param_descriptions,
 )
@@ -50,7 +54,7 @@ def test_real_file_tool_schema():
     assert schema["function"]["name"] == "read_file"
     props = schema["function"]["parameters"]["properties"]
     assert props["path"]["description"] == "Path to the file to read."
-    assert props["limit"]["description"] == "Optional"
+    assert props["limit"]["description"] == "Maximum number of lines to return (default: until the 50KB cap)."
 
     # 检查必填参数
     assert "path" in schema["function"]["parameters"]["required"]
@@ -92,3 +96,201 @@ def test_include_tools():
     toolkit = Toolkit(tools=[foo, bar], include_tools=["bar"])
     assert toolkit.has("bar") is True
     assert toolkit.has("foo") is False
+
+
+def test_schemas_are_cached_until_add_tool():
+    def ping() -> str:
+        """Ping."""
+        return "pong"
+
+    def echo(text: str) -> str:
+        """Echo text."""
+        return text
+
+    toolkit = Toolkit(tools=[ping])
+    schemas = toolkit.list_tools_schemas()
+    assert toolkit.list_tools_schemas() is schemas
+    assert schemas.json == schemas.json and '"ping"' in schemas.json
+
+    toolkit.add_tool(echo)
+    assert [s["function"]["name"] for s in toolkit.list_tools_schemas()] == ["ping", "echo"]
+
+
+def test_agent_tool_index_and_collisions():
+    from learn_agent.agent.agent import Agent
+    from learn_agent.memory import Memory
+
+    def ping() -> str:
+        return "pong"
+
+    def pong() -> str:
+        return "ping"
+
+    with pytest.raises(ValueError, match="collision"):
+        Agent(
+            llm=None,
+            session_id="s",
+            name="a",
+            tools=[Toolkit(name="A", tools=[ping]), Toolkit(name="B", tools=[ping])],
+            memory=Memory(),
+        )
+
+    toolkit = Toolkit(tools=[ping])
+    agent = Agent(llm=None, session_id="s", name="a", tools=[toolkit], memory=Memory())
+    schemas = agent._all_tool_schemas()
+    assert agent._all_tool_schemas() is schemas
+    assert agent._dispatch_tool("ping", {}) == "pong"
+
+    # 工具包变化后索引自动重建
+    toolkit.add_tool(pong)
+    assert len(agent._all_tool_schemas()) == 2
+    assert agent._dispatch_tool("pong", {}) == "ping"
+
+
+def test_schema_for_complex_types():
+    from typing import Literal
+
+    from learn_agent.tool.todo_tool import TodoTool
+
+    def search(
+        query: str,
+        mode: Literal["fast", "full"] = "fast",
+        limit: int | None = None,
+        tags: list[str] | None = None,
+        weights: dict[str, float] | None = None,
+    ) -> str:
+        return query
+
+    props = function_to_tool_schema(search)["function"]["parameters"]["properties"]
+    assert props["query"]["type"] == "string"
+    assert props["mode"]["enum"] == ["fast", "full"]
+    assert {"type": "integer"} in props["limit"]["anyOf"]
+    assert {"type": "array", "items": {"type": "string"}} in props["tags"]["anyOf"]
+    assert {"type": "object", "additionalProperties": {"type": "number"}} in props["weights"]["anyOf"]
+
+    todo_schema = TodoTool().list_tools_schemas()[0]["function"]["parameters"]
+    items = todo_schema["properties"]["items"]
+    assert items["type"] == "array"
+    assert set(items["items"]["properties"]) == {"content", "status", "activeForm"}
+    assert "$ref" not in json.dumps(todo_schema)
+
+
+def test_call_validates_and_converts_arguments():
+    from learn_agent.tool.todo_tool import TodoTool
+    from learn_agent.tool.toolkit import ToolArgumentError
+
+    todo_tool = TodoTool()
+    out = todo_tool.call(
+        "update_todos",
+        items=[{"content": "write tests", "status": "in_progress", "activeForm": "writing"}],
+    )
+    assert "[>] write tests" in out
+
+    with pytest.raises(ToolArgumentError) as exc:
+        todo_tool.call("update_todos", items=[{"content": "x"}])
+    assert {e["loc"] for e in exc.value.errors} == {"items.0.status", "items.0.activeForm"}
+
+    def add(a: int, b: int = 1) -> int:
+        return a + b
+
+    toolkit = Toolkit(tools=[add])
+    assert toolkit.call("add", a="2") == 3
+    with pytest.raises(ToolArgumentError):
+        toolkit.call("add", a=1, c=2)
+
+    # 没有注解的参数 schema 里写 string，但校验时接受任意值
+    def echo(x):
+        return x
+
+    toolkit = Toolkit(tools=[echo])
+    assert toolkit.list_tools_schemas()[0]["function"]["parameters"]["properties"]["x"]["type"] == "string"
+    assert toolkit.call("echo", x=3) == 3
+
+
+def test_memoized_tool_hits_cache():
+    calls = []
+
+    class Counter(Toolkit):
+        def __init__(self):
+            super().__init__(tools=[self.lookup])
+
+        @memoize()
+        def lookup(self, key: str, limit: int = 1) -> str:
+            calls.append(key)
+            return key * limit
+
+    toolkit = Counter()
+    assert toolkit.call("lookup", key="a") == "a"
+    # 参数经过校验规范化：显式传默认值、不同的参数顺序视为同一次调用
+    assert toolkit.call("lookup", limit=1, key="a") == "a"
+    assert toolkit.call("lookup", key="a", limit=2) == "aa"
+    assert calls == ["a", "a"]
+    stats = toolkit.tool_cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_memoized_tool_through_select_tools():
+    calls = []
+
+    def _version(owner: "Versioned", key: str) -> int:
+        return owner.version_of[key]
+
+    class Versioned(Toolkit):
+        def __init__(self):
+            self.version_of = {"a": 1}
+            super().__init__(tools=[self.lookup, self.bump])
+
+        @memoize(fingerprint=_version)
+        def lookup(self, key: str) -> str:
+            calls.append(key)
+            return f"{key}{self.version_of[key]}"
+
+        def bump(self, key: str) -> None:
+            self.version_of[key] += 1
+            self.tool_cache.invalidate("lookup")
+
+    source = Versioned()
+    # 指纹拿到的是工具方法绑定的 Versioned，而不是挑选出来的普通 Toolkit
+    selected = source.select_tools(["lookup"])
+    assert selected.call("lookup", key="a") == "a1"
+    assert selected.call("lookup", key="a") == "a1"
+    assert calls == ["a"]
+    # 原工具包上的失效对挑选出的工具包可见
+    source.call("bump", key="a")
+    assert selected.call("lookup", key="a") == "a2"
+    assert selected.tool_cache is source.tool_cache
+
+
+def test_tool_cache_ttl_and_lru():
+    cache = ToolCache(max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.set(ToolCache.make_key(name, {}), {}, name)
+    assert cache.get(ToolCache.make_key("a", {})) == (False, None)
+    assert cache.get(ToolCache.make_key("c", {})) == (True, "c")
+    assert cache.stats()["evictions"] == 1
+
+    key = ToolCache.make_key("t", {})
+    cache.set(key, {}, "v", ttl=0)
+    assert cache.get(key) == (False, None)
+
+
+def test_read_file_cache_invalidation(tmp_path: Path):
+    from learn_agent.tool.file_cache import FileContentCache
+
+    cache = FileContentCache()
+    tool = FileTool(work_dir=tmp_path, file_cache=cache)
+    tool.write_file("a.txt", "one")
+    assert tool.call("read_file", path="a.txt") == "one"
+    assert tool.call("read_file", path="./a.txt") == "one"
+    # 只缓存在共享的 file_cache 里，工具包自己不再存一份结果
+    assert cache.stats()["entries"] == 1 and cache.stats()["hits"] == 1
+    assert tool.tool_cache.stats()["entries"] == 0
+
+    # write_file / edit_file 主动失效对应文件的缓存
+    tool.call("edit_file", path="a.txt", old_text="one", new_text="two")
+    assert cache.stats()["invalidations"] == 1
+    assert tool.call("read_file", path="a.txt") == "two"
+
+    # 其他途径修改文件：靠 mtime / size 发现
+    (tmp_path / "a.txt").write_text("three!")
+    assert tool.call("read_file", path="a.txt") == "three!"
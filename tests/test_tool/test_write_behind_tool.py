@@ -0,0 +1,159 @@
+"""测试长期记忆的 write-behind 批量写入"""
+
+import threading
+import time
+
+import pytest
+
+from learn_agent.tool.local_memory_tool import LocalMemoryTool
+from learn_agent.tool.write_behind_tool import WriteBehindMemoryTool
+
+
+class SlowBackend:
+    """每次写入都很慢的假后端，记录每一批写入"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.records: dict[str, str] = {}
+        self.add_batches: list[list[str]] = []
+        self.delete_batches: list[list[str]] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def add_many(self, contents):
+        self.release.wait()
+        time.sleep(self.delay)
+        self.add_batches.append(list(contents))
+        ids = []
+        for content in contents:
+            memory_id = f"m{len(self.records)}"
+            self.records[memory_id] = content
+            ids.append(memory_id)
+        return ids
+
+    def delete_many(self, memory_ids):
+        self.delete_batches.append(list(memory_ids))
+        for memory_id in memory_ids:
+            self.records.pop(memory_id, None)
+
+    def search(self, query):
+        return [{"id": i, "memory": c} for i, c in self.records.items() if query in c]
+
+    def get_all(self):
+        return [{"id": i, "memory": c} for i, c in self.records.items()]
+
+
+def test_add_returns_immediately_and_batches_writes():
+    backend = SlowBackend(delay=0.3)
+    tool = WriteBehindMemoryTool(backend, max_batch=100, flush_interval=0.05)
+    start = time.monotonic()
+    for i in range(5):
+        tool.add_memory(f"fact number {i} about the project")
+    assert time.monotonic() - start < 0.1
+
+    assert tool.flush(timeout=5)
+    assert sum(len(b) for b in backend.add_batches) == 5
+    assert len(backend.add_batches) <= 2
+    tool.close()
+
+
+def test_duplicates_are_merged_before_writing():
+    backend = SlowBackend(delay=0)
+    tool = WriteBehindMemoryTool(backend, flush_interval=60)
+    tool.add_memory("User prefers dark mode")
+    tool.add_memory("user prefers dark mode.")
+    tool.add_memory("User is allergic to peanuts")
+    tool.flush(timeout=5)
+    assert sorted(backend.records.values()) == ["User is allergic to peanuts", "user prefers dark mode."]
+    tool.close()
+
+
+def test_reads_see_pending_writes_and_deletes():
+    backend = SlowBackend(delay=0)
+    backend.records["m_old"] = "old fact about tea"
+    tool = WriteBehindMemoryTool(backend, flush_interval=60)
+
+    added = tool.add_memory("new fact about tea")
+    pending_id = added.split("'id': '")[1].split("'")[0]
+    assert "new fact about tea" in tool.search_memory("tea")
+
+    tool.delete_memory("m_old")
+    assert "old fact" not in tool.search_memory("tea")
+    assert "old fact" not in tool.get_all_memories()
+
+    # 还没写入就删除的，直接从缓冲区去掉
+    tool.delete_memory(pending_id)
+    assert "new fact" not in tool.get_all_memories()
+
+    tool.flush(timeout=5)
+    assert backend.records == {}
+    assert backend.add_batches == []
+    tool.close()
+
+
+def test_delete_while_add_in_flight():
+    backend = SlowBackend(delay=0)
+    backend.release.clear()
+    tool = WriteBehindMemoryTool(backend, flush_interval=0)
+    added = tool.add_memory("short lived fact")
+    pending_id = added.split("'id': '")[1].split("'")[0]
+    time.sleep(0.1)
+    # 写入进行中，读依然能看到
+    assert "short lived fact" in tool.get_all_memories()
+    tool.delete_memory(pending_id)
+    assert "short lived fact" not in tool.get_all_memories()
+    backend.release.set()
+    assert tool.flush(timeout=5)
+    assert backend.records == {}
+    tool.close()
+
+
+def test_wraps_local_memory_tool(tmp_path):
+    tool = WriteBehindMemoryTool(LocalMemoryTool(user_id="u", path=tmp_path), flush_interval=60)
+    tool.add_memory("I am allergic to peanuts")
+    assert "peanuts" in tool.search_memory("peanuts")
+    tool.close()
+    assert "peanuts" in LocalMemoryTool(user_id="u", path=tmp_path).get_all_memories()
+
+
+class FlakyBackend(SlowBackend):
+    """前 fail_times 次写入失败的假后端"""
+
+    def __init__(self, fail_times: int):
+        super().__init__(delay=0)
+        self.fail_times = fail_times
+        self.attempts: list[float] = []
+
+    def add_many(self, contents):
+        self.attempts.append(time.monotonic())
+        if len(self.attempts) <= self.fail_times:
+            raise ConnectionError("backend down")
+        return super().add_many(contents)
+
+
+def test_failed_flush_backs_off_and_is_reported():
+    backend = FlakyBackend(fail_times=2)
+    tool = WriteBehindMemoryTool(backend, flush_interval=0.01, retry_backoff=0.1)
+    tool.add_memory("the deploy target is staging")
+    time.sleep(0.05)
+    # 第一次失败之后按退避间隔重试，而不是立即反复重试
+    assert len(backend.attempts) == 1
+    assert isinstance(tool.last_error, ConnectionError)
+
+    # 显式 flush 立即重试，失败时抛出错误，数据仍然留在缓冲区里
+    with pytest.raises(RuntimeError):
+        tool.flush(timeout=5)
+    assert "staging" in tool.get_all_memories()
+    assert tool.flush(timeout=5)
+    assert backend.records == {"m0": "the deploy target is staging"}
+    tool.close()
+
+
+def test_close_keeps_batch_when_backend_fails():
+    backend = FlakyBackend(fail_times=100)
+    tool = WriteBehindMemoryTool(backend, flush_interval=60)
+    tool.add_memory("remember this")
+    with pytest.raises(RuntimeError):
+        tool.close(timeout=5)
+    assert len(backend.attempts) == 1
+    assert "remember this" in tool.get_all_memories()